@@ -3,63 +3,208 @@ ERGenix - Automatic ER Diagram Generator
 A complete solution for generating ER diagrams and table statistics from databases
 """
 
-import base64
-import io
+import atexit
+import json
 import os
-import threading
+import tempfile
 import time
-from datetime import datetime, timedelta
+from contextlib import nullcontext
 
-import matplotlib
-import matplotlib.pyplot as plt
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, jsonify, render_template, request, send_file
 from flask_cors import CORS
 
+from database.catalog_cache import CatalogCache
+from database.catalog_diff import diff_catalogs, is_empty
+from database.collector import StatisticsCollector
 from database.erdb import DatabaseManager
+from database.fk_graph import ForeignKeyGraph
+from database.fleet import FleetScanner, FleetStore
+from database.pool import ConnectionManager
+from database.sampler import SampleStore, StatisticsSampler
+from database.snapshots import SnapshotStore
+from services import metrics
+from services.artifacts import ArtifactStore, convert_image
 from services.erservice import ERDiagramGenerator
-
-matplotlib.use('Agg')  # Set non-GUI backend
-from threading import Lock
-
-matplotlib_lock = Lock()
+from services.incremental import Drawing, DrawingStore, dirty_regions, reusable_routes
+from services.jobs import JobManager
+from services.layout import LayoutEngine, LayoutStore
+from services.render_cache import RenderCache
+from services.render_pool import RenderPool, RenderPoolSaturated, RenderTooLarge
+from services.statsservice import StatisticsChartGenerator
+from services.svg_renderer import SVGDiagramRenderer
+from services.tiles import TileSet, TileStore
 
 app = Flask(__name__)
 CORS(app)
 
-# Global storage for database connections (will be cleared every 5 minutes)
-active_connections = {}
-connection_timestamps = {}
-
-
 # Initialize database manager
 db_manager = DatabaseManager()
+# Every statement run through these is timed and counted for Server-Timing and /metrics
+metrics.instrument_database(db_manager, (
+    'ping', 'get_databases', 'get_tables', 'get_table_schema', 'get_foreign_keys',
+    'get_schema_fingerprint', 'get_catalog', 'get_table_statistics', 'get_column_profiles',
+    'sample_rows', 'get_row_estimates', 'get_activity_counters', 'get_tables_statistics',
+    'count_rows'
+))
+# Sessions expire 5 minutes after /connect; idle pooled connections after 1 minute
+connection_manager = ConnectionManager(db_manager, max_per_target=5, idle_timeout=60,
+                                       session_timeout=300)
+catalog_cache = CatalogCache(db_manager)
+# Exact row counts run in parallel, each query bounded by a 10 second timeout
+stats_collector = StatisticsCollector(db_manager, connection_manager, max_workers=4,
+                                      query_timeout=10)
+# Optional background sampler: set ERGENIX_STATS_DB to a SQLite file for the time series
+stats_sampler = None
+if os.environ.get('ERGENIX_STATS_DB'):
+    stats_sampler = StatisticsSampler(
+        db_manager, connection_manager, stats_collector, catalog_cache,
+        SampleStore(os.environ['ERGENIX_STATS_DB']),
+        interval=float(os.environ.get('ERGENIX_STATS_INTERVAL', 60))
+    )
+# Fleet scans introspect many databases at once, each on its own short-lived connection
+fleet_scanner = FleetScanner(db_manager, connection_manager,
+                             max_workers=int(os.environ.get('ERGENIX_FLEET_WORKERS', 8)))
+fleet_store = FleetStore()
+# Catalog snapshots per target, for diffs over time and diagrams without a database round trip
+snapshot_store = SnapshotStore(
+    os.environ.get('ERGENIX_SNAPSHOT_DIR',
+                   os.path.join(tempfile.gettempdir(), 'ergenix-snapshots'))
+)
 er_generator = ERDiagramGenerator()
-def cleanup_connections():
-    """Clean up connections older than 5 minutes"""
-    current_time = datetime.now()
-    to_remove = []
-    
-    for conn_id, timestamp in list(connection_timestamps.items()):
-        if current_time - timestamp > timedelta(minutes=5):
-            to_remove.append(conn_id)
-    
-    for conn_id in to_remove:
-        if conn_id in active_connections:
-            try:
-                active_connections[conn_id].close()
-            except:
-                pass
-            del active_connections[conn_id]
-        if conn_id in connection_timestamps:
-            del connection_timestamps[conn_id]
-
-# Schedule cleanup every minute
-def schedule_cleanup():
-    cleanup_connections()
-    threading.Timer(60.0, schedule_cleanup).start()
-
-# Start cleanup scheduler
-schedule_cleanup()
+svg_renderer = SVGDiagramRenderer(er_generator)
+chart_generator = StatisticsChartGenerator()
+# Last diagram layout per (connection, database), so edits only move what changed
+layout_store = LayoutStore()
+# Last routed diagram per (connection, database), so a regenerated image only redraws what changed
+drawing_store = DrawingStore()
+# Laid out diagrams served as tile pyramids, by diagram id
+tile_store = TileStore()
+# Seconds a browser may reuse a tile before revalidating it against the ETag
+TILE_MAX_AGE = 300
+# Rendered diagrams and charts: 64 MB in memory, 512 MB on disk
+render_cache = RenderCache(
+    memory_bytes=64 * 1024 * 1024,
+    disk_dir=os.environ.get('ERGENIX_RENDER_CACHE_DIR',
+                            os.path.join(tempfile.gettempdir(), 'ergenix-render-cache')),
+    disk_bytes=512 * 1024 * 1024
+)
+
+# Figures render in worker processes, each with its own matplotlib state.
+# Renders beyond workers + queue are refused with 503 and Retry-After.
+render_pool = RenderPool(
+    max_workers=int(os.environ.get('ERGENIX_RENDER_WORKERS', 0)) or None,
+    max_queue=int(os.environ['ERGENIX_RENDER_QUEUE']) if 'ERGENIX_RENDER_QUEUE' in os.environ else None
+)
+
+# PNG diagrams render at up to 300 dpi, lowered so each render's canvas stays
+# within ERGENIX_RENDER_BUDGET_MB. One that would need less than
+# ERGENIX_MIN_RENDER_DPI is drawn in the request's "fallback" format instead.
+# Statistics charts are held to the same budget.
+MAX_RENDER_DPI = 300
+RENDER_BUDGET = int(os.environ.get('ERGENIX_RENDER_BUDGET_MB',
+                                   ERDiagramGenerator.RENDER_BUDGET_MB)) * 1024 * 1024
+MIN_RENDER_DPI = int(os.environ.get('ERGENIX_MIN_RENDER_DPI', ERDiagramGenerator.MIN_RENDER_DPI))
+FALLBACK_FORMATS = ('tiles', 'svg', 'none')
+
+# Background jobs for requests made with "async": true
+job_manager = JobManager(max_workers=int(os.environ.get('ERGENIX_JOB_WORKERS', 4)))
+# Tables introspected per catalog query in job mode, between progress events
+INTROSPECT_BATCH = 200
+# Deepest foreign key neighborhood selectable in one request
+MAX_NEIGHBORHOOD_DEPTH = 10
+
+# Generated images on disk per session, downloaded by URL: 1 GB, kept 30 minutes.
+# Each process writes to its own folder under ERGENIX_ARTIFACT_DIR and removes it on exit.
+artifact_store = ArtifactStore(
+    os.environ.get('ERGENIX_ARTIFACT_DIR',
+                   os.path.join(tempfile.gettempdir(), 'ergenix-artifacts')),
+    max_bytes=1024 * 1024 * 1024,
+    ttl=1800
+)
+atexit.register(artifact_store.close)
+
+# The reaper also drops artifacts and tile tokens of ended sessions and old finished jobs
+connection_manager.add_cleanup(lambda: artifact_store.expire(connection_manager.has_session))
+connection_manager.add_cleanup(lambda: tile_store.expire(connection_manager.has_session))
+connection_manager.add_cleanup(lambda: job_manager.expire(is_live=connection_manager.has_session))
+
+# Per-stage timings go out as a Server-Timing header unless ERGENIX_SERVER_TIMING=0
+SERVER_TIMING = os.environ.get('ERGENIX_SERVER_TIMING', '1') != '0'
+
+def pool_connections():
+    """Pooled database connections by db_type and state, summed over targets"""
+    totals = {}
+    for target, stats in connection_manager.pool_stats().items():
+        db_type = target.split('://', 1)[0]
+        for state in ('idle', 'in_use'):
+            totals[(db_type, state)] = totals.get((db_type, state), 0) + stats[state]
+    return totals
+
+metrics.registry.register(metrics.Gauge(
+    'ergenix_db_connections', 'Pooled database connections', pool_connections,
+    ('db_type', 'state')))
+metrics.registry.register(metrics.Gauge(
+    'ergenix_render_in_flight', 'Renders running or waiting for a worker',
+    lambda: render_pool.stats()['in_flight']))
+metrics.registry.register(metrics.Gauge(
+    'ergenix_render_queued', 'Renders waiting for a worker',
+    lambda: render_pool.stats()['queued']))
+metrics.registry.register(metrics.Gauge(
+    'ergenix_render_workers', 'Render worker processes', lambda: render_pool.max_workers))
+metrics.registry.register(metrics.Gauge(
+    'ergenix_jobs', 'Background jobs kept, by state',
+    lambda: {(state,): count for state, count in job_manager.counts().items()}, ('state',)))
+metrics.registry.register(metrics.Gauge(
+    'ergenix_render_cache_bytes', 'Bytes held by the render cache, by tier',
+    lambda: {('memory',): render_cache.stats()['memory_bytes'],
+             ('disk',): render_cache.stats()['disk_bytes']}, ('tier',)))
+
+def start_background():
+    """Start the cleanup thread, and the sampler if configured (idempotent)
+
+    Nothing starts at import: importing app stays cheap and a pre-forking
+    server (gunicorn --preload) does not fork away threads. Each worker
+    starts them on its first request; app.run starts them up front.
+    """
+    connection_manager.start()
+    if stats_sampler is not None:
+        stats_sampler.start()
+
+@app.before_request
+def ensure_background():
+    start_background()
+
+@app.before_request
+def start_timings():
+    metrics.begin()
+
+@app.after_request
+def record_timings(response):
+    """Feed the request histograms and attach the request's Server-Timing header"""
+    timings = metrics.current()
+    if timings is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - timings.started,
+                                    endpoint, response.status_code)
+    if not response.is_streamed:
+        metrics.RESPONSE_BYTES.observe(response.calculate_content_length() or 0, endpoint)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+def render_busy(error):
+    """503 response telling the client when to retry a saturated render pool"""
+    response = jsonify({'success': False, 'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def not_modified(etag):
+    """Empty 304 response for a client that already holds this artifact"""
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
 
 @app.route('/')
 def index():
@@ -77,21 +222,8 @@ def connect_database():
         if not all([db_type, host, user, password]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        # For SQLite, use host as the database file path
-        database = host if db_type.lower() == 'sqlite' else None
-        
-        # Create connection and get databases
-        conn, databases = db_manager.connect_database(db_type, host, user, password, database)
-        
-        # Generate connection ID
-        conn_id = f"{user}_{host}_{int(time.time())}"
-        
-        # Store connection
-        active_connections[conn_id] = conn
-        connection_timestamps[conn_id] = datetime.now()
-        
-        # Get databases
-        databases = db_manager.get_databases(conn, db_type)
+        # Create a session (SQLite uses host as the database file path)
+        conn_id, databases = connection_manager.open_session(db_type, host, user, password)
         
         return jsonify({
             'success': True,
@@ -111,11 +243,12 @@ def get_tables():
         database = data.get('database')
         db_type = data.get('db_type')
         
-        if conn_id not in active_connections:
+        session = connection_manager.get_session(conn_id)
+        if session is None:
             return jsonify({'success': False, 'error': 'Connection not found'})
         
-        conn = active_connections[conn_id]
-        tables = db_manager.get_tables(conn, db_type, database)
+        with connection_manager.connection(conn_id, database) as conn:
+            tables = catalog_cache.get_tables(conn, db_type, session['host'], database)
         
         return jsonify({
             'success': True,
@@ -133,51 +266,327 @@ def generate_er_diagram():
         database = data.get('database')
         db_type = data.get('db_type')
         selected_tables = data.get('tables', [])
+        # {"tables": [...], "depth": 2, "direction": "both"} selects tables by
+        # foreign key distance instead (see /get_neighborhood)
+        neighborhood = data.get('neighborhood')
+        # 'tiles' returns a diagram id; images are then fetched tile by tile
+        diagram_format = data.get('format', 'png').lower()
+        # 'auto' (layered when there are FKs), 'grid', 'layered' or 'force'
+        layout = data.get('layout', 'auto')
+        # What a PNG too big for the render budget becomes: 'tiles', 'svg' or 'none' (413)
+        fallback = data.get('fallback', 'tiles')
+        
+        invalid = invalid_diagram_options(diagram_format, layout, fallback)
+        if invalid is not None:
+            return invalid
         
-        if conn_id not in active_connections:
+        session = connection_manager.get_session(conn_id)
+        if session is None:
             return jsonify({'success': False, 'error': 'Connection not found'})
+        if neighborhood:
+            selected_tables = list(select_neighborhood(conn_id, database, db_type, session['host'],
+                                                       neighborhood))
+        
+        args = (conn_id, database, db_type, session['host'], selected_tables, diagram_format, layout,
+                fallback)
+        if data.get('async'):
+            # Job mode: answer at once and stream progress from /jobs/<id>/events
+            job = job_manager.submit('diagram', diagram_job, *args, session_id=conn_id)
+            return job_accepted(job)
         
-        conn = active_connections[conn_id]
-        
-        # Get table schemas and relationships
-        tables_data = {}
-        relationships = []
-        
-        for table_name in selected_tables:
-            schema = db_manager.get_table_schema(conn, db_type, table_name, database)
-            foreign_keys = db_manager.get_foreign_keys(conn, db_type, table_name, database)
-            
-            tables_data[table_name] = {
-                'schema': schema,
-                'foreign_keys': foreign_keys
-            }
-            
-            # Add relationships
-            for fk in foreign_keys:
-                if fk['referenced_table'] in selected_tables:
-                    relationships.append({
-                        'from_table': table_name,
-                        'to_table': fk['referenced_table'],
-                        'from_column': fk['column'],
-                        'to_column': fk['referenced_column']
-                    })
-        
-        # Generate ER diagram
-        with matplotlib_lock:
-            fig = er_generator.generate_diagram(tables_data, relationships)
-            img_buffer = io.BytesIO()
-            fig.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-            img_buffer.seek(0)
-            img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-            plt.close(fig)
-            img_buffer.close()
-            
+        return diagram_response(conn_id, *prepare_diagram(*args))
+    
+    except RenderPoolSaturated as e:
+        return render_busy(e)
+    except RenderTooLarge as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/get_neighborhood', methods=['POST'])
+def get_neighborhood():
+    try:
+        data = request.json
+        conn_id = data.get('connection_id')
+        database = data.get('database')
+        db_type = data.get('db_type')
+        
+        session = connection_manager.get_session(conn_id)
+        if session is None:
+            return jsonify({'success': False, 'error': 'Connection not found'})
+        
+        hops = select_neighborhood(conn_id, database, db_type, session['host'], data)
         return jsonify({
             'success': True,
-            'diagram': img_base64,
-            'tables_data': tables_data
+            'tables': list(hops),
+            'hops': hops
         })
     
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+def select_neighborhood(conn_id, database, db_type, host, options):
+    """Center tables and everything within some foreign key hops of them
+
+    options holds 'tables' (the centers), 'depth' (hops, default 1, at most
+    MAX_NEIGHBORHOOD_DEPTH), 'direction' ('both', 'referenced' or
+    'referencing') and optionally 'max_tables'. Returns {table: hops}.
+    """
+    centers = options.get('tables') or []
+    if not centers:
+        raise ValueError('Give at least one center table')
+    depth = max(0, min(int(options.get('depth', 1)), MAX_NEIGHBORHOOD_DEPTH))
+    max_tables = int(options['max_tables']) if options.get('max_tables') else None
+    with connection_manager.connection(conn_id, database) as conn:
+        graph = catalog_cache.get_fk_graph(conn, db_type, host, database)
+    return graph.neighborhood(centers, depth, options.get('direction', 'both'), max_tables)
+
+def load_catalog(conn_id, database, db_type, host, tables, job=None):
+    """Get schema and foreign keys for the selected tables
+
+    Jobs introspect INTROSPECT_BATCH tables at a time and report progress
+    between batches; cancelling a job aborts the query in flight (where the
+    driver can) and stops before the next batch.
+    """
+    with metrics.stage('catalog'), connection_manager.connection(conn_id, database) as conn:
+        if job is None:
+            return catalog_cache.get_catalog(conn, db_type, host, database, tables)
+        
+        catalog = {}
+        with job.cancelling(lambda: db_manager.cancel_query(conn, db_type)):
+            for start in range(0, len(tables), INTROSPECT_BATCH):
+                job.progress('introspecting', start, len(tables))
+                catalog.update(catalog_cache.get_catalog(conn, db_type, host, database,
+                                                         tables[start:start + INTROSPECT_BATCH]))
+        job.progress('introspecting', len(tables), len(tables))
+        return catalog
+
+def invalid_diagram_options(diagram_format, layout, fallback='tiles'):
+    """400 response for an unsupported diagram format, layout or fallback, or None"""
+    if diagram_format not in ('png', 'svg', 'tiles'):
+        return jsonify({'success': False, 'error': f'Unsupported diagram format: {diagram_format}'}), 400
+    if layout not in LayoutEngine.ALGORITHMS:
+        return jsonify({'success': False, 'error': f'Unsupported layout: {layout}'}), 400
+    if fallback not in FALLBACK_FORMATS:
+        return jsonify({'success': False, 'error': f'Unsupported fallback: {fallback}'}), 400
+    return None
+
+def diagram_response(conn_id, diagram_format, drawing, previous, cache_key):
+    """Response for a prepared diagram: tiles, 304 or the stored image's URL"""
+    if diagram_format == 'tiles':
+        return jsonify(tiled_diagram(conn_id, cache_key, drawing))
+    if request.if_none_match.contains(cache_key):
+        return not_modified(cache_key)
+    
+    response = jsonify(diagram_body(conn_id, drawing, previous, cache_key, diagram_format))
+    response.set_etag(cache_key)
+    return response
+
+def prepare_diagram(conn_id, database, db_type, host, selected_tables, diagram_format, layout,
+                    fallback='tiles', job=None):
+    """Introspect, lay out and route a diagram
+
+    Returns (format to produce, drawing, previous drawing of the database
+    or None, cache_key).
+    """
+    # Get table schemas and relationships in one catalog pass
+    tables_data = load_catalog(conn_id, database, db_type, host, selected_tables, job)
+    return draw_catalog(conn_id, database, tables_data, diagram_format, layout, fallback, job)
+
+def draw_catalog(conn_id, database, tables_data, diagram_format, layout, fallback='tiles',
+                 job=None):
+    """Lay out and route a catalog against the database's previous drawing"""
+    # Relationships are the foreign keys between the selected tables
+    relationships = ForeignKeyGraph(tables_data).relationships()
+    
+    # Seed the layout from the previous diagram so existing tables stay put
+    if job is not None:
+        job.progress('layout')
+    with metrics.stage('layout'):
+        table_layout = er_generator.compute_layout(
+            tables_data, relationships, layout,
+            previous=layout_store.get(conn_id, database, layout)
+        )
+    layout_store.put(conn_id, database, layout, table_layout)
+
+    # Tiles route themselves as they are drawn, so the viewer gets its
+    # first tiles without waiting for the whole diagram to be routed
+    previous = drawing_store.get(conn_id, database)
+    diagram_format = fit_format(table_layout, diagram_format, fallback)
+    if diagram_format == 'tiles':
+        drawing = Drawing(tables_data, relationships, table_layout, None)
+        return diagram_format, drawing, previous, image_key(drawing, diagram_format)
+
+    # Keep the previous drawing's routes where nothing near them changed
+    if job is not None:
+        job.progress('routing')
+    with metrics.stage('routing'):
+        routes = er_generator.route_relationships(
+            relationships, table_layout,
+            fixed=reusable_routes(er_generator, previous, relationships, table_layout)
+        )
+    drawing = Drawing(tables_data, relationships, table_layout, routes)
+    drawing_store.put(conn_id, database, drawing)
+    return diagram_format, drawing, previous, image_key(drawing, diagram_format)
+
+def diagram_dpi(table_layout):
+    """DPI of a diagram's PNG within the render budget, or None if it cannot fit"""
+    return er_generator.fit_dpi(table_layout, RENDER_BUDGET, MAX_RENDER_DPI, MIN_RENDER_DPI)
+
+def chart_dpi(statistics):
+    """DPI of the statistics charts within the render budget
+
+    Raises RenderTooLarge if they cannot fit; charts have no vector or
+    tiled fallback.
+    """
+    size = chart_generator.figure_size(statistics)
+    dpi = er_generator.fit_figure_dpi(*size, RENDER_BUDGET, MAX_RENDER_DPI, MIN_RENDER_DPI)
+    if dpi is None:
+        raise RenderTooLarge(er_generator.figure_bytes(*size, MIN_RENDER_DPI), RENDER_BUDGET,
+                             'Statistics chart', 'select fewer tables')
+    return dpi
+
+def fit_format(table_layout, diagram_format, fallback):
+    """The format to produce: a PNG over the render budget becomes the fallback
+
+    Only the layout matters, so this is known before routing. Raises
+    RenderTooLarge when the fallback is 'none'.
+    """
+    if diagram_format != 'png' or diagram_dpi(table_layout) is not None:
+        return diagram_format
+    if fallback == 'none':
+        needed = er_generator.canvas_bytes(table_layout, MIN_RENDER_DPI)
+        raise RenderTooLarge(needed, RENDER_BUDGET)
+    return fallback
+
+def image_key(drawing, diagram_format):
+    """The rendered image depends only on the drawing and render options"""
+    return render_cache.make_key(drawing.key, {'format': diagram_format,
+                                               'dpi': diagram_dpi(drawing.table_layout)})
+
+def diagram_body(conn_id, drawing, previous, cache_key, diagram_format, job=None):
+    """Store a rendered diagram (unless stored) and build the /generate_er_diagram response body"""
+    name = f'{cache_key}.{diagram_format}'
+    if artifact_store.path(conn_id, name) is None:
+        store_diagram(conn_id, drawing, previous, cache_key, diagram_format, job)
+    
+    if job is not None:
+        job.progress('encode')
+    return {
+        'success': True,
+        'diagram_url': artifact_url(conn_id, cache_key, name),
+        'diagram_format': diagram_format,
+        'tables_data': drawing.tables_data
+    }
+
+def store_diagram(conn_id, drawing, previous, cache_key, diagram_format, job=None):
+    """Render a diagram (unless cached) into the session's artifact store
+
+    A PNG whose previous drawing's image is still cached is patched: only
+    the regions the catalog diff and the layout changed are redrawn.
+    """
+    diagram = render_cache.get(cache_key)
+    if diagram is None:
+        if job is not None:
+            job.progress('render')
+        if diagram_format == 'svg':
+            # Vector output is written directly, without matplotlib
+            with metrics.stage('render'):
+                diagram = svg_renderer.render(drawing.tables_data, drawing.relationships,
+                                              table_layout=drawing.table_layout,
+                                              routes=drawing.routes).encode('utf-8')
+        else:
+            cancel_event = job.cancel_event if job is not None else None
+            base = render_cache.get(image_key(previous, 'png')) if previous is not None else None
+            regions = dirty_regions(er_generator, previous, drawing) if base is not None else None
+            if regions is not None:
+                with metrics.stage('render.patch'):
+                    diagram = render_pool.render_patch(
+                        base, drawing.tables_data, drawing.table_layout, drawing.relationships,
+                        drawing.routes, regions, dpi=diagram_dpi(drawing.table_layout),
+                        cancel_event=cancel_event
+                    )
+            else:
+                # Generate ER diagram in a render worker
+                with metrics.stage('render'):
+                    diagram = render_pool.render_diagram(
+                        drawing.tables_data, drawing.relationships,
+                        dpi=diagram_dpi(drawing.table_layout),
+                        table_layout=drawing.table_layout, routes=drawing.routes,
+                        cancel_event=cancel_event
+                    )
+        metrics.payload(diagram_format, len(diagram))
+        render_cache.put(cache_key, diagram)
+    artifact_store.put(conn_id, cache_key, diagram_format, diagram)
+
+def diagram_job(job, conn_id, database, db_type, host, selected_tables, diagram_format, layout,
+                fallback='tiles'):
+    """Background version of /generate_er_diagram, reporting each stage"""
+    diagram_format, drawing, previous, cache_key = prepare_diagram(
+        conn_id, database, db_type, host, selected_tables, diagram_format, layout, fallback, job)
+    if diagram_format == 'tiles':
+        return tiled_diagram(conn_id, cache_key, drawing)
+    return diagram_body(conn_id, drawing, previous, cache_key, diagram_format, job)
+
+def tiled_diagram(conn_id, diagram_id, drawing):
+    """Register a diagram's tile pyramid and describe it to the viewer
+
+    Tiles are drawn on demand by diagram_tile, for this session only. An
+    unrouted drawing is routed by its tiles, as they are asked for.
+    """
+    tile_set = tile_store.get(diagram_id)
+    if tile_set is None:
+        tile_set = TileSet(er_generator, drawing.tables_data, drawing.relationships,
+                           drawing.table_layout, routes=drawing.routes)
+    token = tile_store.put(diagram_id, tile_set, conn_id)
+    width, height = tile_set.size()
+    return {
+        'success': True,
+        'diagram_format': 'tiles',
+        'diagram_id': diagram_id,
+        'tile_url': f'/diagram/{token}/tile/{{z}}/{{x}}/{{y}}.png',
+        'tile_size': tile_set.tile_size,
+        'max_zoom': tile_set.max_zoom,
+        'width': width,
+        'height': height,
+        'tables_data': drawing.tables_data
+    }
+
+@app.route('/diagram/<token>/tile/<int:z>/<int:x>/<int:y>.png')
+def diagram_tile(token, z, x, y):
+    try:
+        owner = tile_store.resolve(token)
+        tile_set = tile_store.get(owner[1]) if owner is not None else None
+        if tile_set is None or not connection_manager.has_session(owner[0]):
+            return jsonify({'success': False, 'error': 'Diagram not found'}), 404
+        diagram_id = owner[1]
+        if not tile_set.has_tile(z, x, y):
+            return jsonify({'success': False, 'error': 'Tile out of range'}), 404
+        
+        # Diagram ids are content hashes, so a tile never changes; the ETag
+        # lets the browser revalidate once its short private copy goes stale
+        cache_key = render_cache.make_key(diagram_id, {'tile': [z, x, y],
+                                                       'size': tile_set.tile_size})
+        if request.if_none_match.contains(cache_key):
+            return not_modified(cache_key)
+        
+        tile = render_cache.get(cache_key)
+        if tile is None:
+            with metrics.stage('render'):
+                tile = render_pool.render_tile(tile_set.contents(z, x, y))
+            metrics.payload('tile', len(tile))
+            render_cache.put(cache_key, tile)
+        
+        response = app.response_class(tile, mimetype='image/png')
+        response.set_etag(cache_key)
+        response.cache_control.private = True
+        response.cache_control.max_age = TILE_MAX_AGE
+        return response
+    
+    except RenderPoolSaturated as e:
+        return render_busy(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -189,91 +598,477 @@ def get_statistics():
         database = data.get('database')
         db_type = data.get('db_type')
         selected_tables = data.get('tables', [])
+        # 'estimated' reads planner estimates; 'exact' counts rows up to exact_threshold
+        stats_mode = data.get('stats_mode', 'estimated')
+        exact_threshold = data.get('exact_threshold')
+        # Per-query timeout in seconds, capped so a request cannot pin the database
+        query_timeout = min(float(data.get('query_timeout') or 10), 60)
         
-        if conn_id not in active_connections:
+        session = connection_manager.get_session(conn_id)
+        if session is None:
             return jsonify({'success': False, 'error': 'Connection not found'})
         
-        conn = active_connections[conn_id]
-        
-        # Get statistics for each table
-        statistics = {}
-        for table_name in selected_tables:
-            stats = db_manager.get_table_statistics(conn, db_type, table_name, database)
-            statistics[table_name] = stats
-        with matplotlib_lock:
-        # Generate statistics visualization
-            fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
-            
-            # Row count chart
-            tables = list(statistics.keys())
-            row_counts = [statistics[table]['row_count'] for table in tables]
-            ax1.bar(tables, row_counts, color='skyblue')
-            ax1.set_title('Row Count by Table')
-            ax1.set_xlabel('Tables')
-            ax1.set_ylabel('Row Count')
-            plt.setp(ax1.get_xticklabels(), rotation=45, ha='right')
-            
-            # Column count chart
-            col_counts = [statistics[table]['column_count'] for table in tables]
-            ax2.bar(tables, col_counts, color='lightgreen')
-            ax2.set_title('Column Count by Table')
-            ax2.set_xlabel('Tables')
-            ax2.set_ylabel('Column Count')
-            plt.setp(ax2.get_xticklabels(), rotation=45, ha='right')
-            
-            # Size chart (if available)
-            sizes = []
-            size_tables = []
-            for table in tables:
-                size = statistics[table]['size_mb']
-                if size != 'N/A' and size is not None:
-                    sizes.append(float(size))
-                    size_tables.append(table)
-            
-            if sizes:
-                ax3.bar(size_tables, sizes, color='orange')
-                ax3.set_title('Table Size (MB)')
-                ax3.set_xlabel('Tables')
-                ax3.set_ylabel('Size (MB)')
-                plt.setp(ax3.get_xticklabels(), rotation=45, ha='right')
-            else:
-                ax3.text(0.5, 0.5, 'Size data not available', ha='center', va='center', transform=ax3.transAxes)
-                ax3.set_title('Table Size (MB)')
-            
-            # Summary pie chart
-            total_rows = sum(row_counts)
-            if total_rows > 0:
-                ax4.pie(row_counts, labels=tables, autopct='%1.1f%%', startangle=90)
-                ax4.set_title('Data Distribution by Table')
-            else:
-                ax4.text(0.5, 0.5, 'No data available', ha='center', va='center', transform=ax4.transAxes)
-                ax4.set_title('Data Distribution by Table')
-            
-            plt.tight_layout()
-            
-            # Convert to base64
-            stats_buffer = io.BytesIO()
-            fig.savefig(stats_buffer, format='png', dpi=300, bbox_inches='tight')
-            stats_buffer.seek(0)
-            stats_base64 = base64.b64encode(stats_buffer.getvalue()).decode()
-            plt.close(fig)
-            stats_buffer.close()
-            
-        return jsonify({
-            'success': True,
-            'statistics': statistics,
-            'stats_chart': stats_base64
-        })
+        args = (conn_id, database, db_type, session['host'], selected_tables, stats_mode,
+                exact_threshold, query_timeout)
+        if data.get('async'):
+            job = job_manager.submit('statistics', statistics_job, *args, session_id=conn_id)
+            return job_accepted(job)
+        
+        statistics, cache_key = collect_statistics(*args)
+        if request.if_none_match.contains(cache_key):
+            return not_modified(cache_key)
+        
+        response = jsonify(statistics_body(conn_id, statistics, cache_key))
+        response.set_etag(cache_key)
+        return response
+    
+    except RenderPoolSaturated as e:
+        return render_busy(e)
+    except RenderTooLarge as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+def collect_statistics(conn_id, database, db_type, host, selected_tables, stats_mode,
+                       exact_threshold, query_timeout, job=None):
+    """Gather statistics for the selected tables; returns (statistics, cache_key)"""
+    statistics = None
+    if stats_sampler is not None:
+        stats_sampler.watch(conn_id, db_type, host, database)
+        if stats_mode == 'estimated':
+            # Answer from the latest background sample while it is fresh
+            statistics = stats_sampler.snapshot(db_type, host, database, selected_tables)
+    
+    if statistics is None:
+        # Get statistics for all tables, reusing one catalog pass for column counts
+        catalog = load_catalog(conn_id, database, db_type, host, selected_tables, job)
+        progress = None
+        if job is not None:
+            # collect() stops and cancels its own counts when the job is cancelled
+            def progress(done, total):
+                job.progress('counting', done, total, check=False)
+        statistics = stats_collector.collect(
+            conn_id, db_type, selected_tables, database, catalog=catalog,
+            mode=stats_mode, exact_threshold=exact_threshold,
+            query_timeout=query_timeout, deadline=query_timeout * 2,
+            cancel_event=job.cancel_event if job is not None else None, progress=progress
+        )
+        if stats_sampler is not None:
+            stats_sampler.annotate(db_type, host, database, statistics)
+    
+    # The response depends only on the statistics and the chart's render options
+    cache_key = render_cache.make_key(statistics, {'format': 'png', 'dpi': chart_dpi(statistics)})
+    return statistics, cache_key
+
+def statistics_body(conn_id, statistics, cache_key, job=None):
+    """Store the statistics chart (unless stored) and build the /get_statistics response body"""
+    # The chart shows only counts and sizes; statistics differing elsewhere share it
+    dpi = chart_dpi(statistics)
+    chart_key = render_cache.make_key(
+        [(name, stats['row_count'], stats['column_count'], stats['size_mb'])
+         for name, stats in statistics.items()],
+        {'format': 'png', 'dpi': dpi}
+    )
+    name = f'{chart_key}.png'
+    if artifact_store.path(conn_id, name) is None:
+        stats_chart = render_cache.get(chart_key)
+        if stats_chart is None:
+            if job is not None:
+                job.progress('render')
+            with metrics.stage('render'):
+                stats_chart = render_pool.render_statistics(
+                    statistics, dpi=dpi, cancel_event=job.cancel_event if job is not None else None
+                )
+            metrics.payload('chart', len(stats_chart))
+            render_cache.put(chart_key, stats_chart)
+        artifact_store.put(conn_id, chart_key, 'png', stats_chart)
+    
+    if job is not None:
+        job.progress('encode')
+    return {
+        'success': True,
+        'partial': any(stats.get('partial') for stats in statistics.values()),
+        'statistics': statistics,
+        'stats_chart_url': artifact_url(conn_id, chart_key, name)
+    }
+
+def statistics_job(job, conn_id, *args):
+    """Background version of /get_statistics, reporting each stage"""
+    statistics, cache_key = collect_statistics(conn_id, *args, job=job)
+    return statistics_body(conn_id, statistics, cache_key, job)
+
+@app.route('/get_column_profiles', methods=['POST'])
+def get_column_profiles():
+    try:
+        data = request.json
+        conn_id = data.get('connection_id')
+        database = data.get('database')
+        db_type = data.get('db_type')
+        selected_tables = data.get('tables', [])
+        # Rows sampled per table; the sample, not the table, sets the cost
+        sample_size = max(1, min(int(data.get('sample_size') or 10000), 100000))
+        query_timeout = min(float(data.get('query_timeout') or 10), 60)
+        
+        if connection_manager.get_session(conn_id) is None:
+            return jsonify({'success': False, 'error': 'Connection not found'})
+        
+        args = (conn_id, database, db_type, selected_tables, sample_size, query_timeout)
+        if data.get('async'):
+            job = job_manager.submit('profiles', profiles_job, *args, session_id=conn_id)
+            return job_accepted(job)
+        return jsonify(profile_columns(*args))
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+def profile_columns(conn_id, database, db_type, selected_tables, sample_size, query_timeout,
+                    job=None):
+    """Profile the columns of each selected table from a bounded row sample"""
+    profiles = {}
+    cancel_event = job.cancel_event if job is not None else None
+    with connection_manager.connection(conn_id, database) as conn:
+        cancel = lambda: db_manager.cancel_query(conn, db_type)
+        try:
+            for done, table_name in enumerate(selected_tables):
+                if job is not None:
+                    job.progress('profiling', done, len(selected_tables))
+                db_manager.set_query_timeout(conn, db_type, query_timeout, cancel_event)
+                try:
+                    with job.cancelling(cancel) if job is not None else nullcontext():
+                        profiles[table_name] = db_manager.get_column_profiles(
+                            conn, db_type, table_name, database, sample_size)
+                except Exception as e:
+                    if job is not None:
+                        job.check()
+                    # One failing table is reported, not fatal; clear any aborted transaction
+                    conn.rollback()
+                    profiles[table_name] = {'table': table_name, 'error': str(e),
+                                            'timed_out': db_manager.is_timeout_error(e)}
+        finally:
+            # The connection goes back to the pool with no timeout left on it;
+            # if clearing fails, the error makes the pool discard it instead
+            db_manager.set_query_timeout(conn, db_type, None)
+
+    return {
+        'success': True,
+        'partial': any('error' in profile for profile in profiles.values()),
+        'profiles': profiles
+    }
+
+def profiles_job(job, *args):
+    """Background version of /get_column_profiles, reporting each table"""
+    return profile_columns(*args, job=job)
+
+@app.route('/fleet/scan', methods=['POST'])
+def fleet_scan():
+    try:
+        data = request.json
+        conn_id = data.get('connection_id')
+        db_type = data.get('db_type')
+        # Defaults to every database /connect listed
+        databases = data.get('databases')
+        
+        session = connection_manager.get_session(conn_id)
+        if session is None:
+            return jsonify({'success': False, 'error': 'Connection not found'})
+        
+        args = (conn_id, db_type, session['host'], session_owner(session), databases)
+        if data.get('async'):
+            job = job_manager.submit('fleet', fleet_job, *args, session_id=conn_id)
+            return job_accepted(job)
+        return jsonify(scan_fleet(*args))
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+def session_owner(session):
+    """The target fleet scans and snapshots belong to, shared by sessions with the same credentials"""
+    return session['db_type'].lower(), session['host'], session['user']
+
+def scan_fleet(conn_id, db_type, host, owner, databases, job=None):
+    """Scan databases into a stored FleetCatalog and get its summary"""
+    if not databases:
+        with connection_manager.connection(conn_id) as conn:
+            databases = db_manager.get_databases(conn, db_type)
+    progress = None
+    if job is not None:
+        # scan() stops queuing databases when the job is cancelled
+        def progress(done, total):
+            job.progress('scanning', done, total, check=False)
+    fleet_catalog = fleet_scanner.scan(
+        conn_id, db_type, host, databases, progress=progress,
+        cancel_event=job.cancel_event if job is not None else None
+    )
+    if job is not None:
+        job.check()
+    fleet_store.put(owner, fleet_catalog)
+    return dict({'success': True}, **fleet_catalog.summary())
+
+def fleet_job(job, *args):
+    """Background version of /fleet/scan, reporting databases as they finish"""
+    return scan_fleet(*args, job=job)
+
+@app.route('/fleet/<scan_id>/query', methods=['POST'])
+def fleet_query(scan_id):
+    try:
+        data = request.json
+        fleet_catalog = stored_fleet_scan(scan_id, data.get('connection_id'))
+        if fleet_catalog is None:
+            return jsonify({'success': False, 'error': 'Scan not found'}), 404
+        
+        # Shell-style patterns, e.g. {"table": "order*", "column": "*_id"}
+        matches = fleet_catalog.query(data.get('database'), data.get('table'), data.get('column'),
+                                      limit=min(int(data.get('limit') or 1000), 10000))
+        return jsonify({'success': True, 'matches': matches})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/fleet/<scan_id>/diff', methods=['POST'])
+def fleet_diff(scan_id):
+    try:
+        data = request.json
+        conn_id = data.get('connection_id')
+        fleet_catalog = stored_fleet_scan(scan_id, conn_id)
+        if fleet_catalog is None:
+            return jsonify({'success': False, 'error': 'Scan not found'}), 404
+        
+        if data.get('against'):
+            # Changes since an earlier scan of the same server
+            previous = stored_fleet_scan(data['against'], conn_id)
+            if previous is None:
+                return jsonify({'success': False, 'error': 'Scan not found'}), 404
+            return jsonify({'success': True, 'diff': fleet_catalog.diff(previous)})
+        
+        # Differences between two databases of this scan
+        databases = data.get('databases') or []
+        if len(databases) != 2:
+            return jsonify({'success': False, 'error': 'Give "against" or two "databases"'}), 400
+        return jsonify({'success': True, 'diff': fleet_catalog.diff_databases(*databases)})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+def stored_fleet_scan(scan_id, conn_id):
+    """A stored fleet scan the session may read, or None"""
+    session = connection_manager.get_session(conn_id)
+    if session is None:
+        return None
+    return fleet_store.get(scan_id, session_owner(session))
+
+@app.route('/snapshots', methods=['POST'])
+def take_snapshot():
+    try:
+        data = request.json
+        conn_id = data.get('connection_id')
+        database = data.get('database')
+        db_type = data.get('db_type')
+        # Defaults to every table of the database
+        tables = data.get('tables')
+        
+        session = connection_manager.get_session(conn_id)
+        if session is None:
+            return jsonify({'success': False, 'error': 'Connection not found'})
+        
+        with connection_manager.connection(conn_id, database) as conn:
+            fingerprint = db_manager.get_schema_fingerprint(conn, db_type, database)
+        catalog = load_catalog(conn_id, database, db_type, session['host'], tables)
+        meta = snapshot_store.save(session_owner(session), catalog, db_type, session['host'],
+                                   database, fingerprint)
+        return jsonify(dict({'success': True}, **meta))
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/snapshots/list', methods=['POST'])
+def list_snapshots():
+    try:
+        data = request.json
+        session = connection_manager.get_session(data.get('connection_id'))
+        if session is None:
+            return jsonify({'success': False, 'error': 'Connection not found'})
+        
+        return jsonify({'success': True,
+                        'snapshots': snapshot_store.list(session_owner(session), data.get('database'))})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/snapshots/diff', methods=['POST'])
+def diff_snapshots():
+    try:
+        data = request.json
+        conn_id = data.get('connection_id')
+        session = connection_manager.get_session(conn_id)
+        if session is None:
+            return jsonify({'success': False, 'error': 'Connection not found'})
+        
+        old = snapshot_store.load(session_owner(session), data.get('from') or '')
+        if old is None:
+            return jsonify({'success': False, 'error': 'Snapshot not found'}), 404
+        old_meta, old_catalog = old
+        if data.get('to'):
+            new = snapshot_store.load(session_owner(session), data['to'])
+            if new is None:
+                return jsonify({'success': False, 'error': 'Snapshot not found'}), 404
+            new_meta, new_catalog = new
+        else:
+            # Without "to", compare against the database as it is now ("same_tables"
+            # limits that to the snapshot's tables, for snapshots of a selection)
+            database = old_meta['database']
+            new_meta = {'snapshot_id': None, 'database': database}
+            new_catalog = load_catalog(conn_id, database, old_meta['db_type'], session['host'],
+                                       list(old_catalog) if data.get('same_tables') else None)
+        
+        diff = diff_catalogs(old_catalog, new_catalog)
+        return jsonify({'success': True, 'from': old_meta, 'to': new_meta,
+                        'changed': not is_empty(diff), 'diff': diff})
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/download/<format_type>/<content_type>')
-def download_file(format_type, content_type):
+@app.route('/snapshots/<snapshot_id>/diagram', methods=['POST'])
+def snapshot_diagram(snapshot_id):
     try:
-        # This would need to be implemented with session storage
-        # For now, return a placeholder response
-        return jsonify({'success': False, 'error': 'Download feature needs session implementation'})
+        data = request.json
+        conn_id = data.get('connection_id')
+        diagram_format = data.get('format', 'png').lower()
+        layout = data.get('layout', 'auto')
+        fallback = data.get('fallback', 'tiles')
+        
+        invalid = invalid_diagram_options(diagram_format, layout, fallback)
+        if invalid is not None:
+            return invalid
+        
+        session = connection_manager.get_session(conn_id)
+        if session is None:
+            return jsonify({'success': False, 'error': 'Connection not found'})
+        snapshot = snapshot_store.load(session_owner(session), snapshot_id)
+        if snapshot is None:
+            return jsonify({'success': False, 'error': 'Snapshot not found'}), 404
+        
+        # Drawn from the snapshot alone; the database is not queried. It shares
+        # the database's previous drawing, so stepping between snapshots (or
+        # back to the live schema) only redraws what differs.
+        meta, catalog = snapshot
+        tables = data.get('tables') or list(catalog)
+        tables_data = {name: catalog[name] for name in tables if name in catalog}
+        return diagram_response(conn_id, *draw_catalog(conn_id, meta['database'], tables_data,
+                                                        diagram_format, layout, fallback))
+    
+    except RenderPoolSaturated as e:
+        return render_busy(e)
+    except RenderTooLarge as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+def job_accepted(job):
+    """202 response pointing at a new job's status and event stream
+
+    Both only answer the session that started the job: add its
+    connection_id as a query parameter (EventSource cannot send a body).
+    """
+    response = jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': f'/jobs/{job.id}',
+        'events_url': f'/jobs/{job.id}/events'
+    })
+    response.status_code = 202
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response
+
+def session_job(job_id, conn_id):
+    """The job if it belongs to conn_id and that session is still open, else None"""
+    if not conn_id or not connection_manager.has_session(conn_id):
+        return None
+    return job_manager.get(job_id, session_id=conn_id)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Job state and progress; includes the result once the job is done"""
+    job = session_job(job_id, request.args.get('connection_id'))
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(dict(job.snapshot(include_result=True), success=True))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events: progress, then done, failed or cancelled"""
+    job = session_job(job_id, request.args.get('connection_id'))
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    # A reconnecting EventSource resumes after the last event it saw
+    after = request.headers.get('Last-Event-ID', '')
+    after = int(after) if after.isdigit() else 0
+    
+    def stream():
+        for event in job.follow(after):
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            sequence, name, data = event
+            yield f'id: {sequence}\nevent: {name}\ndata: {json.dumps(data)}\n\n'
+    
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Do not let a reverse proxy buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = session_job(job_id, (request.get_json(silent=True) or {}).get('connection_id'))
+    cancelled = None if job is None else job.cancel()
+    if cancelled is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'cancelled': cancelled})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage, request and payload histograms plus pool and queue gauges, for Prometheus"""
+    return app.response_class(metrics.registry.expose(),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def artifact_url(conn_id, artifact_id, name):
+    """Download URL of a stored artifact; its token stands in for the session id"""
+    return f'/download/{artifact_store.token(conn_id, artifact_id)}/{name}'
+
+@app.route('/download/<token>/<name>')
+def download_file(token, name):
+    """Stream a stored diagram or chart from disk
+
+    PNG artifacts can also be fetched as .jpeg or .pdf, converted on first
+    request and stored alongside. Range and If-None-Match requests are
+    honoured; ?attachment=1 asks the browser to save the file.
+    """
+    try:
+        owner = artifact_store.resolve(token)
+        stem, _, file_format = name.rpartition('.')
+        if owner is None or owner[1] != stem or not connection_manager.has_session(owner[0]):
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+        conn_id = owner[0]
+        path = artifact_store.path(conn_id, name)
+        if path is None and file_format in ('jpeg', 'pdf'):
+            source = artifact_store.get(conn_id, f'{stem}.png')
+            if source is not None:
+                artifact_store.put(conn_id, stem, file_format, convert_image(source, file_format))
+                path = artifact_store.path(conn_id, name)
+        if path is None:
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+        
+        # Names are content hashes, so the file never changes while it exists
+        response = send_file(path, mimetype=ArtifactStore.FORMATS[file_format],
+                             as_attachment=bool(request.args.get('attachment')),
+                             download_name=f'ergenix_{stem[:12]}.{file_format}',
+                             conditional=True, etag=name, max_age=artifact_store.ttl)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+    except FileNotFoundError:
+        # Expired between the lookup and the read
+        return jsonify({'success': False, 'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -284,4 +1079,5 @@ if __name__ == '__main__':
     os.makedirs('static/js', exist_ok=True)
     
     # HTML template will be created separately
+    start_background()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
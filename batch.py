@@ -0,0 +1,283 @@
+"""
+Headless batch generation of ER diagrams, without the Flask server
+
+Reads a JSON manifest of database targets and renders each one in its own
+worker process into <out>/<name>/ as diagram.png, diagram.svg and
+schema.json. Targets whose schema fingerprint and options match the last
+run (recorded in <out>/.ergenix-batch.json) are skipped.
+
+    python batch.py manifest.json [--out docs/erd] [--workers 4] [--force] [--only NAME ...]
+
+Manifest:
+
+    {
+      "defaults": {"formats": ["png", "svg", "json"], "layout": "auto", "dpi": 300,
+                   "render_budget_mb": 128},
+      "targets": [
+        {"name": "shop", "db_type": "sqlite", "host": "data/shop.db"},
+        {"name": "billing", "db_type": "postgresql", "host": "db1", "user": "docs",
+         "password_env": "BILLING_DB_PASSWORD", "database": "billing", "tables": ["*"]}
+      ]
+    }
+
+Any default can be overridden per target. PNGs render at "dpi" or lower, so
+their canvas stays within "render_budget_mb"; a diagram too large for the
+budget at 100 dpi gets no PNG (its SVG has everything). "tables" selects tables by
+shell-style pattern (all tables when omitted); "password_env" names an
+environment variable so manifests need not hold secrets. "neighborhood"
+narrows those tables to some around center tables, by foreign key hops:
+
+    "neighborhood": {"tables": ["orders"], "depth": 2, "direction": "both"}
+
+A target with
+"snapshot" (a file written by the "snapshot" format or the server's
+/snapshots) is rendered from that file without connecting anywhere:
+
+    {"name": "shop-last-release", "snapshot": "erd/shop/schema.snapshot.json.gz"}
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from database.erdb import DatabaseManager
+from database.fk_graph import ForeignKeyGraph
+from database.snapshots import encode_snapshot, read_snapshot, snapshot_meta
+from services.erservice import ERDiagramGenerator
+from services.layout import LayoutEngine
+from services.render_cache import RenderCache
+
+FORMATS = ('png', 'svg', 'json', 'snapshot')
+DEFAULTS = {'formats': ['png', 'svg', 'json'], 'layout': 'auto', 'dpi': 300,
+            'render_budget_mb': ERDiagramGenerator.RENDER_BUDGET_MB, 'tables': None,
+            'neighborhood': None}
+STATE_FILE = '.ergenix-batch.json'
+
+
+def load_manifest(path):
+    """Get the manifest's targets with defaults applied, checked for mistakes"""
+    with open(path) as f:
+        manifest = json.load(f)
+    defaults = dict(DEFAULTS, **manifest.get('defaults', {}))
+    targets, names = [], set()
+    for entry in manifest.get('targets', []):
+        target = dict(defaults, **entry)
+        for field in ('name',) if target.get('snapshot') else ('name', 'db_type', 'host'):
+            if not target.get(field):
+                raise ValueError(f"Manifest target is missing '{field}': {entry}")
+        if target['name'] in names:
+            raise ValueError(f"Duplicate target name: {target['name']}")
+        if os.path.basename(target['name']) != target['name'] or target['name'].startswith('.'):
+            raise ValueError(f"Target name must be a plain directory name: {target['name']}")
+        unknown = set(target['formats']) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"Unsupported formats for {target['name']}: {sorted(unknown)}")
+        if target['layout'] not in LayoutEngine.ALGORITHMS:
+            raise ValueError(f"Unsupported layout for {target['name']}: {target['layout']}")
+        if not target['render_budget_mb'] > 0:
+            raise ValueError(f"Invalid render_budget_mb for {target['name']}: "
+                             f"{target['render_budget_mb']}")
+        hood = target['neighborhood']
+        if hood is not None and (not hood.get('tables')
+                                 or hood.get('direction', 'both') not in ForeignKeyGraph.DIRECTIONS):
+            raise ValueError(f"Invalid neighborhood for {target['name']}: {hood}")
+        names.add(target['name'])
+        targets.append(target)
+    return targets
+
+
+def target_options(target):
+    """Hash of everything besides the schema that shapes a target's outputs"""
+    return RenderCache.make_key({key: target[key]
+                                 for key in ('formats', 'layout', 'dpi', 'render_budget_mb',
+                                             'tables', 'neighborhood')})
+
+
+def process_target(target, previous, out_dir, force=False):
+    """Render one target's outputs unless its schema is unchanged (runs in a worker)
+
+    previous is the target's entry from the last run's state, or None.
+    Returns the new state entry, with 'status' of 'rendered' or 'skipped'.
+    """
+    from services.render_pool import render_diagram_png
+    from services.svg_renderer import SVGDiagramRenderer
+
+    started = time.perf_counter()
+    options = target_options(target)
+    target_dir = os.path.join(out_dir, target['name'])
+
+    def unchanged(fingerprint):
+        if force or previous is None:
+            return False
+        # Formats the render budget ruled out last time are not expected on disk
+        outputs = [os.path.join(target_dir, output_name(fmt)) for fmt in target['formats']
+                   if fmt not in previous.get('oversize', [])]
+        return (previous.get('fingerprint') == fingerprint and previous.get('options') == options
+                and all(map(os.path.exists, outputs)))
+
+    if target.get('snapshot'):
+        # Drawn from the snapshot file alone, without connecting anywhere
+        meta, catalog = read_snapshot(target['snapshot'])
+        db_type, host, database = meta['db_type'], meta['host'], meta['database']
+        fingerprint = RenderCache.make_key(catalog)
+        if unchanged(fingerprint):
+            return dict(previous, status='skipped', seconds=time.perf_counter() - started)
+        tables_data = {name: catalog[name] for name in select_tables(catalog, target['tables'])}
+    else:
+        db_manager = DatabaseManager()
+        db_type, host = target['db_type'], target['host']
+        password = target.get('password')
+        if target.get('password_env'):
+            password = os.environ.get(target['password_env'])
+        database = target.get('database')
+        # SQLite reads the file named by host
+        source = host if db_type.lower() == 'sqlite' else database
+        conn, _ = db_manager.connect_database(db_type, host, target.get('user'), password, source)
+        try:
+            fingerprint = db_manager.get_schema_fingerprint(conn, db_type, source)
+            if unchanged(fingerprint):
+                return dict(previous, status='skipped', seconds=time.perf_counter() - started)
+            tables = select_tables(db_manager.get_tables(conn, db_type, source), target['tables'])
+            tables_data = db_manager.get_catalog(conn, db_type, source, tables)
+        finally:
+            conn.close()
+
+    graph = ForeignKeyGraph(tables_data)
+    if target['neighborhood']:
+        hood = target['neighborhood']
+        hops = graph.neighborhood(hood['tables'], hood.get('depth', 1), hood.get('direction', 'both'))
+        tables_data = {name: tables_data[name] for name in hops}
+        graph = ForeignKeyGraph(tables_data)
+    relationships = graph.relationships()
+    # Seed the layout from the last run so tables that stayed keep their place,
+    # and route once for both image formats
+    generator = ERDiagramGenerator()
+    table_layout = generator.compute_layout(tables_data, relationships, target['layout'],
+                                            previous=read_layout(target_dir))
+    routes = generator.route_relationships(relationships, table_layout)
+
+    os.makedirs(target_dir, exist_ok=True)
+    oversize = []
+    for fmt in target['formats']:
+        if fmt == 'png':
+            dpi = generator.fit_dpi(table_layout, target['render_budget_mb'] * 1024 * 1024,
+                                    max_dpi=target['dpi'])
+            if dpi is None:
+                # Never leave the last run's PNG behind as if it were current
+                oversize.append(fmt)
+                try:
+                    os.remove(os.path.join(target_dir, output_name(fmt)))
+                except FileNotFoundError:
+                    pass
+                continue
+            data = render_diagram_png(tables_data, relationships, dpi=dpi,
+                                      table_layout=table_layout, routes=routes)
+        elif fmt == 'svg':
+            data = SVGDiagramRenderer(generator).render(
+                tables_data, relationships, table_layout=table_layout,
+                routes=routes).encode('utf-8')
+        elif fmt == 'snapshot':
+            data = encode_snapshot(tables_data, snapshot_meta(tables_data, db_type, host, database,
+                                                              fingerprint))
+        else:
+            data = json.dumps({'name': target['name'], 'db_type': db_type,
+                               'database': database, 'fingerprint': fingerprint,
+                               'tables': tables_data, 'relationships': relationships,
+                               'layout': table_layout}, indent=2, default=str).encode('utf-8')
+        write_atomic(os.path.join(target_dir, output_name(fmt)), data)
+
+    return {'status': 'rendered', 'fingerprint': fingerprint, 'options': options,
+            'tables': len(tables_data), 'oversize': oversize, 'generated_at': time.time(),
+            'seconds': time.perf_counter() - started}
+
+
+def select_tables(tables, patterns):
+    """Tables matching any shell-style pattern, or all of them without patterns"""
+    if not patterns:
+        return list(tables)
+    return [name for name in tables if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+
+def output_name(fmt):
+    if fmt == 'snapshot':
+        return 'schema.snapshot.json.gz'
+    return 'schema.json' if fmt == 'json' else f'diagram.{fmt}'
+
+
+def read_layout(target_dir):
+    """Table positions from the last run's schema.json, or None"""
+    try:
+        with open(os.path.join(target_dir, 'schema.json')) as f:
+            return json.load(f).get('layout')
+    except (OSError, ValueError):
+        return None
+
+
+def write_atomic(path, data):
+    """Replace a file in one step, so an interrupted run never leaves half an output"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def run(targets, out_dir, workers=None, force=False):
+    """Process targets in parallel; returns the number that failed"""
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, STATE_FILE)
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_target, target, state.get(target['name']),
+                                   out_dir, force): target['name']
+                   for target in targets}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{name}: failed: {e}", file=sys.stderr)
+                continue
+            status = result.pop('status')
+            seconds = result.pop('seconds')
+            print(f"{name}: {status} ({result['tables']} tables) in {seconds:.2f}s")
+            if result.get('oversize'):
+                print(f"{name}: no {', '.join(result['oversize'])}: over render_budget_mb",
+                      file=sys.stderr)
+            state[name] = result
+            # Save after every target so an interrupted run keeps what it finished
+            write_atomic(state_path, json.dumps(state, indent=2).encode('utf-8'))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('manifest', help='JSON manifest of targets')
+    parser.add_argument('--out', default='erd', help='output directory (default: erd)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='render even unchanged targets')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='process only these targets')
+    args = parser.parse_args()
+
+    targets = load_manifest(args.manifest)
+    if args.only:
+        targets = [target for target in targets if target['name'] in args.only]
+    started = time.perf_counter()
+    failed = run(targets, args.out, args.workers, args.force)
+    print(f"{len(targets)} targets, {failed} failed in {time.perf_counter() - started:.2f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Cold import benchmark for app.py
+
+Imports modules in fresh interpreters (as a gunicorn worker boot or an
+autoscaled cold start would) and reports the median wall time, plus which
+heavy libraries each import pulled in and how many threads it left running.
+
+    python benchmarks/import_benchmark.py [--modules app services.erservice] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Libraries that should only load once something actually needs them
+HEAVY = ('matplotlib', 'networkx', 'pandas', 'PIL', 'mysql.connector', 'psycopg2')
+
+PROBE = """
+import json, sys, threading, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{'seconds': seconds, 'threads': threading.active_count(),
+                  'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module, runs):
+    """Median seconds over runs, with the libraries and threads seen on the last run"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return statistics.median(r['seconds'] for r in results), results[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modules', nargs='+',
+                        default=['app', 'database.erdb', 'services.erservice'])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':<22} {'median s':>9} {'threads':>8}  heavy libraries loaded")
+    for module in args.modules:
+        seconds, last = measure(module, args.runs)
+        print(f"{module:<22} {seconds:>9.3f} {last['threads']:>8}  {', '.join(last['loaded']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
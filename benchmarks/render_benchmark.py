@@ -0,0 +1,81 @@
+"""
+Render benchmark for ERDiagramGenerator
+
+Draws synthetic schemas of increasing size (no database needed) and reports
+layout + draw + PNG encode time and the peak Python heap seen by tracemalloc.
+
+    python benchmarks/render_benchmark.py [--sizes 100 500 1000] [--dpi 100]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib.pyplot as plt  # noqa: E402
+
+from services.erservice import ERDiagramGenerator  # noqa: E402
+
+
+def synthetic_schema(num_tables, seed=42):
+    """Tables with 3-15 columns, each referencing up to two earlier tables"""
+    rng = random.Random(seed)
+    tables_data, relationships = {}, []
+    for i in range(num_tables):
+        name = f"table_{i}"
+        schema = [{'column': 'id', 'type': 'INTEGER', 'key': 'PRI'}]
+        foreign_keys = []
+        for _ in range(rng.randint(0, 2) if i else 0):
+            target = f"table_{rng.randrange(i)}"
+            column = f"{target}_id"
+            schema.append({'column': column, 'type': 'INTEGER', 'key': 'FK'})
+            foreign_keys.append({'column': column, 'referenced_table': target,
+                                 'referenced_column': 'id'})
+            relationships.append({'from_table': name, 'to_table': target,
+                                  'from_column': column, 'to_column': 'id'})
+        for j in range(rng.randint(2, 13)):
+            schema.append({'column': f"col_{j}", 'type': rng.choice(['INTEGER', 'TEXT', 'REAL']),
+                           'key': ''})
+        tables_data[name] = {'schema': schema, 'foreign_keys': foreign_keys}
+    return tables_data, relationships
+
+
+def run(num_tables, dpi):
+    tables_data, relationships = synthetic_schema(num_tables)
+    generator = ERDiagramGenerator()
+    tracemalloc.start()
+    started = time.perf_counter()
+    fig = generator.generate_diagram(tables_data, relationships)
+    drawn = time.perf_counter()
+    buffer = io.BytesIO()
+    # Same savefig call as the render worker
+    fig.savefig(buffer, format='png', dpi=dpi)
+    finished = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    plt.close(fig)
+    return {'tables': num_tables, 'artists': len(fig.axes[0].get_children()),
+            'draw_s': drawn - started, 'savefig_s': finished - drawn,
+            'total_s': finished - started, 'peak_mb': peak / 1024 / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'tables':>7} {'artists':>8} {'draw s':>8} {'savefig s':>10} {'total s':>8} {'peak MB':>8}")
+    for size in args.sizes:
+        result = run(size, args.dpi)
+        print(f"{result['tables']:>7} {result['artists']:>8} {result['draw_s']:>8.2f} "
+              f"{result['savefig_s']:>10.2f} {result['total_s']:>8.2f} {result['peak_mb']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
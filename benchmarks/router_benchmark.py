@@ -0,0 +1,103 @@
+"""
+Edge router scaling benchmark
+
+Routes the relationships of real diagram layouts (no database or drawing)
+and checks that routing time grows about linearly. Each run lays out a
+synthetic schema (render_benchmark.synthetic_schema, whose FKs reach any
+earlier table) with the layered algorithm, so the longest routes grow with
+the diagram as they do in real ones. Times are fitted to
+time ~ relationships ** slope, and the benchmark exits with status 1 when the
+slope is over --max-slope (1 is linear, 2 quadratic).
+
+Once the router's search budget runs out, long routes take the simple shape
+crossing the fewest tables, so the share of routes that cross a table is
+reported next to each time. The default sizes start where that happens;
+below it every route is searched and time grows faster.
+
+    python benchmarks/router_benchmark.py [--tables 2000 4000 8000] [--max-slope 1.15]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.render_benchmark import synthetic_schema  # noqa: E402
+from services.erservice import ERDiagramGenerator  # noqa: E402
+from services.router import EdgeRouter, SpatialGrid  # noqa: E402
+
+
+def layered(num_tables):
+    """(edges, boxes) of a synthetic schema laid out by the layered algorithm"""
+    tables_data, relationships = synthetic_schema(num_tables)
+    generator = ERDiagramGenerator()
+    layout = generator.compute_layout(tables_data, relationships, 'layered')
+    boxes = {name: generator.table_box(dims) for name, dims in layout.items()}
+    return [(rel['from_table'], rel['to_table']) for rel in relationships], boxes
+
+
+def timed(edges, boxes):
+    """(seconds, routes) of one EdgeRouter.route call"""
+    started = time.perf_counter()
+    routes = EdgeRouter().route(edges, boxes)
+    return time.perf_counter() - started, routes
+
+
+def crossing(edges, boxes, routes):
+    """Share of routes passing through a table other than their own two"""
+    names = list(boxes)
+    grid = SpatialGrid([boxes[name] for name in names])
+    crossed = 0
+    for (a, b), points in zip(edges, routes):
+        hit = set()
+        for (x1, y1), (x2, y2) in zip(points, points[1:]):
+            # Shrunk a little so routes ending on a table border do not count
+            hit |= {names[i] for i in grid.query(min(x1, x2) + 1e-3, min(y1, y2) + 1e-3,
+                                                 max(x1, x2) - 1e-3, max(y1, y2) - 1e-3)}
+        crossed += bool(hit - {a, b})
+    return crossed / len(edges) if edges else 0.0
+
+
+def slope(sizes, seconds):
+    """Least-squares exponent k of seconds ~ sizes ** k"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-9)) for value in seconds]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread if spread else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tables', type=int, nargs='+', default=[2000, 4000, 8000],
+                        help='schema sizes to lay out and route')
+    parser.add_argument('--max-slope', type=float, default=1.15)
+    args = parser.parse_args()
+
+    # Imports and NumPy warm up on a tiny diagram first
+    timed(*layered(20))
+
+    points = []
+    print(f"{'tables':>6} {'edges':>6} {'seconds':>9} {'ms/edge':>8} {'crossing':>9}")
+    for tables in args.tables:
+        edges, boxes = layered(tables)
+        seconds, routes = timed(edges, boxes)
+        points.append((len(edges), seconds))
+        print(f"{tables:>6} {len(edges):>6} {seconds:>9.3f} {seconds / len(edges) * 1000:>8.2f} "
+              f"{crossing(edges, boxes, routes):>9.1%}")
+
+    if len(points) < 2:
+        return
+    exponent = slope(*zip(*points))
+    print(f"slope {exponent:.2f}")
+    if exponent > args.max_slope:
+        print(f"SCALING routing time grows as relationships ** {exponent:.2f}, "
+              f"over the allowed {args.max_slope}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
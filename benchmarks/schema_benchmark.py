@@ -0,0 +1,301 @@
+"""
+Synthetic schema benchmark: introspection, statistics, layout and rendering
+
+Builds SQLite databases of 10 to 5,000 tables (column counts and foreign key
+density configurable) and times each stage of a diagram, first in process
+and then end to end through the Flask test client. In-process stages also
+report the peak Python heap seen by tracemalloc, measured in a separate
+pass so tracing does not skew the times. Results are written as JSON; given
+a --baseline from an earlier run, the benchmark exits with status 1 when any
+stage got slower or bigger than the baseline by more than --threshold.
+
+    python benchmarks/schema_benchmark.py [--sizes 10 100 1000 5000] [--columns 3 15]
+        [--fk-density 1.0] [--output results.json] [--baseline old.json --threshold 0.25]
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Stages below these are too short (or too small) for a ratio to mean anything
+MIN_SECONDS = 0.1
+MIN_MB = 1.0
+
+
+def build_database(path, num_tables, columns=(3, 15), fk_density=1.0, rows=100, seed=42):
+    """Create a SQLite file of synthetic tables, analyzed so row estimates exist
+
+    Each table has an integer id, on average fk_density foreign keys to
+    earlier tables and between columns[0] and columns[1] columns in all.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    try:
+        for i in range(num_tables):
+            whole, fraction = divmod(fk_density, 1)
+            count = min(i, int(whole) + (rng.random() < fraction))
+            targets = rng.sample(range(i), count)
+            definitions = ['id INTEGER PRIMARY KEY']
+            definitions += [f'table_{t}_id INTEGER REFERENCES table_{t}(id)' for t in targets]
+            plain = max(0, rng.randint(*columns) - len(definitions))
+            types = [rng.choice(['INTEGER', 'TEXT', 'REAL']) for _ in range(plain)]
+            definitions += [f'col_{j} {column_type}' for j, column_type in enumerate(types)]
+            conn.execute(f"CREATE TABLE table_{i} ({', '.join(definitions)})")
+
+            values = {'INTEGER': lambda: rng.randrange(1000), 'REAL': rng.random,
+                      'TEXT': lambda: f'v{rng.randrange(1000)}'}
+            placeholders = ', '.join('?' * (1 + len(targets) + plain))
+            conn.executemany(
+                f"INSERT INTO table_{i} VALUES ({placeholders})",
+                [[row] + [rng.randint(1, rows) for _ in targets] + [values[t]() for t in types]
+                 for row in range(1, rows + 1)]
+            )
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def measure(fn, repeat=1, memory=True, discard=None):
+    """Median seconds of fn() over repeat runs, peak traced MB of one more run, last result
+
+    discard(result) is called on every result but the one returned.
+    """
+    timings, result = [], None
+    for _ in range(repeat):
+        if result is not None and discard is not None:
+            discard(result)
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    peak_mb = None
+    if memory:
+        if discard is not None:
+            discard(result)
+        tracemalloc.start()
+        try:
+            result = fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    return {'seconds': statistics.median(timings), 'peak_mb': peak_mb}, result
+
+
+def in_process(path, args):
+    """Time DatabaseManager, layout, routing, drawing and PNG encoding directly"""
+    import matplotlib.pyplot as plt
+
+    from database.erdb import DatabaseManager
+    from database.fk_graph import ForeignKeyGraph
+    from services.erservice import ERDiagramGenerator
+
+    db_manager = DatabaseManager()
+    generator = ERDiagramGenerator()
+    stages = {}
+    conn, _ = db_manager.connect_database('sqlite', path, None, None, path)
+    try:
+        def introspect():
+            tables = db_manager.get_tables(conn, 'sqlite', path)
+            return tables, db_manager.get_catalog(conn, 'sqlite', path, tables)
+        stages['introspect'], (tables, catalog) = measure(introspect, args.repeat, args.memory)
+        stages['statistics'], _ = measure(
+            lambda: db_manager.get_tables_statistics(conn, 'sqlite', tables, path, catalog=catalog,
+                                                     mode=args.stats_mode),
+            args.repeat, args.memory)
+    finally:
+        conn.close()
+
+    relationships = ForeignKeyGraph(catalog).relationships()
+    stages['layout'], table_layout = measure(
+        lambda: generator.compute_layout(catalog, relationships, args.layout),
+        args.repeat, args.memory)
+    stages['routing'], routes = measure(
+        lambda: generator.route_relationships(relationships, table_layout),
+        args.repeat, args.memory)
+    stages['draw'], fig = measure(
+        lambda: generator.generate_diagram(catalog, relationships, args.layout, table_layout,
+                                           routes),
+        args.repeat, args.memory, discard=plt.close)
+
+    def encode():
+        buffer = io.BytesIO()
+        # Same savefig call as the render worker
+        fig.savefig(buffer, format='png', dpi=args.dpi)
+        return buffer.getvalue()
+    stages['encode'], png = measure(encode, args.repeat, args.memory)
+    plt.close(fig)
+    stages['encode']['png_bytes'] = len(png)
+    return stages, {'columns': sum(len(entry['schema']) for entry in catalog.values()),
+                    'foreign_keys': len(relationships)}
+
+
+def end_to_end(client, path, layout):
+    """Time /connect, /get_tables and a PNG /generate_er_diagram through the app
+
+    Runs once: a repeat would be answered from the app's caches. The
+    diagram request's Server-Timing stages are kept alongside.
+    """
+    stages = {}
+    started = time.perf_counter()
+    # SQLite ignores the credentials, but /connect requires them
+    response = client.post('/connect', json={'db_type': 'sqlite', 'host': path,
+                                             'user': 'benchmark', 'password': 'benchmark'})
+    stages['connect'] = {'seconds': time.perf_counter() - started}
+    if not response.json.get('success'):
+        raise RuntimeError(f"Connect failed: {response.json.get('error')}")
+    base = {'connection_id': response.json['connection_id'],
+            'database': response.json['databases'][0], 'db_type': 'sqlite'}
+
+    started = time.perf_counter()
+    tables = client.post('/get_tables', json=base).json['tables']
+    stages['get_tables'] = {'seconds': time.perf_counter() - started}
+
+    started = time.perf_counter()
+    response = client.post('/generate_er_diagram',
+                           json=dict(base, tables=tables, format='png', layout=layout))
+    stages['generate_er_diagram'] = {'seconds': time.perf_counter() - started,
+                                     'server_timing': server_timing(response)}
+    if not response.json.get('success'):
+        raise RuntimeError(f"Diagram request failed: {response.json.get('error')}")
+    return stages
+
+
+def server_timing(response):
+    """{stage: milliseconds} from a Server-Timing header"""
+    stages = {}
+    for entry in response.headers.get('Server-Timing', '').split(','):
+        name, _, params = entry.strip().partition(';')
+        for param in params.split(';'):
+            if param.startswith('dur='):
+                stages[name] = float(param[4:])
+    return stages
+
+
+def regressions(results, baseline, threshold):
+    """Descriptions of stages slower or bigger than the baseline by more than threshold"""
+    previous = {(run['tables'], group, stage): values
+                for run in baseline['results']
+                for group in ('in_process', 'end_to_end')
+                for stage, values in run.get(group, {}).items()}
+    found = []
+    for run in results:
+        for group in ('in_process', 'end_to_end'):
+            for stage, values in run.get(group, {}).items():
+                old = previous.get((run['tables'], group, stage))
+                if old is None:
+                    continue
+                for field, floor in (('seconds', MIN_SECONDS), ('peak_mb', MIN_MB)):
+                    new_value, old_value = values.get(field), old.get(field)
+                    if new_value is None or old_value is None or new_value < floor:
+                        continue
+                    if new_value > old_value * (1 + threshold):
+                        found.append(f"{run['tables']} tables {group}.{stage} {field}: "
+                                     f"{old_value:.3f} -> {new_value:.3f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--columns', type=int, nargs=2, default=[3, 15], metavar=('MIN', 'MAX'),
+                        help='columns per table, including id and foreign keys')
+    parser.add_argument('--fk-density', type=float, default=1.0,
+                        help='average foreign keys per table')
+    parser.add_argument('--rows', type=int, default=100, help='rows per table')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--layout', default='auto')
+    parser.add_argument('--stats-mode', default='estimated', choices=['estimated', 'exact'])
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per in-process stage')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='skip the tracemalloc pass')
+    parser.add_argument('--no-app', dest='app', action='store_false',
+                        help='skip the end-to-end requests')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(),
+                                                           'ergenix-benchmark'),
+                        help='where databases (reused across runs) and app caches go')
+    parser.add_argument('--output', default='schema_benchmark.json')
+    parser.add_argument('--baseline', help='results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown or growth over the baseline (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    client = None
+    if args.app:
+        # Fresh caches every run, so the app renders instead of replaying files
+        run_dir = tempfile.mkdtemp(dir=args.workdir, prefix='app-')
+        for name, folder in (('ERGENIX_RENDER_CACHE_DIR', 'render-cache'),
+                             ('ERGENIX_ARTIFACT_DIR', 'artifacts'),
+                             ('ERGENIX_SNAPSHOT_DIR', 'snapshots')):
+            os.environ[name] = os.path.join(run_dir, folder)
+        import app
+        client = app.app.test_client()
+
+    results = []
+    try:
+        # Imports, font caches and the render workers warm up on a tiny schema first
+        warm_up = os.path.join(args.workdir, f'schema_warm_up_{args.seed}.db')
+        if not os.path.exists(warm_up):
+            build_database(warm_up, 5, seed=args.seed)
+        in_process(warm_up, argparse.Namespace(**dict(vars(args), repeat=1, memory=False)))
+        if client is not None:
+            end_to_end(client, warm_up, args.layout)
+
+        print(f"{'tables':>7} {'stage':<32} {'seconds':>9} {'peak MB':>8}")
+        for size in args.sizes:
+            path = os.path.join(args.workdir, (f'schema_{size}_{args.columns[0]}-{args.columns[1]}'
+                                               f'_{args.fk_density}_{args.rows}_{args.seed}.db'))
+            if not os.path.exists(path):
+                build_database(path + '.tmp', size, args.columns, args.fk_density,
+                               args.rows, args.seed)
+                os.replace(path + '.tmp', path)
+            stages, shape = in_process(path, args)
+            run = dict({'tables': size}, **shape, in_process=stages)
+            if client is not None:
+                run['end_to_end'] = end_to_end(client, path, args.layout)
+            results.append(run)
+            for group in ('in_process', 'end_to_end'):
+                for stage, values in run.get(group, {}).items():
+                    peak = values.get('peak_mb')
+                    print(f"{size:>7} {group + '.' + stage:<32} {values['seconds']:>9.3f} "
+                          f"{'-' if peak is None else format(peak, '.1f'):>8}")
+    finally:
+        if client is not None:
+            app.render_pool.shutdown()
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'config': vars(args),
+                   'environment': {'python': platform.python_version(),
+                                   'platform': platform.platform(),
+                                   'cpus': os.cpu_count()},
+                   'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.threshold)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"No stage regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import sqlite3
+
+import pytest
+
+from benchmarks.schema_benchmark import (build_database, end_to_end, in_process, measure,
+                                         regressions, server_timing)
+
+
+@pytest.fixture(scope='module')
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('benchmark') / 'schema.db')
+    build_database(path, 40, columns=(3, 8), fk_density=1.5, rows=10)
+    return path
+
+
+def test_synthetic_databases_have_the_requested_shape(database, tmp_path):
+    conn = sqlite3.connect(database)
+    tables = [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'table_%'")]
+    widths = [len(conn.execute(f'PRAGMA table_info({name})').fetchall()) for name in tables]
+    fks = sum(len(conn.execute(f'PRAGMA foreign_key_list({name})').fetchall()) for name in tables)
+    rows = conn.execute('SELECT COUNT(*) FROM table_7').fetchone()[0]
+    analyzed = conn.execute('SELECT COUNT(*) FROM sqlite_stat1').fetchone()[0]
+    conn.close()
+    assert len(tables) == 40 and rows == 10 and analyzed
+    # The first table has nothing to reference, so a bit under 1.5 per table
+    assert 40 < fks < 70
+    assert 3 <= min(widths) and max(widths) <= 8
+
+    # The same seed builds the same schema
+    again = str(tmp_path / 'again.db')
+    build_database(again, 40, columns=(3, 8), fk_density=1.5, rows=10)
+    schemas = []
+    for path in (database, again):
+        conn = sqlite3.connect(path)
+        schemas.append(conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' "
+                                    "ORDER BY name").fetchall())
+        conn.close()
+    assert schemas[0] == schemas[1]
+
+
+def test_measure_takes_the_median_and_a_separate_memory_pass():
+    calls = []
+    values, result = measure(lambda: calls.append(bytearray(2 * 1024 * 1024)) or len(calls),
+                             repeat=3, discard=lambda result: None)
+    assert result == 4 and len(calls) == 4
+    assert values['seconds'] >= 0 and values['peak_mb'] >= 2
+    assert measure(lambda: 1, memory=False)[0]['peak_mb'] is None
+
+
+def test_server_timing_headers_become_milliseconds():
+    class Response:
+        headers = {'Server-Timing': 'catalog;dur=12.5;desc="3 queries", png-bytes;desc="9", '
+                                    'total;dur=20.0'}
+    assert server_timing(Response()) == {'catalog': 12.5, 'total': 20.0}
+
+
+def test_regressions_compare_stages_above_the_noise_floor():
+    baseline = {'results': [{'tables': 100, 'in_process': {
+        'layout': {'seconds': 1.0, 'peak_mb': 10.0},
+        'draw': {'seconds': 0.01, 'peak_mb': 0.1}}}]}
+    results = [{'tables': 100, 'in_process': {
+        'layout': {'seconds': 1.3, 'peak_mb': 11.0},
+        'draw': {'seconds': 0.05, 'peak_mb': 0.5},
+        'encode': {'seconds': 9.0}}},
+        {'tables': 1000, 'in_process': {'layout': {'seconds': 99.0}}}]
+    assert regressions(results, baseline, 0.25) == [
+        '100 tables in_process.layout seconds: 1.000 -> 1.300']
+    assert regressions(results, baseline, 0.5) == []
+
+
+def test_stages_run_in_process_and_through_the_app(database, client):
+    args = argparse.Namespace(repeat=1, memory=False, stats_mode='estimated', layout='grid',
+                              dpi=50)
+    stages, shape = in_process(database, args)
+    assert list(stages) == ['introspect', 'statistics', 'layout', 'routing', 'draw', 'encode']
+    assert stages['encode']['png_bytes'] > 0 and shape['foreign_keys'] > 40
+
+    timed = end_to_end(client, database, 'grid')
+    assert list(timed) == ['connect', 'get_tables', 'generate_er_diagram']
+    assert 'layout' in timed['generate_er_diagram']['server_timing']
@@ -0,0 +1,55 @@
+# Tests live next to the code they cover; this puts the project root on
+# sys.path so they import database.* and services.* the way app.py does
+import os
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The app, with its caches, artifacts and snapshots under a temporary folder"""
+    root = tmp_path_factory.mktemp('ergenix')
+    for name, folder in (('ERGENIX_RENDER_CACHE_DIR', 'render-cache'),
+                         ('ERGENIX_ARTIFACT_DIR', 'artifacts'),
+                         ('ERGENIX_SNAPSHOT_DIR', 'snapshots')):
+        os.environ[name] = str(root / folder)
+    os.environ.setdefault('ERGENIX_RENDER_WORKERS', '1')
+    import app
+    yield app
+    app.render_pool.shutdown()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def schema_path(tmp_path):
+    """A small SQLite shop schema: users <- orders <- items -> products"""
+    path = str(tmp_path / 'shop.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT);
+        CREATE TABLE products (id INTEGER PRIMARY KEY, title TEXT, price REAL);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id),
+                             placed_at TEXT);
+        CREATE TABLE items (id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders(id),
+                            product_id INTEGER REFERENCES products(id), quantity INTEGER);
+    """)
+    conn.executemany('INSERT INTO users VALUES (?, ?, ?)',
+                     [(i, f'user {i}', f'u{i}@example.com') for i in range(1, 21)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def session(client, schema_path):
+    """Request fields of a /connect session on the shop schema"""
+    response = client.post('/connect', json={'db_type': 'sqlite', 'host': schema_path,
+                                             'user': 'test', 'password': 'test'})
+    assert response.json['success'], response.json
+    return {'connection_id': response.json['connection_id'],
+            'database': response.json['databases'][0], 'db_type': 'sqlite'}
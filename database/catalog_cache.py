@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+from database.fk_graph import ForeignKeyGraph
+
+
+class CatalogCache:
+    """Caches table lists and catalogs in front of a DatabaseManager
+
+    Entries are keyed by (db_type, host, database), expire after ttl seconds and
+    are evicted least-recently-used beyond max_entries. Every lookup first runs
+    DatabaseManager.get_schema_fingerprint, a single cheap query, and drops the
+    entry when the schema has changed since it was filled. Queries run outside
+    the lock and their results are merged into the entry under it.
+    """
+
+    def __init__(self, db_manager, max_entries=64, ttl=900):
+        self.db_manager = db_manager
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_tables(self, conn, db_type, host, database=None):
+        """Get the table list, querying the database only when the cache is stale"""
+        entry = self._entry(conn, db_type, host, database)
+        with self._lock:
+            tables = entry['tables']
+        if tables is None:
+            tables = self.db_manager.get_tables(conn, db_type, database)
+            with self._lock:
+                entry['tables'] = tables
+        return list(tables)
+
+    def get_catalog(self, conn, db_type, host, database=None, tables=None):
+        """Get schema and foreign keys, introspecting only tables not yet cached"""
+        entry = self._entry(conn, db_type, host, database)
+        if tables is None:
+            return self._complete(entry, conn, db_type, database)
+
+        with self._lock:
+            missing = [] if entry['complete'] else [
+                name for name in tables
+                if name not in entry['catalog'] and name not in entry['absent']]
+        if missing:
+            found = self.db_manager.get_catalog(conn, db_type, database, missing)
+            with self._lock:
+                entry['catalog'].update(found)
+                entry['absent'].update(name for name in missing if name not in found)
+        with self._lock:
+            catalog = entry['catalog']
+            return {name: catalog[name] for name in tables if name in catalog}
+
+    def get_fk_graph(self, conn, db_type, host, database=None):
+        """Get the foreign key graph of the whole database, built once per catalog"""
+        entry = self._entry(conn, db_type, host, database)
+        with self._lock:
+            graph = entry['graph']
+        if graph is None:
+            graph = ForeignKeyGraph(self._complete(entry, conn, db_type, database))
+            with self._lock:
+                if entry['graph'] is None:
+                    entry['graph'] = graph
+                graph = entry['graph']
+        return graph
+
+    def invalidate(self, db_type=None, host=None, database=None):
+        """Drop cached entries matching every argument that is given"""
+        with self._lock:
+            for key in list(self._entries):
+                if all(want is None or want == have
+                       for want, have in zip((db_type, host, database), key)):
+                    del self._entries[key]
+
+    def _entry(self, conn, db_type, host, database):
+        """Get the live entry for a target, replacing it when expired or stale"""
+        key = (db_type.lower(), host, database)
+        fingerprint = self.db_manager.get_schema_fingerprint(conn, db_type, database)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is None or entry['fingerprint'] != fingerprint
+                    or now - entry['created'] > self.ttl):
+                entry = {
+                    'fingerprint': fingerprint,
+                    'created': now,
+                    'tables': None,
+                    'catalog': {},
+                    'absent': set(),
+                    'complete': False,
+                    'graph': None
+                }
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    def _complete(self, entry, conn, db_type, database):
+        """Get a copy of the entry's whole catalog, introspecting it once"""
+        with self._lock:
+            if entry['complete']:
+                return dict(entry['catalog'])
+        catalog = self.db_manager.get_catalog(conn, db_type, database)
+        with self._lock:
+            entry['catalog'].update(catalog)
+            entry['complete'] = True
+            return dict(entry['catalog'])
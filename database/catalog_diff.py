@@ -0,0 +1,76 @@
+def diff_catalogs(old, new):
+    """Compare two catalogs as returned by DatabaseManager.get_catalog
+
+    Returns {'added_tables': [...], 'dropped_tables': [...], 'altered_tables':
+    {table: changes}}, where changes lists added and dropped column names,
+    altered columns as {column: {field: [old, new]}} and added and dropped
+    foreign keys. Tables without changes are left out, so an empty diff
+    means the schemas match.
+    """
+    altered = {}
+    for table_name in old.keys() & new.keys():
+        changes = diff_tables(old[table_name], new[table_name])
+        if changes:
+            altered[table_name] = changes
+    return {
+        'added_tables': sorted(new.keys() - old.keys()),
+        'dropped_tables': sorted(old.keys() - new.keys()),
+        'altered_tables': dict(sorted(altered.items()))
+    }
+
+
+def diff_tables(old, new):
+    """Changes between two catalog entries of one table, or {} if none"""
+    old_columns = {column['column']: column for column in old['schema']}
+    new_columns = {column['column']: column for column in new['schema']}
+    changes = {}
+
+    added = [name for name in new_columns if name not in old_columns]
+    dropped = [name for name in old_columns if name not in new_columns]
+    if added:
+        changes['added_columns'] = added
+    if dropped:
+        changes['dropped_columns'] = dropped
+
+    altered = {}
+    for name in old_columns.keys() & new_columns.keys():
+        fields = {field: [old_columns[name].get(field), new_columns[name].get(field)]
+                  for field in old_columns[name].keys() | new_columns[name].keys()
+                  if old_columns[name].get(field) != new_columns[name].get(field)}
+        if fields:
+            altered[name] = fields
+    if altered:
+        changes['altered_columns'] = dict(sorted(altered.items()))
+
+    old_keys = [_fk_key(fk) for fk in old['foreign_keys']]
+    new_keys = [_fk_key(fk) for fk in new['foreign_keys']]
+    added_fks = [fk for fk, key in zip(new['foreign_keys'], new_keys) if key not in old_keys]
+    dropped_fks = [fk for fk, key in zip(old['foreign_keys'], old_keys) if key not in new_keys]
+    if added_fks:
+        changes['added_foreign_keys'] = added_fks
+    if dropped_fks:
+        changes['dropped_foreign_keys'] = dropped_fks
+    return changes
+
+
+def is_empty(diff):
+    """Whether a diff_catalogs result records no change"""
+    return not (diff['added_tables'] or diff['dropped_tables'] or diff['altered_tables'])
+
+
+def affected_tables(diff):
+    """Names of the tables a diff_catalogs result touches
+
+    Besides added, dropped and altered tables this includes the tables that
+    added or dropped foreign keys point at, since their connectors change too.
+    """
+    names = set(diff['added_tables']) | set(diff['dropped_tables'])
+    for table_name, changes in diff['altered_tables'].items():
+        names.add(table_name)
+        for fk in changes.get('added_foreign_keys', []) + changes.get('dropped_foreign_keys', []):
+            names.add(fk['referenced_table'])
+    return names
+
+
+def _fk_key(fk):
+    return fk['column'], fk['referenced_table'], fk['referenced_column']
@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class StatisticsCollector:
+    """Gathers table statistics concurrently on pooled connections
+
+    Row estimates and sizes come from one bulk query. Tables that need an
+    exact COUNT(*) are counted in parallel by a bounded worker pool, each on its
+    own connection checked out from the ConnectionManager and each under a
+    per-query timeout. Counts that time out, fail or miss the overall deadline
+    fall back to the estimate and are flagged as partial instead of failing the
+    whole request.
+    """
+
+    def __init__(self, db_manager, connection_manager, max_workers=4, query_timeout=10):
+        self.db_manager = db_manager
+        self.connection_manager = connection_manager
+        self.query_timeout = query_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='ergenix-stats')
+
+    def collect(self, conn_id, db_type, tables, database=None, catalog=None, mode='estimated',
+                exact_threshold=None, query_timeout=None, deadline=None, cancel_event=None,
+                progress=None, touch=True):
+        """Get statistics for tables; deadline bounds the whole call in seconds
+
+        progress, if given, is called as progress(done, total) as exact counts finish.
+        touch=False leaves the session's last use alone (background sampling).
+        """
+        if mode not in ('estimated', 'exact'):
+            raise ValueError(f"Unsupported statistics mode: {mode}")
+        query_timeout = query_timeout or self.query_timeout
+        # Set when this call gives up; the caller's cancel_event is only ever read
+        stop = threading.Event()
+
+        with self.connection_manager.connection(conn_id, database, touch=touch) as conn:
+            if catalog is None:
+                catalog = self.db_manager.get_catalog(conn, db_type, database, tables)
+            estimates = self.db_manager.get_row_estimates(conn, db_type, database, tables)
+
+        tables = [name for name in tables if name in catalog]
+        estimates = {name: estimates.get(name, {'row_count': None, 'size_mb': 'N/A'})
+                     for name in tables}
+
+        running = {}  # table -> connection, so stragglers can be cancelled
+        running_lock = threading.Lock()
+        futures = {}
+        for table_name in tables:
+            if self.db_manager.needs_exact_count(estimates[table_name], mode, exact_threshold):
+                future = self._executor.submit(self._count, conn_id, db_type, table_name, database,
+                                               query_timeout, stop, running, running_lock, touch)
+                futures[future] = table_name
+
+        counts, errors = {}, {}
+        end = time.monotonic() + deadline if deadline else None
+        pending = set(futures)
+        if progress is not None:
+            progress(0, len(futures))
+        while pending and not (cancel_event is not None and cancel_event.is_set()):
+            remaining = None if end is None else end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=min(remaining or 0.5, 0.5),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                table_name = futures[future]
+                try:
+                    counts[table_name] = future.result()
+                except Exception as e:
+                    errors[table_name] = e
+            if done and progress is not None:
+                progress(len(counts) + len(errors), len(futures))
+
+        # Deadline passed or caller cancelled: drop queued counts, abort running ones
+        if pending:
+            stop.set()
+            for future in pending:
+                future.cancel()
+                errors[futures[future]] = TimeoutError('Statistics deadline exceeded')
+            with running_lock:
+                stragglers = list(running.values())
+            for conn in stragglers:
+                try:
+                    self.db_manager.cancel_query(conn, db_type)
+                except Exception:
+                    pass
+
+        statistics = {}
+        for table_name in tables:
+            stats = self.db_manager.build_statistics(catalog[table_name], estimates[table_name],
+                                                     counts.get(table_name))
+            if table_name in errors:
+                error = errors[table_name]
+                stats['partial'] = True
+                stats['timed_out'] = (isinstance(error, TimeoutError)
+                                      or self.db_manager.is_timeout_error(error))
+                stats['error'] = str(error)
+            statistics[table_name] = stats
+        return statistics
+
+    def _count(self, conn_id, db_type, table_name, database, query_timeout, stop,
+               running, running_lock, touch=True):
+        """Worker: COUNT(*) one table on its own connection under a timeout"""
+        if stop.is_set():
+            raise TimeoutError('Statistics collection cancelled')
+        with self.connection_manager.connection(conn_id, database, touch=touch) as conn:
+            with running_lock:
+                running[table_name] = conn
+            try:
+                self.db_manager.set_query_timeout(conn, db_type, query_timeout, stop)
+                try:
+                    return self.db_manager.count_rows(conn, db_type, table_name, database)
+                finally:
+                    try:
+                        self.db_manager.set_query_timeout(conn, db_type, None)
+                    except Exception:
+                        pass  # A failed query may leave the session unusable; it is discarded
+            finally:
+                with running_lock:
+                    running.pop(table_name, None)
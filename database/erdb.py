@@ -1,24 +1,54 @@
-import sqlite3
-import mysql.connector
-import psycopg2
+import importlib
+import random
+import time
 
 
 class DatabaseManager:
+    # Driver module and the package that provides it, per database type. Drivers
+    # are imported the first time their type is used, so a server that only
+    # opens SQLite files never loads the MySQL or PostgreSQL client libraries.
+    DRIVERS = {
+        'mysql': ('mysql.connector', 'mysql-connector-python'),
+        'postgresql': ('psycopg2', 'psycopg2-binary'),
+        'sqlite': ('sqlite3', None)
+    }
+
     def __init__(self):
-        self.supported_dbs = ['mysql', 'postgresql', 'sqlite']
+        self.supported_dbs = list(self.DRIVERS)
+        self._drivers = {}
+
+    @classmethod
+    def register_driver(cls, db_type, module, package=None):
+        """Add (or replace) the driver module used for a database type"""
+        cls.DRIVERS[db_type.lower()] = (module, package)
+
+    def driver(self, db_type):
+        """Get the DB-API module for a database type, importing it on first use"""
+        name = db_type.lower()
+        module = self._drivers.get(name)
+        if module is None:
+            if name not in self.DRIVERS:
+                raise ValueError(f"Unsupported database type: {db_type}")
+            module_name, package = self.DRIVERS[name]
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                raise ImportError(f"{db_type} support needs the {package or module_name} package")
+            self._drivers[name] = module
+        return module
     
     def connect_database(self, db_type, host, user, password, database=None):
         """Connect to database based on type"""
         try:
             if db_type.lower() == 'mysql':
-                conn = mysql.connector.connect(
+                conn = self.driver(db_type).connect(
                     host=host,
                     user=user,
                     password=password,
                     database=database if database else None  # Connect without database if not provided
                 )
             elif db_type.lower() == 'postgresql':
-                conn = psycopg2.connect(
+                conn = self.driver(db_type).connect(
                     host=host,
                     user=user,
                     password=password,
@@ -27,7 +57,8 @@ class DatabaseManager:
             elif db_type.lower() == 'sqlite':
                 if not database:
                     raise ValueError("SQLite requires a database file path")
-                conn = sqlite3.connect(database)
+                # Pooled connections are handed between request threads, one at a time
+                conn = self.driver(db_type).connect(database, check_same_thread=False)
             else:
                 raise ValueError(f"Unsupported database type: {db_type}")
             
@@ -41,6 +72,21 @@ class DatabaseManager:
         except Exception as e:
             raise Exception(f"Database connection failed: {str(e)}")
     
+    def ping(self, conn, db_type):
+        """Check that a connection is still usable"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
     def get_databases(self, conn, db_type):
         """Get list of databases"""
         cursor = conn.cursor()
@@ -202,8 +248,189 @@ class DatabaseManager:
         finally:
             cursor.close()
     
-    def get_table_statistics(self, conn, db_type, table_name, database=None):
-        """Get table statistics"""
+    def get_schema_fingerprint(self, conn, db_type, database=None):
+        """Get a cheap value that changes whenever the database schema changes"""
+        cursor = conn.cursor()
+        try:
+            if db_type.lower() == 'mysql':
+                cursor.execute("""
+                    SELECT COUNT(*), MAX(CREATE_TIME), MAX(UPDATE_TIME)
+                    FROM information_schema.TABLES
+                    WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE())
+                """, [database])
+            elif db_type.lower() == 'postgresql':
+                # Checksum of every user column plus every constraint in the schema
+                cursor.execute("""
+                    SELECT
+                        (SELECT md5(string_agg(c.oid::text || ':' || a.attnum || ':' || a.attname
+                                               || ':' || a.atttypid::text || ':' || a.attnotnull::text,
+                                               ',' ORDER BY c.oid, a.attnum))
+                         FROM pg_class c
+                         JOIN pg_namespace n ON n.oid = c.relnamespace
+                         JOIN pg_attribute a ON a.attrelid = c.oid
+                         WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+                         AND a.attnum > 0 AND NOT a.attisdropped),
+                        (SELECT md5(string_agg(co.oid::text || ':' || co.contype::text,
+                                               ',' ORDER BY co.oid))
+                         FROM pg_constraint co
+                         JOIN pg_namespace n ON n.oid = co.connamespace
+                         WHERE n.nspname = 'public')
+                """)
+            elif db_type.lower() == 'sqlite':
+                cursor.execute("PRAGMA schema_version")
+            else:
+                raise ValueError(f"Unsupported database type: {db_type}")
+            return str(cursor.fetchone())
+        finally:
+            cursor.close()
+
+    def get_catalog(self, conn, db_type, database=None, tables=None):
+        """Get schema and foreign keys for many tables in a fixed number of queries
+
+        Returns {table_name: {'schema': [...], 'foreign_keys': [...]}} using the same
+        column and foreign key dicts as get_table_schema / get_foreign_keys. When
+        tables is given the result is limited to (and ordered like) that list.
+        """
+        cursor = conn.cursor()
+        try:
+            catalog = {}
+            db = db_type.lower()
+            if db == 'mysql':
+                table_filter, params = self._table_filter(db, 'TABLE_NAME', tables)
+                cursor.execute(f"""
+                    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE,
+                           COLUMN_KEY, COLUMN_DEFAULT, EXTRA
+                    FROM information_schema.COLUMNS
+                    WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE()){table_filter}
+                    ORDER BY TABLE_NAME, ORDINAL_POSITION
+                """, [database] + params)
+                for col in cursor.fetchall():
+                    catalog.setdefault(col[0], {'schema': [], 'foreign_keys': []})['schema'].append({
+                        'column': col[1],
+                        'type': col[2],
+                        'null': col[3],
+                        'key': col[4],
+                        'default': col[5],
+                        'extra': col[6]
+                    })
+                cursor.execute(f"""
+                    SELECT TABLE_NAME, COLUMN_NAME,
+                           REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+                    FROM information_schema.KEY_COLUMN_USAGE
+                    WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE())
+                    AND REFERENCED_TABLE_NAME IS NOT NULL{table_filter}
+                    ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+                """, [database] + params)
+                fk_rows = cursor.fetchall()
+            elif db == 'postgresql':
+                table_filter, params = self._table_filter(db, 'table_name', tables)
+                cursor.execute(f"""
+                    SELECT table_name, column_name, data_type, is_nullable, column_default
+                    FROM information_schema.columns
+                    WHERE table_schema = 'public'{table_filter}
+                    ORDER BY table_name, ordinal_position
+                """, params)
+                for col in cursor.fetchall():
+                    catalog.setdefault(col[0], {'schema': [], 'foreign_keys': []})['schema'].append({
+                        'column': col[1],
+                        'type': col[2],
+                        'null': col[3],
+                        'key': '',
+                        'default': col[4],
+                        'extra': ''
+                    })
+                # Primary and foreign keys in one pass over the constraint views
+                table_filter, params = self._table_filter(db, 'tc.table_name', tables)
+                cursor.execute(f"""
+                    SELECT
+                        tc.constraint_type,
+                        kcu.table_name,
+                        kcu.column_name,
+                        ccu.table_name AS foreign_table_name,
+                        ccu.column_name AS foreign_column_name
+                    FROM information_schema.table_constraints AS tc
+                    JOIN information_schema.key_column_usage AS kcu
+                        ON tc.constraint_name = kcu.constraint_name
+                        AND tc.table_schema = kcu.table_schema
+                    LEFT JOIN information_schema.constraint_column_usage AS ccu
+                        ON tc.constraint_type = 'FOREIGN KEY'
+                        AND ccu.constraint_name = tc.constraint_name
+                        AND ccu.constraint_schema = tc.constraint_schema
+                    WHERE tc.table_schema = 'public'
+                    AND tc.constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY'){table_filter}
+                    ORDER BY kcu.table_name, kcu.ordinal_position
+                """, params)
+                fk_rows = []
+                for row in cursor.fetchall():
+                    if row[0] == 'PRIMARY KEY':
+                        for col in catalog.get(row[1], {}).get('schema', []):
+                            if col['column'] == row[2]:
+                                col['key'] = 'PRI'
+                    else:
+                        fk_rows.append(row[1:])
+            elif db == 'sqlite':
+                table_filter, params = self._table_filter(db, 'm.name', tables)
+                cursor.execute(f"""
+                    SELECT m.name, p.name, p.type, p."notnull", p.dflt_value, p.pk
+                    FROM sqlite_master AS m
+                    JOIN pragma_table_info(m.name) AS p
+                    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'{table_filter}
+                    ORDER BY m.name, p.cid
+                """, params)
+                for col in cursor.fetchall():
+                    catalog.setdefault(col[0], {'schema': [], 'foreign_keys': []})['schema'].append({
+                        'column': col[1],
+                        'type': col[2],
+                        'null': 'NO' if col[3] else 'YES',
+                        'key': 'PRI' if col[5] else '',
+                        'default': col[4],
+                        'extra': ''
+                    })
+                cursor.execute(f"""
+                    SELECT m.name, f."from", f."table", f."to"
+                    FROM sqlite_master AS m
+                    JOIN pragma_foreign_key_list(m.name) AS f
+                    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'{table_filter}
+                    ORDER BY m.name, f.id, f.seq
+                """, params)
+                fk_rows = cursor.fetchall()
+            else:
+                raise ValueError(f"Unsupported database type: {db_type}")
+
+            for fk in fk_rows:
+                if fk[0] in catalog:
+                    catalog[fk[0]]['foreign_keys'].append({
+                        'column': fk[1],
+                        'referenced_table': fk[2],
+                        'referenced_column': fk[3]
+                    })
+
+            if tables is not None:
+                catalog = {name: catalog[name] for name in tables if name in catalog}
+            return catalog
+        finally:
+            cursor.close()
+
+    def _table_filter(self, db, column, tables):
+        """Build an optional 'AND column IN (...)' clause with driver placeholders"""
+        if tables is None:
+            return '', []
+        tables = list(tables)
+        if not tables:
+            return " AND 1 = 0", []
+        if db == 'postgresql':
+            return f" AND {column} = ANY(%s)", [tables]
+        if db == 'sqlite':
+            # Stay under SQLITE_MAX_VARIABLE_NUMBER; get_catalog filters the rest
+            if len(tables) > 500:
+                return '', []
+            placeholders = ', '.join('?' for _ in tables)
+        else:
+            placeholders = ', '.join('%s' for _ in tables)
+        return f" AND {column} IN ({placeholders})", tables
+
+    def get_table_statistics(self, conn, db_type, table_name, database=None, schema=None):
+        """Get table statistics (pass schema from get_catalog to skip a lookup)"""
         cursor = conn.cursor()
         try:
             stats = {}
@@ -217,9 +444,11 @@ class DatabaseManager:
             elif db_type.lower() == 'sqlite':
                 cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
                 stats['row_count'] = cursor.fetchone()[0]
+            stats['row_count_estimated'] = False
             
             # Get column count
-            schema = self.get_table_schema(conn, db_type, table_name, database)
+            if schema is None:
+                schema = self.get_table_schema(conn, db_type, table_name, database)
             stats['column_count'] = len(schema)
             
             # Get table size (approximate)
@@ -242,3 +471,349 @@ class DatabaseManager:
             return stats
         finally:
             cursor.close()
+
+    # Range samples read this many runs of consecutive keys from random starts
+    SAMPLE_RUNS = 10
+
+    def get_column_profiles(self, conn, db_type, table_name, database=None, sample_size=10000):
+        """Profile a table's columns from a sample of at most sample_size rows
+
+        Returns {'table', 'sample_rows', 'row_estimate', 'method', 'columns'};
+        see profiler.profile_sample for the per-column entries. The sample
+        never scans the table, so the cost does not grow with its size.
+        """
+        from database.profiler import profile_sample
+
+        columns, rows, method, row_estimate = self.sample_rows(
+            conn, db_type, table_name, database, sample_size)
+        return {
+            'table': table_name,
+            'sample_rows': len(rows),
+            'row_estimate': row_estimate,
+            'method': method,
+            'columns': profile_sample(columns, rows, row_estimate)
+        }
+
+    def sample_rows(self, conn, db_type, table_name, database=None, sample_size=10000):
+        """Read a bounded sample of a table's rows
+
+        Returns (columns, rows, method, row_estimate). PostgreSQL samples whole
+        pages with TABLESAMPLE SYSTEM, sized from the planner estimate. MySQL
+        and SQLite read SAMPLE_RUNS runs of consecutive keys starting at random
+        points of the integer primary key or rowid range, each an index range
+        scan. Tables no bigger than the sample, or without such a key, are
+        read from the start ('head').
+        """
+        cursor = conn.cursor()
+        try:
+            db = db_type.lower()
+            table = self.quote_identifier(db, table_name)
+            if db == 'mysql':
+                if database:
+                    cursor.execute(f"USE {database}")
+                cursor.execute("""
+                    SELECT k.COLUMN_NAME, c.DATA_TYPE
+                    FROM information_schema.KEY_COLUMN_USAGE k
+                    JOIN information_schema.COLUMNS c
+                      ON c.TABLE_SCHEMA = k.TABLE_SCHEMA AND c.TABLE_NAME = k.TABLE_NAME
+                     AND c.COLUMN_NAME = k.COLUMN_NAME
+                    WHERE k.CONSTRAINT_NAME = 'PRIMARY' AND k.TABLE_SCHEMA = DATABASE()
+                      AND k.TABLE_NAME = %s
+                """, (table_name,))
+                key = cursor.fetchall()
+                cursor.execute("""
+                    SELECT TABLE_ROWS FROM information_schema.TABLES
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                """, (table_name,))
+                result = cursor.fetchone()
+                row_estimate = result[0] if result else None
+                if len(key) == 1 and key[0][1].lower() in ('tinyint', 'smallint', 'mediumint',
+                                                            'int', 'bigint'):
+                    return self._range_sample(cursor, table, self.quote_identifier(db, key[0][0]),
+                                              '%s', sample_size, 'pk_range', row_estimate)
+            elif db == 'postgresql':
+                cursor.execute("""
+                    SELECT c.reltuples::bigint FROM pg_class c
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = 'public' AND c.relname = %s
+                """, (table_name,))
+                result = cursor.fetchone()
+                row_estimate = result[0] if result and result[0] >= 0 else None
+                if row_estimate and row_estimate > sample_size:
+                    # Oversample pages a little; LIMIT trims the excess
+                    percent = min(100.0, 120.0 * sample_size / row_estimate)
+                    cursor.execute(
+                        f"SELECT * FROM {table} TABLESAMPLE SYSTEM (%s) LIMIT %s",
+                        (percent, sample_size))
+                    rows = cursor.fetchall()
+                    return ([d[0] for d in cursor.description], rows, 'tablesample',
+                            row_estimate)
+            elif db == 'sqlite':
+                row_estimate = None
+                try:
+                    return self._range_sample(cursor, table, 'rowid', '?', sample_size,
+                                              'rowid_range', None)
+                except self.driver(db).OperationalError:
+                    pass  # WITHOUT ROWID table
+            else:
+                raise ValueError(f"Unsupported database type: {db_type}")
+
+            placeholder = '?' if db == 'sqlite' else '%s'
+            cursor.execute(f"SELECT * FROM {table} LIMIT {placeholder}", (sample_size,))
+            rows = cursor.fetchall()
+            return [d[0] for d in cursor.description], rows, 'head', row_estimate
+        finally:
+            cursor.close()
+
+    def _range_sample(self, cursor, table, key, placeholder, sample_size, method,
+                      row_estimate):
+        """Sample runs of consecutive integer keys from random points of the key range
+
+        table and key are quoted identifiers.
+        """
+        cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {table}")
+        low, high = cursor.fetchone()
+        if low is None:
+            cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+            return [d[0] for d in cursor.description], [], method, 0
+        # Gaps make the key span an upper bound of the row count
+        row_estimate = row_estimate or high - low + 1
+        if high - low + 1 <= sample_size:
+            cursor.execute(f"SELECT * FROM {table}")
+            rows = cursor.fetchall()
+            return [d[0] for d in cursor.description], rows, 'head', len(rows)
+
+        run = -(-sample_size // self.SAMPLE_RUNS)
+        starts = sorted(random.randint(low, high) for _ in range(self.SAMPLE_RUNS))
+        rows, columns, after = [], None, low - 1
+        for start in starts:
+            # Runs never overlap, so no row is sampled twice
+            cursor.execute(
+                f"SELECT *, {key} FROM {table} WHERE {key} >= {placeholder} "
+                f"ORDER BY {key} LIMIT {placeholder}", (max(start, after + 1), run))
+            batch = cursor.fetchall()
+            if columns is None:
+                columns = [d[0] for d in cursor.description][:-1]
+            if batch:
+                after = batch[-1][-1]
+                rows.extend(row[:-1] for row in batch)
+        return columns, rows[:sample_size], method, row_estimate
+
+    def get_row_estimates(self, conn, db_type, database=None, tables=None):
+        """Get planner row estimates and sizes for many tables in one query
+
+        Returns {table_name: {'row_count': int or None, 'size_mb': float or 'N/A'}};
+        row_count is None when the engine has no estimate for the table yet.
+        """
+        cursor = conn.cursor()
+        try:
+            estimates = {}
+            db = db_type.lower()
+            if db == 'mysql':
+                table_filter, params = self._table_filter(db, 'TABLE_NAME', tables)
+                cursor.execute(f"""
+                    SELECT TABLE_NAME, TABLE_ROWS,
+                           ROUND(((DATA_LENGTH + INDEX_LENGTH) / 1024 / 1024), 2)
+                    FROM information_schema.TABLES
+                    WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE()){table_filter}
+                """, [database] + params)
+                for name, rows, size_mb in cursor.fetchall():
+                    estimates[name] = {'row_count': rows, 'size_mb': size_mb if size_mb is not None else 0}
+            elif db == 'postgresql':
+                table_filter, params = self._table_filter(db, 'c.relname', tables)
+                cursor.execute(f"""
+                    SELECT c.relname, c.reltuples::bigint, c.relpages, c.relkind,
+                           pg_relation_size(c.oid),
+                           ROUND(pg_total_relation_size(c.oid) / 1024.0 / 1024.0, 2)
+                    FROM pg_class c
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p'){table_filter}
+                """, params)
+                for name, rows, pages, kind, stored, size_mb in cursor.fetchall():
+                    # reltuples is -1 until the table is analyzed on PostgreSQL 14+,
+                    # but 0 before 14; a 0 is only trusted for a table with no pages
+                    # (by the statistics or on disk) and no partitions
+                    if rows < 0 or (rows == 0 and (pages > 0 or stored > 0 or kind == 'p')):
+                        rows = None
+                    estimates[name] = {'row_count': rows, 'size_mb': size_mb}
+            elif db == 'sqlite':
+                cursor.execute("""
+                    SELECT name FROM sqlite_master
+                    WHERE type='table' AND name NOT LIKE 'sqlite_%'
+                """)
+                for (name,) in cursor.fetchall():
+                    estimates[name] = {'row_count': None, 'size_mb': 'N/A'}
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+                if cursor.fetchone():
+                    # The first integer of each stat line is the row count ANALYZE saw
+                    cursor.execute("""
+                        SELECT tbl, MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 GROUP BY tbl
+                    """)
+                    for name, rows in cursor.fetchall():
+                        if name in estimates:
+                            estimates[name]['row_count'] = rows
+            else:
+                raise ValueError(f"Unsupported database type: {db_type}")
+
+            if tables is not None:
+                estimates = {name: estimates[name] for name in tables if name in estimates}
+            return estimates
+        finally:
+            cursor.close()
+
+    def get_activity_counters(self, conn, db_type, database=None, tables=None):
+        """Get cumulative read/write counters for many tables in one query
+
+        Returns {table_name: {'reads': int, 'writes': int, 'last_write': epoch or None}}.
+        PostgreSQL counts scans and modified tuples in pg_stat_user_tables; MySQL
+        counts row I/O in performance_schema and may know the last write time.
+        Counters only grow until the server restarts or its statistics are
+        reset. SQLite keeps no counters, and neither does MySQL with
+        performance_schema disabled; both give an empty dict.
+        """
+        cursor = conn.cursor()
+        try:
+            counters = {}
+            db = db_type.lower()
+            if db == 'mysql':
+                table_filter, params = self._table_filter(db, 't.TABLE_NAME', tables)
+                try:
+                    cursor.execute(f"""
+                        SELECT t.TABLE_NAME, io.COUNT_READ, io.COUNT_WRITE,
+                               UNIX_TIMESTAMP(t.UPDATE_TIME)
+                        FROM information_schema.TABLES t
+                        JOIN performance_schema.table_io_waits_summary_by_table io
+                          ON io.OBJECT_TYPE = 'TABLE' AND io.OBJECT_SCHEMA = t.TABLE_SCHEMA
+                         AND io.OBJECT_NAME = t.TABLE_NAME
+                        WHERE t.TABLE_SCHEMA = COALESCE(%s, DATABASE()){table_filter}
+                    """, [database] + params)
+                except self.driver(db).Error:
+                    # performance_schema is disabled or not readable by this user
+                    return {}
+                for name, reads, writes, last_write in cursor.fetchall():
+                    counters[name] = {'reads': int(reads), 'writes': int(writes),
+                                      'last_write': float(last_write) if last_write else None}
+            elif db == 'postgresql':
+                table_filter, params = self._table_filter(db, 'relname', tables)
+                cursor.execute(f"""
+                    SELECT relname, seq_scan + COALESCE(idx_scan, 0),
+                           n_tup_ins + n_tup_upd + n_tup_del
+                    FROM pg_stat_user_tables
+                    WHERE schemaname = 'public'{table_filter}
+                """, params)
+                for name, reads, writes in cursor.fetchall():
+                    counters[name] = {'reads': reads, 'writes': writes, 'last_write': None}
+            elif db != 'sqlite':
+                raise ValueError(f"Unsupported database type: {db_type}")
+            return counters
+        finally:
+            cursor.close()
+
+    def get_tables_statistics(self, conn, db_type, tables, database=None, catalog=None,
+                              mode='estimated', exact_threshold=None):
+        """Get statistics for many tables, using planner row estimates by default
+
+        mode='estimated' reports the engine's estimate and only counts tables the
+        engine has no estimate for. mode='exact' runs COUNT(*) as well, but skips
+        tables whose estimate exceeds exact_threshold (when given). Every entry
+        carries row_count_estimated so callers can tell the two apart.
+        """
+        if mode not in ('estimated', 'exact'):
+            raise ValueError(f"Unsupported statistics mode: {mode}")
+        if catalog is None:
+            catalog = self.get_catalog(conn, db_type, database, tables)
+        estimates = self.get_row_estimates(conn, db_type, database, tables)
+
+        statistics = {}
+        for table_name in tables:
+            if table_name not in catalog:
+                continue
+            estimate = estimates.get(table_name, {'row_count': None, 'size_mb': 'N/A'})
+            exact_count = None
+            if self.needs_exact_count(estimate, mode, exact_threshold):
+                exact_count = self.count_rows(conn, db_type, table_name, database)
+            statistics[table_name] = self.build_statistics(catalog[table_name], estimate, exact_count)
+        return statistics
+
+    def needs_exact_count(self, estimate, mode, exact_threshold=None):
+        """Decide whether a table's row estimate should be replaced by COUNT(*)"""
+        if estimate['row_count'] is None:
+            return True
+        return mode == 'exact' and (exact_threshold is None or estimate['row_count'] <= exact_threshold)
+
+    def build_statistics(self, table_info, estimate, exact_count=None):
+        """Assemble one table's statistics entry from its catalog info and estimate"""
+        return {
+            'row_count': exact_count if exact_count is not None else estimate['row_count'],
+            'row_count_estimated': exact_count is None,
+            'column_count': len(table_info['schema']),
+            'size_mb': estimate['size_mb'],
+            'last_update': 'N/A',
+            'usage_frequency': 'N/A',
+            'growth_rate': 'N/A'
+        }
+
+    def count_rows(self, conn, db_type, table_name, database=None):
+        """Get the exact row count of one table"""
+        cursor = conn.cursor()
+        try:
+            if database and db_type.lower() == 'mysql':
+                cursor.execute(f"USE {database}")
+            cursor.execute(f"SELECT COUNT(*) FROM {self.quote_identifier(db_type, table_name)}")
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def quote_identifier(self, db_type, name):
+        """Quote a table or column name for use in SQL text"""
+        if db_type.lower() == 'mysql':
+            return '`' + name.replace('`', '``') + '`'
+        return '"' + name.replace('"', '""') + '"'
+
+    def set_query_timeout(self, conn, db_type, seconds=None, cancel_event=None):
+        """Bound how long each following query on conn may run (None clears it)
+
+        Uses statement_timeout on PostgreSQL, MAX_EXECUTION_TIME on MySQL (SELECT
+        only) and a progress handler on SQLite, which also aborts the running
+        query as soon as cancel_event is set.
+        """
+        db = db_type.lower()
+        millis = int(seconds * 1000) if seconds else 0
+        if db == 'sqlite':
+            if not millis and cancel_event is None:
+                conn.set_progress_handler(None, 0)
+                return
+            deadline = time.monotonic() + seconds if millis else None
+
+            def interrupt():
+                if cancel_event is not None and cancel_event.is_set():
+                    return 1
+                return 1 if deadline is not None and time.monotonic() > deadline else 0
+            conn.set_progress_handler(interrupt, 10000)
+            return
+
+        cursor = conn.cursor()
+        try:
+            if db == 'postgresql':
+                cursor.execute(f"SET statement_timeout = {millis}")
+            elif db == 'mysql':
+                cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {millis}")
+        finally:
+            cursor.close()
+
+    def cancel_query(self, conn, db_type):
+        """Abort the query currently running on conn from another thread"""
+        db = db_type.lower()
+        if db == 'postgresql':
+            conn.cancel()
+        elif db == 'sqlite':
+            conn.interrupt()
+        # MySQL has no client-side cancel; MAX_EXECUTION_TIME bounds the query instead
+
+    def is_timeout_error(self, error):
+        """Check whether an exception came from a query timeout or cancellation"""
+        message = str(error).lower()
+        return ('statement timeout' in message            # PostgreSQL
+                or 'canceling statement' in message       # PostgreSQL cancel()
+                or 'maximum statement execution time' in message  # MySQL 3024
+                or 'interrupted' in message)              # SQLite
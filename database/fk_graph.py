@@ -0,0 +1,71 @@
+class ForeignKeyGraph:
+    """Foreign keys of a catalog as forward and reverse adjacency sets
+
+    forward maps each table to the tables it references and reverse to the
+    tables referencing it, so both directions and membership checks cost
+    O(1) per table. Foreign keys to tables outside the catalog are dropped.
+    """
+
+    DIRECTIONS = ('both', 'referenced', 'referencing')
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.forward = {name: set() for name in catalog}
+        self.reverse = {name: set() for name in catalog}
+        for table_name, entry in catalog.items():
+            for fk in entry['foreign_keys']:
+                if fk['referenced_table'] in self.forward:
+                    self.forward[table_name].add(fk['referenced_table'])
+                    self.reverse[fk['referenced_table']].add(table_name)
+
+    def __contains__(self, table_name):
+        return table_name in self.forward
+
+    def neighborhood(self, centers, depth=1, direction='both', max_tables=None):
+        """Tables within depth foreign key hops of the centers
+
+        direction 'referenced' follows foreign keys to the tables they point
+        at, 'referencing' follows them back, and 'both' does either at every
+        hop. Returns {table: hops}, centers at 0, in breadth-first order;
+        with max_tables the search stops once that many tables are found.
+        Unknown centers are ignored.
+        """
+        if direction not in self.DIRECTIONS:
+            raise ValueError(f"Unsupported direction: {direction}")
+        adjacency = []
+        if direction in ('both', 'referenced'):
+            adjacency.append(self.forward)
+        if direction in ('both', 'referencing'):
+            adjacency.append(self.reverse)
+
+        hops = {name: 0 for name in centers if name in self.forward}
+        frontier = list(hops)
+        for hop in range(1, depth + 1):
+            found = []
+            for table_name in frontier:
+                for edges in adjacency:
+                    # Sorted so a cut-off by max_tables is the same on every call
+                    for other in sorted(edges[table_name]):
+                        if other not in hops:
+                            if max_tables is not None and len(hops) >= max_tables:
+                                return hops
+                            hops[other] = hop
+                            found.append(other)
+            if not found:
+                break
+            frontier = found
+        return hops
+
+    def relationships(self, tables=None):
+        """Relationship dicts for the foreign keys among tables (default: all)
+
+        Each is {'from_table', 'to_table', 'from_column', 'to_column'}, in
+        catalog order.
+        """
+        selected = self.forward.keys() if tables is None else set(tables)
+        return [
+            {'from_table': table_name, 'to_table': fk['referenced_table'],
+             'from_column': fk['column'], 'to_column': fk['referenced_column']}
+            for table_name, entry in self.catalog.items() if table_name in selected
+            for fk in entry['foreign_keys'] if fk['referenced_table'] in selected
+        ]
@@ -0,0 +1,199 @@
+import fnmatch
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from database.catalog_diff import diff_catalogs, is_empty
+
+
+class FleetCatalog:
+    """Catalogs of every database on one server, from a single fleet scan
+
+    databases maps each database to {table: {'schema', 'foreign_keys',
+    'row_count', 'size_mb'}}; scans holds each database's scan counters
+    (tables, columns, seconds, tables_per_second and error when it failed).
+    """
+
+    def __init__(self, db_type, host, databases, scans, seconds):
+        self.id = secrets.token_urlsafe(16)
+        self.db_type = db_type
+        self.host = host
+        self.databases = databases
+        self.scans = scans
+        self.seconds = seconds
+        self.scanned_at = time.time()
+
+    def summary(self):
+        """Scan totals and per-database throughput, without the catalogs themselves"""
+        failed = [name for name, scan in self.scans.items() if 'error' in scan]
+        return {
+            'scan_id': self.id,
+            'db_type': self.db_type,
+            'scanned_at': self.scanned_at,
+            'seconds': round(self.seconds, 3),
+            'databases': len(self.scans),
+            'failed': failed,
+            'tables': sum(scan.get('tables', 0) for scan in self.scans.values()),
+            'databases_per_second': round(len(self.scans) / self.seconds, 2) if self.seconds else None,
+            'scans': self.scans
+        }
+
+    def query(self, database=None, table=None, column=None, limit=1000):
+        """Find tables (and columns) matching shell-style patterns, case-insensitively
+
+        Each match is {'database', 'table', 'row_count', 'size_mb', 'columns',
+        'foreign_keys'}; with a column pattern only matching columns are listed
+        and tables without one are skipped.
+        """
+        patterns = [p.lower() if p else None for p in (database, table, column)]
+        matches = []
+        for database_name in sorted(self.databases):
+            if patterns[0] and not fnmatch.fnmatchcase(database_name.lower(), patterns[0]):
+                continue
+            catalog = self.databases[database_name]
+            for table_name in sorted(catalog):
+                if patterns[1] and not fnmatch.fnmatchcase(table_name.lower(), patterns[1]):
+                    continue
+                entry = catalog[table_name]
+                columns = entry['schema']
+                if patterns[2]:
+                    columns = [c for c in columns
+                               if fnmatch.fnmatchcase(c['column'].lower(), patterns[2])]
+                    if not columns:
+                        continue
+                matches.append({
+                    'database': database_name,
+                    'table': table_name,
+                    'row_count': entry['row_count'],
+                    'size_mb': entry['size_mb'],
+                    'columns': columns,
+                    'foreign_keys': entry['foreign_keys']
+                })
+                if len(matches) >= limit:
+                    return matches
+        return matches
+
+    def diff_databases(self, old, new):
+        """Schema differences between two databases of this scan (e.g. two tenants)"""
+        for name in (old, new):
+            if name not in self.databases:
+                raise LookupError(f"Database not in scan: {name}")
+        return diff_catalogs(self.databases[old], self.databases[new])
+
+    def diff(self, previous):
+        """Changes since an earlier scan of the same server, by database
+
+        Returns {'added_databases', 'dropped_databases', 'altered_databases':
+        {database: diff_catalogs result}}; databases that failed to scan
+        either time are not compared.
+        """
+        altered = {}
+        for name in sorted(self.databases.keys() & previous.databases.keys()):
+            changes = diff_catalogs(previous.databases[name], self.databases[name])
+            if not is_empty(changes):
+                altered[name] = changes
+        return {
+            'added_databases': sorted(self.scans.keys() - previous.scans.keys()),
+            'dropped_databases': sorted(previous.scans.keys() - self.scans.keys()),
+            'altered_databases': altered
+        }
+
+
+class FleetScanner:
+    """Introspects every database of a server concurrently
+
+    Each database is read by one worker of a bounded thread pool on its own
+    connection, opened for the scan and closed straight after, so the number
+    of connections held open is never more than max_workers however many
+    databases the server has. A failing database is recorded in its scan
+    counters instead of failing the scan.
+    """
+
+    def __init__(self, db_manager, connection_manager, max_workers=8):
+        self.db_manager = db_manager
+        self.connection_manager = connection_manager
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='ergenix-fleet')
+
+    def scan(self, conn_id, db_type, host, databases, progress=None, cancel_event=None):
+        """Scan databases into a FleetCatalog
+
+        progress, if given, is called as progress(done, total) as databases finish.
+        """
+        started = time.monotonic()
+        futures = {self._executor.submit(self._scan_database, conn_id, db_type, database,
+                                         cancel_event): database
+                   for database in databases}
+        catalogs, scans = {}, {}
+        pending = set(futures)
+        if progress is not None:
+            progress(0, len(futures))
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                database = futures[future]
+                try:
+                    catalogs[database], scans[database] = future.result()
+                except Exception as e:
+                    scans[database] = {'error': str(e)}
+            if cancel_event is not None and cancel_event.is_set():
+                for future in pending:
+                    future.cancel()
+                break
+            if done and progress is not None:
+                progress(len(scans), len(futures))
+
+        return FleetCatalog(db_type, host, dict(sorted(catalogs.items())),
+                            dict(sorted(scans.items())), time.monotonic() - started)
+
+    def _scan_database(self, conn_id, db_type, database, cancel_event):
+        """Worker: catalog and size estimates of one database, with its throughput"""
+        if cancel_event is not None and cancel_event.is_set():
+            raise TimeoutError('Scan cancelled')
+        started = time.monotonic()
+        with self.connection_manager.connection(conn_id, database, keep=False) as conn:
+            catalog = self.db_manager.get_catalog(conn, db_type, database)
+            estimates = self.db_manager.get_row_estimates(conn, db_type, database)
+        seconds = time.monotonic() - started
+
+        for table_name, entry in catalog.items():
+            estimate = estimates.get(table_name, {'row_count': None, 'size_mb': 'N/A'})
+            entry['row_count'] = estimate['row_count']
+            entry['size_mb'] = estimate['size_mb']
+        return catalog, {
+            'tables': len(catalog),
+            'columns': sum(len(entry['schema']) for entry in catalog.values()),
+            'seconds': round(seconds, 3),
+            'tables_per_second': round(len(catalog) / seconds, 1) if seconds else None
+        }
+
+
+class FleetStore:
+    """Fleet scans by scan id, evicted least-recently-used beyond max_entries
+
+    Each scan is tied to the (db_type, host, user) target it was made with,
+    so later sessions with the same credentials can query and diff it.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, scan_id, owner):
+        """Get a scan made for this target, or None"""
+        with self._lock:
+            entry = self._entries.get(scan_id)
+            if entry is None or entry[0] != owner:
+                return None
+            self._entries.move_to_end(scan_id)
+            return entry[1]
+
+    def put(self, owner, fleet_catalog):
+        with self._lock:
+            self._entries[fleet_catalog.id] = (owner, fleet_catalog)
+            self._entries.move_to_end(fleet_catalog.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
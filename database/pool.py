@@ -0,0 +1,302 @@
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """Bounded pool of connections to a single database target"""
+
+    def __init__(self, db_manager, db_type, connect, max_size=5, idle_timeout=60,
+                 checkout_timeout=30):
+        self.db_manager = db_manager
+        self.db_type = db_type
+        self.connect = connect  # Zero-argument callable returning a new connection
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.size = 0  # Open connections, idle or checked out
+        self.closed = False
+        self._idle = []  # (connection, returned_at), most recently returned last
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Check out a healthy connection, opening one if the pool has room"""
+        deadline = time.time() + self.checkout_timeout
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self.closed:
+                        raise Exception("Connection pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()[0]
+                        break
+                    if self.size < self.max_size:
+                        self.size += 1
+                        break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a free database connection")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self.connect()
+                except Exception:
+                    self._forget()
+                    raise
+
+            # Health check on checkout; drop dead connections and try again
+            if self.db_manager.ping(conn, self.db_type):
+                return conn
+            self._close(conn)
+            self._forget()
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it when discarded"""
+        if not discard:
+            try:
+                # Never hand out a connection with an open transaction
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if not discard and not self.closed:
+                self._idle.append((conn, time.time()))
+                self._cond.notify()
+                return
+        self._close(conn)
+        self._forget()
+
+    def add(self, conn):
+        """Adopt an already open connection as an idle pool member"""
+        with self._cond:
+            if self.closed or self.size >= self.max_size:
+                adopt = False
+            else:
+                self.size += 1
+                self._idle.append((conn, time.time()))
+                self._cond.notify()
+                adopt = True
+        if not adopt:
+            self._close(conn)
+
+    def evict_idle(self, now=None):
+        """Close connections that have been idle longer than idle_timeout"""
+        now = now or time.time()
+        with self._cond:
+            expired = [conn for conn, returned in self._idle if now - returned > self.idle_timeout]
+            self._idle = [(conn, returned) for conn, returned in self._idle
+                          if now - returned <= self.idle_timeout]
+            self.size -= len(expired)
+        for conn in expired:
+            self._close(conn)
+
+    def close(self):
+        """Close idle connections now; checked-out ones are closed on release"""
+        with self._cond:
+            self.closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle = []
+            self.size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Get pool occupancy counters"""
+        with self._cond:
+            return {'size': self.size, 'idle': len(self._idle),
+                    'in_use': self.size - len(self._idle), 'max_size': self.max_size}
+
+    def _forget(self):
+        with self._cond:
+            self.size -= 1
+            self._cond.notify()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """Tracks user sessions and hands out pooled connections per target
+
+    A session is created by /connect and remembers the credentials needed to
+    open further connections. Connections are pooled per (db_type, host, user,
+    database) target, so parallel requests from one session each get their own
+    connection. A single long-lived reaper thread expires sessions, evicts
+    idle connections and then runs any cleanup tasks other components add.
+    """
+
+    def __init__(self, db_manager, max_per_target=5, idle_timeout=60, session_timeout=300,
+                 reap_interval=30):
+        self.db_manager = db_manager
+        self.max_per_target = max_per_target
+        self.idle_timeout = idle_timeout
+        self.session_timeout = session_timeout
+        self.reap_interval = reap_interval
+        self._sessions = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop = threading.Event()
+        self._cleanup_tasks = []
+
+    def open_session(self, db_type, host, user, password):
+        """Validate credentials by connecting and register a new session"""
+        database = host if db_type.lower() == 'sqlite' else None
+        conn, databases = self.db_manager.connect_database(db_type, host, user, password, database)
+
+        conn_id = secrets.token_urlsafe(16)
+        session = {
+            'db_type': db_type,
+            'host': host,
+            'user': user,
+            'password': password,
+            'created': time.time(),
+            'last_used': time.time()
+        }
+        with self._lock:
+            self._sessions[conn_id] = session
+        self._pool(conn_id, database).add(conn)
+        return conn_id, databases
+
+    def get_session(self, conn_id):
+        """Get session details (without the password) or None if expired"""
+        with self._lock:
+            session = self._sessions.get(conn_id)
+            if session is None:
+                return None
+            return {key: value for key, value in session.items() if key != 'password'}
+
+    def has_session(self, conn_id):
+        with self._lock:
+            return conn_id in self._sessions
+
+    def expired(self, conn_id, now=None):
+        """Whether a session is gone or past its age limit, reaped or not yet"""
+        now = now or time.time()
+        with self._lock:
+            session = self._sessions.get(conn_id)
+            return session is None or now - session['created'] > self.session_timeout
+
+    @contextmanager
+    def connection(self, conn_id, database=None, keep=True, touch=True):
+        """Check out a connection for a session, returning it to the pool afterwards
+
+        keep=False closes it instead, for one-off visits such as scanning
+        every database of a server, which would otherwise leave an idle
+        connection behind per database. touch=False does not count as use of
+        the session, for background work done on its behalf.
+        """
+        pool = self._pool(conn_id, database, touch)
+        conn = pool.acquire()
+        discard = not keep
+        try:
+            yield conn
+        except Exception:
+            # The connection may be mid-query or broken; never reuse it
+            discard = True
+            raise
+        finally:
+            pool.release(conn, discard)
+
+    def close_session(self, conn_id):
+        with self._lock:
+            self._sessions.pop(conn_id, None)
+            unused = self._unused_pools()
+        for pool in unused:
+            pool.close()
+
+    def start(self):
+        """Start the reaper thread (idempotent)"""
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap_loop, name='ergenix-reaper',
+                                            daemon=True)
+            self._reaper.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def add_cleanup(self, task):
+        """Run task() on every reaper cycle, after sessions and connections are reaped"""
+        with self._lock:
+            self._cleanup_tasks.append(task)
+
+    def reap(self):
+        """Expire old sessions and evict idle pooled connections"""
+        now = time.time()
+        with self._lock:
+            for conn_id, session in list(self._sessions.items()):
+                if now - session['created'] > self.session_timeout:
+                    del self._sessions[conn_id]
+            unused = self._unused_pools()
+            pools = list(self._pools.values())
+        for pool in unused:
+            pool.close()
+        for pool in pools:
+            pool.evict_idle(now)
+        with self._lock:
+            tasks = list(self._cleanup_tasks)
+        for task in tasks:
+            try:
+                task()
+            except Exception:
+                pass  # One failing task must not stop the others
+
+    def pool_stats(self):
+        """Get occupancy counters for every open pool"""
+        with self._lock:
+            pools = dict(self._pools)
+        return {f"{db_type}://{user}@{host}/{database or ''}": pool.stats()
+                for (db_type, host, user, database), pool in pools.items()}
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception:
+                pass
+
+    def _pool(self, conn_id, database, touch=True):
+        """Get (creating if needed) the pool serving a session and database"""
+        with self._lock:
+            session = self._sessions.get(conn_id)
+            if session is None:
+                raise LookupError('Connection not found')
+            if touch:
+                session['last_used'] = time.time()
+
+            db_type = session['db_type'].lower()
+            if db_type == 'sqlite':
+                # The file path is the database; the requested name is always 'main'
+                database = session['host']
+            key = (db_type, session['host'], session['user'], database)
+            pool = self._pools.get(key)
+            if pool is None:
+                connect_args = (session['db_type'], session['host'], session['user'],
+                                session['password'], database)
+                pool = ConnectionPool(
+                    self.db_manager, db_type,
+                    lambda: self.db_manager.connect_database(*connect_args)[0],
+                    max_size=self.max_per_target,
+                    idle_timeout=self.idle_timeout
+                )
+                self._pools[key] = pool
+            return pool
+
+    def _unused_pools(self):
+        """Detach pools whose target no session references any more (lock held)"""
+        live = {(s['db_type'].lower(), s['host'], s['user']) for s in self._sessions.values()}
+        unused = []
+        for key in list(self._pools):
+            if key[:3] not in live:
+                unused.append(self._pools.pop(key))
+        return unused
@@ -0,0 +1,125 @@
+import datetime
+import decimal
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2**precision one-byte registers
+
+    Values are hashed as whole pandas columns and the registers updated with
+    NumPy ufuncs, so adding a column costs a handful of vectorized passes.
+    The standard error is about 1.04 / sqrt(2**precision), 1.6% at the
+    default precision of 12 (4 KB of registers).
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, values):
+        """Add a pandas Series of values (nulls are skipped)"""
+        values = values.dropna()
+        if values.empty:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        rest = hashes << np.uint64(self.precision)
+        # Rank is the position of the first set bit in the remaining 64 - precision bits
+        rank = np.where(rest == 0, 64 - self.precision + 1, 64 - _bit_length(rest) + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def count(self):
+        """Estimated number of distinct values added"""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+def _bit_length(values):
+    """Vectorized int.bit_length() of a uint64 array"""
+    length = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= (np.uint64(1) << np.uint64(shift))
+        length[high] += shift
+        values = np.where(high, values >> np.uint64(shift), values)
+    return length + (values > 0)
+
+
+def profile_sample(columns, rows, row_estimate=None, top=5):
+    """Profile every column of a row sample
+
+    Returns {column: {'null_fraction', 'distinct_estimate', 'min', 'max',
+    'top_values'}}. Null fractions and top value fractions are measured on
+    the sample. Distinct counts come from a HyperLogLog sketch of the sample;
+    a column that is (nearly) unique in the sample is assumed unique in the
+    table and scaled to row_estimate, otherwise the sample is taken to have
+    seen its values.
+    """
+    frame = pd.DataFrame.from_records(rows, columns=columns, coerce_float=False)
+    sample_rows = len(frame)
+    profiles = {}
+    for column in columns:
+        values = frame[column]
+        present = values.dropna()
+        if len(present) and isinstance(present.iloc[0], memoryview):
+            # psycopg2 reads bytea as memoryview, which cannot be hashed
+            present = present.map(bytes)
+        nulls = sample_rows - len(present)
+
+        sketch = HyperLogLog()
+        sketch.add(present)
+        distinct = min(sketch.count(), len(present))
+        if (row_estimate and row_estimate > sample_rows and len(present)
+                and distinct >= 0.95 * len(present)):
+            distinct = int(round(row_estimate * len(present) / sample_rows))
+
+        low = high = None
+        if len(present):
+            try:
+                low, high = present.min(), present.max()
+            except TypeError:
+                # SQLite columns may mix types; order them as text, report the values
+                as_text = present.astype(str)
+                low = present[as_text == as_text.min()].iloc[0]
+                high = present[as_text == as_text.max()].iloc[0]
+
+        counts = present.value_counts().head(top) if len(present) else present
+        profiles[column] = {
+            'null_fraction': round(nulls / sample_rows, 4) if sample_rows else None,
+            'distinct_estimate': distinct,
+            'min': _json_value(low),
+            'max': _json_value(high),
+            'top_values': [
+                {'value': _json_value(value), 'count': int(count),
+                 'fraction': round(count / sample_rows, 4)}
+                for value, count in counts.items()
+            ]
+        }
+    return profiles
+
+
+def _json_value(value):
+    """Make a sampled value JSON-serializable"""
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    if isinstance(value, (datetime.date, datetime.time, pd.Timestamp)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
@@ -0,0 +1,267 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+
+
+class SampleStore:
+    """Per-table statistics over time, kept in a local SQLite file
+
+    Each sample of a target (one database) writes a snapshot row and one row
+    per table with its row count, size and the engine's read/write counters.
+    Values that depend on history are folded in as samples are recorded:
+    activity sums counter increases across resets, and last_update carries
+    forward the time a table was last seen changing. Reading the latest
+    snapshot and the one a window earlier is then enough to answer with
+    growth rate and usage frequency, however long the history is.
+    """
+
+    def __init__(self, path, retention=7 * 86400):
+        self.path = path
+        self.retention = retention
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS snapshots (
+                        target TEXT NOT NULL,
+                        sampled_at REAL NOT NULL,
+                        PRIMARY KEY (target, sampled_at)
+                    )
+                """)
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS samples (
+                        target TEXT NOT NULL,
+                        sampled_at REAL NOT NULL,
+                        table_name TEXT NOT NULL,
+                        row_count INTEGER,
+                        row_count_estimated INTEGER NOT NULL,
+                        column_count INTEGER NOT NULL,
+                        size_mb REAL,
+                        reads INTEGER,
+                        writes INTEGER,
+                        activity INTEGER,
+                        last_update REAL,
+                        PRIMARY KEY (target, sampled_at, table_name)
+                    )
+                """)
+
+    def record(self, target, sampled_at, statistics, counters):
+        """Store one sample of a target's statistics and activity counters"""
+        with closing(self._connect()) as db, db:
+            previous = {row[0]: row[1:] for row in db.execute("""
+                SELECT table_name, row_count, size_mb, reads, writes, activity, last_update
+                FROM samples
+                WHERE target = ? AND sampled_at = (
+                    SELECT MAX(sampled_at) FROM snapshots WHERE target = ?)
+            """, (target, target))}
+
+            rows = []
+            for name, stats in statistics.items():
+                row_count = stats['row_count']
+                size_mb = None if stats['size_mb'] in (None, 'N/A') else float(stats['size_mb'])
+                counter = counters.get(name, {})
+                reads, writes = counter.get('reads'), counter.get('writes')
+                activity, last_update = self._fold(
+                    previous.get(name), sampled_at, row_count, size_mb, reads, writes,
+                    counter.get('last_write')
+                )
+                rows.append((target, sampled_at, name, row_count,
+                             int(stats['row_count_estimated']), stats['column_count'],
+                             size_mb, reads, writes, activity, last_update))
+
+            db.execute("INSERT INTO snapshots VALUES (?, ?)", (target, sampled_at))
+            db.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def latest(self, target, window=86400):
+        """Get (sampled_at, {table_name: stats}) from the newest snapshot of a target
+
+        Growth rate (rows per day) and usage frequency (reads and writes per
+        hour) are measured against the oldest snapshot within window seconds
+        of the newest. Returns (None, {}) when the target was never sampled.
+        """
+        with closing(self._connect()) as db:
+            latest_at = db.execute("SELECT MAX(sampled_at) FROM snapshots WHERE target = ?",
+                                   (target,)).fetchone()[0]
+            if latest_at is None:
+                return None, {}
+            base_at = db.execute("""
+                SELECT MIN(sampled_at) FROM snapshots WHERE target = ? AND sampled_at >= ?
+            """, (target, latest_at - window)).fetchone()[0]
+            base = {}
+            if base_at < latest_at:
+                base = {name: (row_count, activity) for name, row_count, activity in db.execute("""
+                    SELECT table_name, row_count, activity FROM samples
+                    WHERE target = ? AND sampled_at = ?
+                """, (target, base_at))}
+            rows = db.execute("""
+                SELECT table_name, row_count, row_count_estimated, column_count, size_mb,
+                       activity, last_update
+                FROM samples WHERE target = ? AND sampled_at = ?
+            """, (target, latest_at)).fetchall()
+
+        days = (latest_at - base_at) / 86400
+        statistics = {}
+        for name, row_count, estimated, column_count, size_mb, activity, last_update in rows:
+            base_rows, base_activity = base.get(name, (None, None))
+            statistics[name] = {
+                'row_count': row_count,
+                'row_count_estimated': bool(estimated),
+                'column_count': column_count,
+                'size_mb': size_mb if size_mb is not None else 'N/A',
+                'last_update': self._format_time(last_update),
+                'usage_frequency': (round((activity - base_activity) / (days * 24), 1)
+                                    if activity is not None and base_activity is not None
+                                    else 'N/A'),
+                'growth_rate': (round((row_count - base_rows) / days, 1)
+                                if row_count is not None and base_rows is not None else 'N/A'),
+                'sampled_at': latest_at
+            }
+        return latest_at, statistics
+
+    def prune(self, target, now=None):
+        """Delete a target's samples older than retention"""
+        cutoff = (now or time.time()) - self.retention
+        with closing(self._connect()) as db, db:
+            db.execute("DELETE FROM samples WHERE target = ? AND sampled_at < ?", (target, cutoff))
+            db.execute("DELETE FROM snapshots WHERE target = ? AND sampled_at < ?", (target, cutoff))
+
+    def _fold(self, previous, sampled_at, row_count, size_mb, reads, writes, last_write):
+        """Carry activity and last_update forward from a table's previous sample"""
+        activity = None
+        if reads is not None and writes is not None:
+            activity = 0
+            if previous is not None and previous[4] is not None:
+                ops, previous_ops = reads + writes, previous[2] + previous[3]
+                # Counters restart from zero after a server restart or stats reset
+                activity = previous[4] + (ops - previous_ops if ops >= previous_ops else ops)
+
+        if last_write is not None:
+            return activity, last_write
+        if previous is None:
+            return activity, None
+        previous_rows, previous_size, _, previous_writes, _, last_update = previous
+        changed = ((writes is not None and previous_writes is not None and writes != previous_writes)
+                   or (row_count is not None and previous_rows is not None
+                       and row_count != previous_rows)
+                   or (size_mb is not None and previous_size is not None and size_mb != previous_size))
+        # A change is only seen at the first sample after it, so that is the time reported
+        return activity, sampled_at if changed else last_update
+
+    def _format_time(self, timestamp):
+        if timestamp is None:
+            return 'N/A'
+        return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+
+class StatisticsSampler:
+    """Background thread recording statistics of watched databases every interval
+
+    /get_statistics watches the database it is asked about. Each cycle the
+    thread collects estimated statistics through the StatisticsCollector,
+    plus the engine's activity counters, on the watching session's pooled
+    connections and records them in the SampleStore. Sampling does not count
+    as use of the session, and a database stops being sampled once the session
+    watching it ends or reaches its age limit (sessions keep the credentials,
+    the sampler does not); its history stays in the store, keyed by target, so
+    a later session finds it again.
+    """
+
+    def __init__(self, db_manager, connection_manager, collector, catalog_cache, store,
+                 interval=60, query_timeout=10):
+        self.db_manager = db_manager
+        self.connection_manager = connection_manager
+        self.collector = collector
+        self.catalog_cache = catalog_cache
+        self.store = store
+        self.interval = interval
+        self.query_timeout = query_timeout
+        self._targets = {}  # target -> (conn_id, db_type, host, database)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def watch(self, conn_id, db_type, host, database):
+        """Sample a database from now on, using this session's connections"""
+        target = self.target(db_type, host, database)
+        with self._lock:
+            new = target not in self._targets
+            self._targets[target] = (conn_id, db_type, host, database)
+        if new:
+            self._wake.set()  # Take its first sample now rather than next cycle
+
+    def snapshot(self, db_type, host, database, tables):
+        """Statistics of tables from the latest sample, or None if stale or incomplete"""
+        sampled_at, statistics = self.store.latest(self.target(db_type, host, database))
+        if sampled_at is None or time.time() - sampled_at > 2 * self.interval:
+            return None
+        if any(name not in statistics for name in tables):
+            return None
+        return {name: statistics[name] for name in tables}
+
+    def annotate(self, db_type, host, database, statistics):
+        """Fill last_update, usage_frequency and growth_rate in live statistics from history"""
+        _, sampled = self.store.latest(self.target(db_type, host, database))
+        for name, stats in statistics.items():
+            if name in sampled:
+                for key in ('last_update', 'usage_frequency', 'growth_rate'):
+                    stats[key] = sampled[name][key]
+        return statistics
+
+    def target(self, db_type, host, database):
+        return f"{db_type.lower()}://{host}/{database or ''}"
+
+    def start(self):
+        """Start the sampling thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='ergenix-sampler',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def sample(self):
+        """Take one sample of every watched database whose session is still live"""
+        now = time.time()
+        with self._lock:
+            for target, (conn_id, *_) in list(self._targets.items()):
+                if self.connection_manager.expired(conn_id, now):
+                    del self._targets[target]
+            targets = dict(self._targets)
+        for target, args in targets.items():
+            try:
+                self._sample(target, *args)
+            except Exception:
+                pass  # One failing database must not stop the others
+
+    def _sample(self, target, conn_id, db_type, host, database):
+        with self.connection_manager.connection(conn_id, database, touch=False) as conn:
+            catalog = self.catalog_cache.get_catalog(conn, db_type, host, database)
+            counters = self.db_manager.get_activity_counters(conn, db_type, database)
+        statistics = self.collector.collect(
+            conn_id, db_type, list(catalog), database, catalog=catalog, mode='estimated',
+            query_timeout=self.query_timeout, deadline=self.query_timeout * 2, touch=False
+        )
+        now = time.time()
+        self.store.record(target, now, statistics, counters)
+        self.store.prune(target, now)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            self.sample()
+            self._wake.wait(self.interval)
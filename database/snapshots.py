@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+
+# Bumped whenever the encoding changes; older files are refused rather than misread
+FORMAT_VERSION = 1
+COLUMN_FIELDS = ('column', 'type', 'null', 'key', 'extra')
+FK_FIELDS = ('column', 'referenced_table', 'referenced_column')
+
+
+def encode_snapshot(catalog, meta):
+    """Serialize a catalog (as from DatabaseManager.get_catalog) to gzipped JSON
+
+    Catalogs repeat the same few type, key and column names thousands of
+    times, so every string goes into one table and columns and foreign keys
+    become short arrays of indexes into it. Column defaults are kept as they
+    are since they are rarely shared.
+    """
+    strings, index = [], {}
+
+    def ref(value):
+        if value not in index:
+            index[value] = len(strings)
+            strings.append(value)
+        return index[value]
+
+    tables = []
+    for table_name, entry in catalog.items():
+        tables.append([
+            ref(table_name),
+            [[ref(column.get(field)) for field in COLUMN_FIELDS] + [column.get('default')]
+             for column in entry['schema']],
+            [[ref(fk[field]) for field in FK_FIELDS] for fk in entry['foreign_keys']]
+        ])
+    payload = {'version': FORMAT_VERSION, 'meta': meta, 'strings': strings, 'tables': tables}
+    return gzip.compress(json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8'))
+
+
+def decode_snapshot(data):
+    """Get (meta, catalog) back from encode_snapshot bytes"""
+    payload = json.loads(gzip.decompress(data))
+    if payload.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format: {payload.get('version')}")
+    strings = payload['strings']
+    catalog = {}
+    for name, columns, fks in payload['tables']:
+        schema = []
+        for column in columns:
+            values = dict(zip(COLUMN_FIELDS, (strings[i] for i in column[:-1])))
+            values['default'] = column[-1]
+            schema.append(values)
+        catalog[strings[name]] = {
+            'schema': schema,
+            'foreign_keys': [dict(zip(FK_FIELDS, (strings[i] for i in fk))) for fk in fks]
+        }
+    return payload['meta'], catalog
+
+
+def snapshot_meta(catalog, db_type, host, database, fingerprint=None):
+    """Describe a catalog for encode_snapshot"""
+    return {
+        'db_type': db_type,
+        'host': host,
+        'database': database,
+        'fingerprint': fingerprint,
+        'taken_at': time.time(),
+        'tables': len(catalog),
+        'columns': sum(len(entry['schema']) for entry in catalog.values())
+    }
+
+
+def read_snapshot(path):
+    """Get (meta, catalog) from a snapshot file"""
+    with open(path, 'rb') as f:
+        return decode_snapshot(f.read())
+
+
+class SnapshotStore:
+    """Catalog snapshots on disk, one directory per target
+
+    Snapshots belong to the (db_type, host, user) target they were taken
+    with, so later sessions with the same credentials can list, diff and
+    render them. Each target keeps its newest max_per_target snapshots.
+    """
+
+    def __init__(self, root, max_per_target=50):
+        self.root = root
+        self.max_per_target = max_per_target
+        self._lock = threading.Lock()
+
+    def save(self, owner, catalog, db_type, host, database, fingerprint=None):
+        """Write a snapshot and get its metadata (with the new 'snapshot_id')"""
+        meta = snapshot_meta(catalog, db_type, host, database, fingerprint)
+        # Ids sort by the time they were taken
+        snapshot_id = (time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(meta['taken_at']))
+                       + '-' + secrets.token_hex(4))
+        meta['snapshot_id'] = snapshot_id
+        data = encode_snapshot(catalog, meta)
+        directory = self._directory(owner)
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = os.path.join(directory, f'.{snapshot_id}.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(directory, f'{snapshot_id}.json.gz'))
+            for old_id in self._ids(directory)[:-self.max_per_target]:
+                os.remove(os.path.join(directory, f'{old_id}.json.gz'))
+        return dict(meta, bytes=len(data))
+
+    def load(self, owner, snapshot_id):
+        """Get (meta, catalog) of one of the target's snapshots, or None"""
+        if os.path.basename(snapshot_id) != snapshot_id or snapshot_id.startswith('.'):
+            return None
+        try:
+            return read_snapshot(os.path.join(self._directory(owner), f'{snapshot_id}.json.gz'))
+        except FileNotFoundError:
+            return None
+
+    def list(self, owner, database=None):
+        """Metadata of the target's snapshots (of one database, if given), newest first"""
+        directory = self._directory(owner)
+        with self._lock:
+            ids = self._ids(directory)
+        snapshots = []
+        for snapshot_id in reversed(ids):
+            loaded = self.load(owner, snapshot_id)
+            if loaded is not None and (database is None or loaded[0]['database'] == database):
+                snapshots.append(loaded[0])
+        return snapshots
+
+    def _directory(self, owner):
+        # Hash the target so hosts and file paths never become directory names
+        digest = hashlib.sha256(json.dumps(list(owner)).encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.root, digest)
+
+    @staticmethod
+    def _ids(directory):
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.json.gz')] for name in names if name.endswith('.json.gz'))
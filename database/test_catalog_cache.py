@@ -0,0 +1,103 @@
+import random
+import threading
+
+from database.catalog_cache import CatalogCache
+
+
+def entry(*references):
+    return {'schema': [{'column': 'id', 'type': 'INTEGER', 'key': 'PRI'}],
+            'foreign_keys': [{'column': f'{name}_id', 'referenced_table': name,
+                              'referenced_column': 'id'} for name in references]}
+
+
+class FakeManager:
+    """Serves a catalog and counts the introspection queries made against it"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.fingerprint = 'v1'
+        self.catalog_calls = []
+        self.table_calls = 0
+
+    def get_schema_fingerprint(self, conn, db_type, database=None):
+        return self.fingerprint
+
+    def get_tables(self, conn, db_type, database=None):
+        self.table_calls += 1
+        return list(self.catalog)
+
+    def get_catalog(self, conn, db_type, database=None, tables=None):
+        self.catalog_calls.append(None if tables is None else sorted(tables))
+        names = self.catalog if tables is None else tables
+        return {name: self.catalog[name] for name in names if name in self.catalog}
+
+
+def test_entries_are_reused_while_the_fingerprint_matches():
+    manager = FakeManager({'a': entry(), 'b': entry('a')})
+    cache = CatalogCache(manager)
+    assert cache.get_tables(None, 'sqlite', 'host') == ['a', 'b']
+    assert cache.get_tables(None, 'sqlite', 'host') == ['a', 'b']
+    assert cache.get_catalog(None, 'sqlite', 'host') == manager.catalog
+    assert cache.get_catalog(None, 'sqlite', 'host', tables=['b']) == {'b': manager.catalog['b']}
+    assert manager.table_calls == 1
+    assert manager.catalog_calls == [None]
+
+
+def test_only_missing_tables_are_introspected():
+    manager = FakeManager({'a': entry(), 'b': entry('a'), 'c': entry('b')})
+    cache = CatalogCache(manager)
+    cache.get_catalog(None, 'sqlite', 'host', tables=['a'])
+    cache.get_catalog(None, 'sqlite', 'host', tables=['a', 'b', 'gone'])
+    cache.get_catalog(None, 'sqlite', 'host', tables=['b', 'gone'])
+    assert manager.catalog_calls == [['a'], ['b', 'gone']]
+
+
+def test_fingerprint_change_drops_the_entry():
+    manager = FakeManager({'a': entry(), 'b': entry('a')})
+    cache = CatalogCache(manager)
+    graph = cache.get_fk_graph(None, 'sqlite', 'host')
+    assert cache.get_fk_graph(None, 'sqlite', 'host') is graph
+    assert cache.get_tables(None, 'sqlite', 'host') == ['a', 'b']
+
+    manager.catalog = {'a': entry(), 'b': entry('a'), 'c': entry('b')}
+    manager.fingerprint = 'v2'
+    assert cache.get_tables(None, 'sqlite', 'host') == ['a', 'b', 'c']
+    rebuilt = cache.get_fk_graph(None, 'sqlite', 'host')
+    assert rebuilt is not graph
+    assert rebuilt.forward['c'] == {'b'}
+    assert manager.table_calls == 2
+
+
+def test_invalidate_matches_given_fields_only():
+    manager = FakeManager({'a': entry()})
+    cache = CatalogCache(manager)
+    cache.get_tables(None, 'sqlite', 'one')
+    cache.get_tables(None, 'sqlite', 'two')
+    cache.invalidate(host='one')
+    cache.get_tables(None, 'sqlite', 'one')
+    cache.get_tables(None, 'sqlite', 'two')
+    assert manager.table_calls == 3
+
+
+def test_concurrent_readers_see_whole_entries():
+    catalog = {f't{i}': entry(*([f't{i - 1}'] if i else [])) for i in range(40)}
+    manager = FakeManager(catalog)
+    cache = CatalogCache(manager)
+    errors = []
+
+    def read(seed):
+        rng = random.Random(seed)
+        for _ in range(50):
+            names = rng.sample(sorted(catalog), 5)
+            if cache.get_catalog(None, 'sqlite', 'host', tables=names) != {
+                    name: catalog[name] for name in names}:
+                errors.append(names)
+            if len(cache.get_fk_graph(None, 'sqlite', 'host').forward) != len(catalog):
+                errors.append('graph')
+
+    threads = [threading.Thread(target=read, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,59 @@
+from database.catalog_diff import affected_tables, diff_catalogs, is_empty
+
+
+def column(name, column_type='INTEGER', key=''):
+    return {'column': name, 'type': column_type, 'key': key}
+
+
+def fk(name, table):
+    return {'column': name, 'referenced_table': table, 'referenced_column': 'id'}
+
+
+def catalog(**tables):
+    return {name: {'schema': schema, 'foreign_keys': fks} for name, (schema, fks) in tables.items()}
+
+
+OLD = catalog(
+    users=([column('id', key='PRI'), column('name', 'TEXT')], []),
+    orders=([column('id', key='PRI'), column('user_id', key='FK')], [fk('user_id', 'users')]),
+    logs=([column('id', key='PRI')], []),
+)
+
+
+def test_identical_catalogs_have_an_empty_diff():
+    diff = diff_catalogs(OLD, OLD)
+    assert is_empty(diff)
+    assert diff == {'added_tables': [], 'dropped_tables': [], 'altered_tables': {}}
+
+
+def test_added_and_dropped_tables():
+    new = dict(OLD, items={'schema': [column('id', key='PRI')], 'foreign_keys': []})
+    del new['logs']
+    diff = diff_catalogs(OLD, new)
+    assert diff['added_tables'] == ['items']
+    assert diff['dropped_tables'] == ['logs']
+    assert diff['altered_tables'] == {}
+
+
+def test_column_changes():
+    new = catalog(
+        users=([column('id', key='PRI'), column('name', 'VARCHAR'), column('email', 'TEXT')], []),
+        orders=([column('id', key='PRI')], []),
+        logs=([column('id', key='PRI')], []),
+    )
+    altered = diff_catalogs(OLD, new)['altered_tables']
+    assert set(altered) == {'users', 'orders'}
+    assert altered['users'] == {'added_columns': ['email'],
+                                'altered_columns': {'name': {'type': ['TEXT', 'VARCHAR']}}}
+    assert altered['orders']['dropped_columns'] == ['user_id']
+    assert altered['orders']['dropped_foreign_keys'] == [fk('user_id', 'users')]
+
+
+def test_repointed_foreign_key_is_dropped_and_added():
+    new = dict(OLD, orders={'schema': OLD['orders']['schema'],
+                            'foreign_keys': [fk('user_id', 'logs')]})
+    diff = diff_catalogs(OLD, new)
+    assert diff['altered_tables'] == {'orders': {'added_foreign_keys': [fk('user_id', 'logs')],
+                                                 'dropped_foreign_keys': [fk('user_id', 'users')]}}
+    # Both ends of the old and new connector are redrawn
+    assert affected_tables(diff) == {'orders', 'users', 'logs'}
@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from database.collector import StatisticsCollector
+from database.erdb import DatabaseManager
+from database.pool import ConnectionManager
+
+ENDLESS = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT COUNT(*) FROM n"
+
+
+class SlowManager(DatabaseManager):
+    """Counts 'slow' with a query that never ends and fails to count 'broken'"""
+
+    def count_rows(self, conn, db_type, table_name, database=None):
+        if table_name == 'slow':
+            cursor = conn.cursor()
+            try:
+                cursor.execute(ENDLESS)
+                return cursor.fetchone()[0]
+            finally:
+                cursor.close()
+        if table_name == 'broken':
+            raise RuntimeError('permission denied')
+        return super().count_rows(conn, db_type, table_name, database)
+
+
+@pytest.fixture
+def collector(tmp_path):
+    path = str(tmp_path / 'stats.db')
+    conn = sqlite3.connect(path)
+    for name, rows in (('a', 3), ('b', 5), ('slow', 1), ('broken', 1)):
+        conn.execute(f'CREATE TABLE {name} (id INTEGER PRIMARY KEY)')
+        conn.executemany(f'INSERT INTO {name} VALUES (?)', [(i,) for i in range(rows)])
+    conn.commit()
+    conn.close()
+    manager = SlowManager()
+    connections = ConnectionManager(manager)
+    conn_id, _ = connections.open_session('sqlite', path, 'user', 'password')
+    yield StatisticsCollector(manager, connections, max_workers=4), conn_id
+    connections.close_session(conn_id)
+
+
+def test_counts_tables_without_estimates(collector):
+    collector, conn_id = collector
+    calls = []
+    stats = collector.collect(conn_id, 'sqlite', ['a', 'b', 'missing'],
+                              progress=lambda done, total: calls.append((done, total)))
+    assert {name: value['row_count'] for name, value in stats.items()} == {'a': 3, 'b': 5}
+    assert not any(value.get('partial') for value in stats.values())
+    assert calls[0] == (0, 2) and calls[-1] == (2, 2)
+
+
+def test_timed_out_and_failed_counts_are_partial(collector):
+    collector, conn_id = collector
+    started = time.monotonic()
+    stats = collector.collect(conn_id, 'sqlite', ['a', 'slow', 'broken'], query_timeout=0.2)
+    assert time.monotonic() - started < 5
+    assert stats['a'] == dict(stats['a'], row_count=3, row_count_estimated=False)
+    assert 'partial' not in stats['a']
+    assert stats['slow']['partial'] and stats['slow']['timed_out']
+    assert stats['slow']['row_count'] is None and stats['slow']['row_count_estimated']
+    assert stats['broken']['partial'] and not stats['broken']['timed_out']
+    assert stats['broken']['error'] == 'permission denied'
+
+
+def test_deadline_cancels_running_counts(collector):
+    collector, conn_id = collector
+    started = time.monotonic()
+    stats = collector.collect(conn_id, 'sqlite', ['slow', 'a'], query_timeout=60, deadline=0.3)
+    assert time.monotonic() - started < 5
+    assert stats['slow']['partial'] and stats['slow']['timed_out']
+    assert stats['a']['row_count'] == 3
+    # The interrupted connection was discarded, not left checked out
+    deadline = time.monotonic() + 5
+    while collector.connection_manager.pool_stats() and time.monotonic() < deadline:
+        if all(pool['in_use'] == 0 for pool in collector.connection_manager.pool_stats().values()):
+            break
+        time.sleep(0.05)
+    assert all(pool['in_use'] == 0 for pool in collector.connection_manager.pool_stats().values())
+
+
+def test_cancel_event_stops_waiting(collector):
+    collector, conn_id = collector
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    stats = collector.collect(conn_id, 'sqlite', ['slow'], query_timeout=60, cancel_event=cancel)
+    assert stats['slow']['partial']
@@ -0,0 +1,138 @@
+import sqlite3
+
+import pytest
+
+from database.erdb import DatabaseManager
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    path = str(tmp_path / 'shop.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id),
+                             total REAL DEFAULT 0);
+        CREATE TABLE "weird name" (id INTEGER PRIMARY KEY, "odd col" TEXT,
+                                   order_id INTEGER REFERENCES orders(id));
+    """)
+    conn.executemany('INSERT INTO "weird name" VALUES (?, ?, ?)',
+                     [(i, f'v{i}', None) for i in range(1, 51)])
+    conn.commit()
+    conn.close()
+    manager = DatabaseManager()
+    conn, _ = manager.connect_database('sqlite', path, None, None, path)
+    yield manager, conn
+    conn.close()
+
+
+def test_get_catalog_matches_the_per_table_queries(sqlite_db):
+    manager, conn = sqlite_db
+    catalog = manager.get_catalog(conn, 'sqlite')
+    assert sorted(catalog) == ['orders', 'users', 'weird name']
+    for name in ('users', 'orders'):
+        assert catalog[name]['schema'] == manager.get_table_schema(conn, 'sqlite', name)
+        assert catalog[name]['foreign_keys'] == manager.get_foreign_keys(conn, 'sqlite', name)
+    assert catalog['users']['schema'][0] == {'column': 'id', 'type': 'INTEGER', 'null': 'YES',
+                                             'key': 'PRI', 'default': None, 'extra': ''}
+    assert catalog['weird name']['foreign_keys'] == [
+        {'column': 'order_id', 'referenced_table': 'orders', 'referenced_column': 'id'}]
+
+
+def test_get_catalog_follows_the_requested_tables(sqlite_db):
+    manager, conn = sqlite_db
+    catalog = manager.get_catalog(conn, 'sqlite', tables=['weird name', 'missing', 'users'])
+    assert list(catalog) == ['weird name', 'users']
+
+
+def test_table_names_are_quoted(sqlite_db):
+    manager, conn = sqlite_db
+    assert manager.count_rows(conn, 'sqlite', 'weird name') == 50
+    columns, rows, method, estimate = manager.sample_rows(conn, 'sqlite', 'weird name',
+                                                          sample_size=10)
+    assert columns == ['id', 'odd col', 'order_id']
+    assert (len(rows), method, estimate) == (10, 'rowid_range', 50)
+    assert len(manager.sample_rows(conn, 'sqlite', 'weird name')[1]) == 50
+
+
+def test_quote_identifier_escapes_per_dialect():
+    manager = DatabaseManager()
+    assert manager.quote_identifier('sqlite', 'a "b"') == '"a ""b"""'
+    assert manager.quote_identifier('PostgreSQL', 'x') == '"x"'
+    assert manager.quote_identifier('mysql', 'a`b') == '`a``b`'
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+
+def test_sqlite_estimates_come_from_analyze(sqlite_db):
+    manager, conn = sqlite_db
+    stats = manager.get_tables_statistics(conn, 'sqlite', ['weird name', 'users'])
+    # No ANALYZE yet: no estimates, so every table is counted
+    assert stats['weird name']['row_count'] == 50
+    assert not stats['weird name']['row_count_estimated']
+
+    conn.execute('ANALYZE')
+    conn.commit()
+    assert manager.get_row_estimates(conn, 'sqlite')['weird name']['row_count'] == 50
+    stats = manager.get_tables_statistics(conn, 'sqlite', ['weird name', 'users'])
+    assert stats['weird name'] == dict(stats['weird name'], row_count=50,
+                                       row_count_estimated=True, column_count=3)
+    # ANALYZE skips empty tables, which are then counted
+    assert stats['users']['row_count'] == 0 and not stats['users']['row_count_estimated']
+
+    exact = manager.get_tables_statistics(conn, 'sqlite', ['weird name'], mode='exact')
+    assert not exact['weird name']['row_count_estimated']
+    capped = manager.get_tables_statistics(conn, 'sqlite', ['weird name'], mode='exact',
+                                           exact_threshold=10)
+    assert capped['weird name']['row_count_estimated']
+    with pytest.raises(ValueError):
+        manager.get_tables_statistics(conn, 'sqlite', ['users'], mode='guess')
+
+
+def test_postgresql_zero_reltuples_is_trusted_only_for_empty_tables():
+    # relname, reltuples, relpages, relkind, pg_relation_size, size_mb
+    conn = FakeConnection([
+        ('unanalyzed', -1, 0, 'r', 0, 0.01),
+        ('old_server_unanalyzed', 0, 12, 'r', 98304, 0.1),
+        ('pages_not_counted_yet', 0, 0, 'r', 8192, 0.02),
+        ('empty', 0, 0, 'r', 0, 0.01),
+        ('partitioned', 0, 0, 'p', 0, 0.0),
+        ('analyzed', 1200, 12, 'r', 98304, 0.1),
+    ])
+    estimates = DatabaseManager().get_row_estimates(conn, 'postgresql')
+    assert {name: value['row_count'] for name, value in estimates.items()} == {
+        'unanalyzed': None, 'old_server_unanalyzed': None, 'pages_not_counted_yet': None,
+        'empty': 0, 'partitioned': None, 'analyzed': 1200}
+
+
+def test_drivers_are_imported_on_first_use(monkeypatch):
+    manager = DatabaseManager()
+    assert manager.driver('SQLite') is sqlite3
+    with pytest.raises(ValueError, match='Unsupported database type'):
+        manager.driver('oracle')
+
+    monkeypatch.setitem(DatabaseManager.DRIVERS, 'fakedb', ('no_such_driver_module', 'fakedb-py'))
+    with pytest.raises(ImportError, match='needs the fakedb-py package'):
+        manager.driver('fakedb')
+    DatabaseManager.register_driver('fakedb', 'sqlite3')
+    assert manager.driver('fakedb') is sqlite3
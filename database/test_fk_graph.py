@@ -0,0 +1,53 @@
+import pytest
+
+from database.fk_graph import ForeignKeyGraph
+
+
+def catalog(references):
+    """{table: [referenced tables]} as a catalog with one FK column per reference"""
+    return {name: {'schema': [], 'foreign_keys': [
+        {'column': f'{target}_id', 'referenced_table': target, 'referenced_column': 'id'}
+        for target in targets]} for name, targets in references.items()}
+
+
+# a -> b -> c -> d, and e -> c
+GRAPH = ForeignKeyGraph(catalog({'a': ['b'], 'b': ['c'], 'c': ['d'], 'd': [], 'e': ['c']}))
+
+
+def test_adjacency_drops_references_outside_the_catalog():
+    graph = ForeignKeyGraph(catalog({'a': ['b', 'missing'], 'b': []}))
+    assert graph.forward == {'a': {'b'}, 'b': set()}
+    assert graph.reverse == {'a': set(), 'b': {'a'}}
+    assert 'a' in graph and 'missing' not in graph
+
+
+def test_depth_limits_the_hops():
+    assert GRAPH.neighborhood(['a'], depth=0) == {'a': 0}
+    assert GRAPH.neighborhood(['a'], depth=1) == {'a': 0, 'b': 1}
+    assert GRAPH.neighborhood(['a'], depth=2) == {'a': 0, 'b': 1, 'c': 2}
+    assert GRAPH.neighborhood(['a'], depth=3) == {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 3}
+    assert GRAPH.neighborhood(['a'], depth=10) == GRAPH.neighborhood(['a'], depth=3)
+
+
+def test_direction_picks_which_way_foreign_keys_are_followed():
+    assert GRAPH.neighborhood(['c'], depth=2, direction='referenced') == {'c': 0, 'd': 1}
+    assert GRAPH.neighborhood(['c'], depth=2, direction='referencing') == {
+        'c': 0, 'b': 1, 'e': 1, 'a': 2}
+    with pytest.raises(ValueError):
+        GRAPH.neighborhood(['c'], direction='sideways')
+
+
+def test_max_tables_cuts_the_search_short_deterministically():
+    first = GRAPH.neighborhood(['c'], depth=2, max_tables=3)
+    assert len(first) == 3 and first['c'] == 0
+    assert GRAPH.neighborhood(['c'], depth=2, max_tables=3) == first
+
+
+def test_unknown_centers_are_ignored():
+    assert GRAPH.neighborhood(['nope', 'd'], depth=1) == {'d': 0, 'c': 1}
+
+
+def test_relationships_among_selected_tables():
+    assert [(r['from_table'], r['to_table']) for r in GRAPH.relationships(['a', 'b', 'c'])] == [
+        ('a', 'b'), ('b', 'c')]
+    assert len(GRAPH.relationships()) == 4
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from database.erdb import DatabaseManager
+from database.pool import ConnectionManager, ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeManager:
+    def ping(self, conn, db_type):
+        return conn.alive
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+    return ConnectionPool(FakeManager(), 'postgresql', connect, **kwargs), opened
+
+
+def test_acquire_opens_up_to_max_size_then_times_out():
+    pool, opened = make_pool(max_size=2, checkout_timeout=0.05)
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second and len(opened) == 2
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    assert pool.stats() == {'size': 2, 'idle': 0, 'in_use': 2, 'max_size': 2}
+
+
+def test_released_connection_is_rolled_back_and_reused():
+    pool, opened = make_pool()
+    conn = pool.acquire()
+    pool.release(conn)
+    assert conn.rollbacks == 1
+    assert pool.acquire() is conn
+    assert len(opened) == 1
+
+
+def test_dead_connection_is_replaced_on_checkout():
+    pool, opened = make_pool(max_size=1)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+    fresh = pool.acquire()
+    assert fresh is not conn and conn.closed
+    assert pool.stats()['size'] == 1
+
+
+def test_discarded_connection_frees_its_slot():
+    pool, _ = make_pool(max_size=1, checkout_timeout=0.05)
+    conn = pool.acquire()
+    pool.release(conn, discard=True)
+    assert conn.closed
+    assert pool.acquire() is not conn
+
+
+def test_evict_idle_closes_only_expired_connections():
+    pool, _ = make_pool(idle_timeout=60)
+    old, recent = FakeConnection(), FakeConnection()
+    pool.add(old)
+    pool.add(recent)
+    now = time.time()
+    pool._idle = [(old, now - 120), (recent, now - 10)]
+    pool.evict_idle(now)
+    assert old.closed and not recent.closed
+    assert pool.stats() == {'size': 1, 'idle': 1, 'in_use': 0, 'max_size': 5}
+
+
+def test_sessions_expire_by_age_however_busy(tmp_path):
+    path = str(tmp_path / 'pool.db')
+    manager = ConnectionManager(DatabaseManager(), session_timeout=60)
+    conn_id, databases = manager.open_session('sqlite', path, 'user', 'password')
+    assert databases == [path]
+    manager.reap()
+    assert manager.has_session(conn_id)
+
+    manager._sessions[conn_id]['created'] -= 120
+    with manager.connection(conn_id):
+        pass  # Using the session does not extend it
+    manager.reap()
+    assert not manager.has_session(conn_id)
+    assert manager.pool_stats() == {}
+    with pytest.raises(LookupError):
+        with manager.connection(conn_id):
+            pass
@@ -0,0 +1,58 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from database.erdb import DatabaseManager
+from database.profiler import HyperLogLog, profile_sample
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 50000])
+def test_hyperloglog_counts_distinct_values_within_a_few_percent(distinct):
+    sketch = HyperLogLog()
+    sketch.add(pd.Series([f'value {i % distinct}' for i in range(2 * distinct)]))
+    sketch.add(pd.Series([None, None]))
+    assert abs(sketch.count() - distinct) <= max(1, 0.05 * distinct)
+
+
+def test_profiles_report_nulls_ranges_and_top_values():
+    rows = [(i, 'a' if i % 4 else 'b', None if i % 5 == 0 else i * 1.5) for i in range(1, 101)]
+    profiles = profile_sample(['id', 'kind', 'score'], rows)
+    assert profiles['id'] == {'null_fraction': 0.0, 'distinct_estimate': 100, 'min': 1,
+                              'max': 100, 'top_values': profiles['id']['top_values']}
+    assert profiles['kind']['distinct_estimate'] == 2
+    assert profiles['kind']['top_values'][0] == {'value': 'a', 'count': 75, 'fraction': 0.75}
+    assert profiles['score']['null_fraction'] == 0.2
+    assert (profiles['score']['min'], profiles['score']['max']) == (1.5, 148.5)
+
+
+def test_unique_columns_scale_to_the_table_estimate():
+    rows = [(i, i % 3) for i in range(1000)]
+    profiles = profile_sample(['id', 'bucket'], rows, row_estimate=100000)
+    assert profiles['id']['distinct_estimate'] == 100000
+    assert profiles['bucket']['distinct_estimate'] == 3
+
+
+def test_mixed_and_binary_values_stay_json_values():
+    rows = [(b'zz', memoryview(b'abc')), ('text', memoryview(b'abcd')), (7, None)]
+    profiles = profile_sample(['mixed', 'blob'], rows)
+    # Mixed SQLite types are ordered as text but reported as the values themselves
+    assert (profiles['mixed']['min'], profiles['mixed']['max']) == (7, '<2 bytes>')
+    assert profiles['blob']['distinct_estimate'] == 2
+    assert {entry['value'] for entry in profiles['blob']['top_values']} == {'<3 bytes>',
+                                                                           '<4 bytes>'}
+
+
+def test_sqlite_tables_are_sampled_by_rowid_runs(tmp_path):
+    path = str(tmp_path / 'big.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, kind TEXT)')
+    conn.executemany('INSERT INTO events VALUES (?, ?)',
+                     [(i, f'k{i % 7}') for i in range(1, 20001)])
+    conn.commit()
+    profile = DatabaseManager().get_column_profiles(conn, 'sqlite', 'events', sample_size=500)
+    conn.close()
+    assert profile['method'] == 'rowid_range' and profile['sample_rows'] == 500
+    assert profile['columns']['kind']['distinct_estimate'] == 7
+    # Unique in the sample, so scaled to the table
+    assert profile['columns']['id']['distinct_estimate'] > 10000
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from database.catalog_cache import CatalogCache
+from database.collector import StatisticsCollector
+from database.erdb import DatabaseManager
+from database.pool import ConnectionManager
+from database.sampler import SampleStore, StatisticsSampler
+
+
+def stats(row_count, size_mb=1.0):
+    return {'row_count': row_count, 'row_count_estimated': True, 'column_count': 2,
+            'size_mb': size_mb}
+
+
+def test_latest_derives_growth_usage_and_last_update(tmp_path):
+    store = SampleStore(str(tmp_path / 'samples.db'))
+    store.record('t', 0, {'a': stats(100)}, {'a': {'reads': 10, 'writes': 0}})
+    store.record('t', 3600, {'a': stats(100)}, {'a': {'reads': 40, 'writes': 0}})
+    # Counters restarted: the 5 ops since count on top of the 30 before
+    store.record('t', 7200, {'a': stats(150)}, {'a': {'reads': 5, 'writes': 0}})
+    sampled_at, latest = store.latest('t')
+    assert sampled_at == 7200
+    assert latest['a']['growth_rate'] == 600.0          # 50 rows in 2 hours
+    assert latest['a']['usage_frequency'] == 17.5       # 35 ops in 2 hours
+    assert latest['a']['last_update'] == '1970-01-01 02:00 UTC'
+    assert store.latest('other') == (None, {})
+
+    store.prune('t', now=7200 + store.retention - 1)
+    assert store.latest('t')[0] == 7200
+
+
+@pytest.fixture
+def sampler(tmp_path):
+    path = str(tmp_path / 'shop.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)')
+    conn.executemany('INSERT INTO users VALUES (?, ?)', [(i, 'x') for i in range(7)])
+    conn.commit()
+    conn.close()
+    manager = DatabaseManager()
+    connections = ConnectionManager(manager, session_timeout=60)
+    conn_id, _ = connections.open_session('sqlite', path, 'user', 'password')
+    sampler = StatisticsSampler(manager, connections, StatisticsCollector(manager, connections),
+                                CatalogCache(manager), SampleStore(str(tmp_path / 's.db')))
+    sampler.watch(conn_id, 'sqlite', path, path)
+    yield sampler, connections, conn_id, path
+    connections.close_session(conn_id)
+
+
+def test_sampling_answers_snapshots_without_using_the_session(sampler):
+    sampler, connections, conn_id, path = sampler
+    connections._sessions[conn_id]['last_used'] = 0
+    sampler.sample()
+    assert connections._sessions[conn_id]['last_used'] == 0
+    snapshot = sampler.snapshot('sqlite', path, path, ['users'])
+    assert snapshot['users']['row_count'] == 7
+    assert sampler.snapshot('sqlite', path, path, ['users', 'missing']) is None
+
+
+def test_sessions_past_their_age_limit_are_not_sampled(sampler):
+    sampler, connections, conn_id, path = sampler
+    connections._sessions[conn_id]['created'] -= 120
+    # Not reaped yet, but too old to sample on behalf of
+    assert connections.has_session(conn_id) and connections.expired(conn_id)
+    sampler.sample()
+    assert sampler._targets == {}
+    assert sampler.store.latest(sampler.target('sqlite', path, path)) == (None, {})
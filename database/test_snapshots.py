@@ -0,0 +1,62 @@
+import gzip
+import json
+import time
+
+import pytest
+
+from database.snapshots import SnapshotStore, decode_snapshot, encode_snapshot, snapshot_meta
+
+CATALOG = {
+    'users': {'schema': [{'column': 'id', 'type': 'INTEGER', 'null': 'NO', 'key': 'PRI',
+                          'extra': '', 'default': None},
+                         {'column': 'name', 'type': 'TEXT', 'null': 'YES', 'key': '',
+                          'extra': '', 'default': "'anon'"}],
+              'foreign_keys': []},
+    'orders': {'schema': [{'column': 'id', 'type': 'INTEGER', 'null': 'NO', 'key': 'PRI',
+                           'extra': '', 'default': None},
+                          {'column': 'user_id', 'type': 'INTEGER', 'null': 'YES', 'key': 'FK',
+                           'extra': '', 'default': None}],
+               'foreign_keys': [{'column': 'user_id', 'referenced_table': 'users',
+                                 'referenced_column': 'id'}]},
+}
+OWNER = ('sqlite', 'shop.db', 'test')
+
+
+def test_snapshots_round_trip_with_shared_strings():
+    meta = snapshot_meta(CATALOG, 'sqlite', 'shop.db', 'main', 'abc')
+    assert (meta['tables'], meta['columns']) == (2, 4)
+    data = encode_snapshot(CATALOG, meta)
+    assert decode_snapshot(data) == (meta, CATALOG)
+    payload = json.loads(gzip.decompress(data))
+    # Every repeated name and type is stored once
+    assert payload['strings'].count('INTEGER') == 1 and payload['strings'].count('id') == 1
+
+
+def test_other_format_versions_are_refused():
+    payload = json.loads(gzip.decompress(encode_snapshot(CATALOG, {})))
+    payload['version'] += 1
+    with pytest.raises(ValueError, match='Unsupported snapshot format'):
+        decode_snapshot(gzip.compress(json.dumps(payload).encode('utf-8')))
+
+
+def test_store_lists_newest_first_and_keeps_max_per_target(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path), max_per_target=2)
+    clock = iter(range(1000, 2000, 10))
+    monkeypatch.setattr(time, 'time', lambda: next(clock))
+    first = store.save(OWNER, CATALOG, 'sqlite', 'shop.db', 'main')
+    second = store.save(OWNER, {'users': CATALOG['users']}, 'sqlite', 'shop.db', 'main')
+    other = store.save(OWNER, CATALOG, 'sqlite', 'shop.db', 'archive')
+    assert [meta['snapshot_id'] for meta in store.list(OWNER)] == [other['snapshot_id'],
+                                                                    second['snapshot_id']]
+    assert store.load(OWNER, first['snapshot_id']) is None
+    assert [meta['snapshot_id'] for meta in store.list(OWNER, 'main')] == [second['snapshot_id']]
+    assert store.load(OWNER, second['snapshot_id'])[1] == {'users': CATALOG['users']}
+
+
+def test_store_keeps_targets_apart_and_refuses_paths(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    saved = store.save(OWNER, CATALOG, 'sqlite', 'shop.db', 'main')
+    assert store.list(('sqlite', 'other.db', 'test')) == []
+    assert store.load(('sqlite', 'other.db', 'test'), saved['snapshot_id']) is None
+    for snapshot_id in ('../x', f'.{saved["snapshot_id"]}', 'missing'):
+        assert store.load(OWNER, snapshot_id) is None
@@ -0,0 +1,186 @@
+import io
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class ArtifactStore:
+    """Generated images kept on disk per session, downloaded by URL
+
+    Files live at <directory>/<session_id>/<artifact_id>.<format>, where
+    directory is a folder of root the store creates for itself on first use
+    and removes on close(); anything else under root is left alone, so
+    several processes can share it. Artifact ids are render cache keys
+    (content hashes), so the same diagram or chart maps to the same file and
+    downloads can be cached for as long as they exist. The store is bounded
+    by total bytes, oldest written first out, and files are dropped ttl
+    seconds after they were written or once their session ends; expire() is
+    run by the connection reaper.
+
+    Download URLs carry a random token per (session, artifact) rather than
+    the session id, which grants database access; resolve() maps it back.
+    """
+
+    FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml', 'jpeg': 'image/jpeg',
+               'pdf': 'application/pdf'}
+    # Sessions and download tokens are secrets.token_urlsafe tokens and
+    # artifact ids SHA-256 hex digests
+    _SESSION = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+    _NAME = re.compile(r'^[0-9a-f]{64}\.(png|svg|jpeg|pdf)$')
+
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024, ttl=1800):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._files = OrderedDict()  # (session_id, name) -> (size, written_at), oldest first
+        self._size = 0
+        self._tokens = {}    # download token -> (session_id, artifact_id)
+        self._token_of = {}  # (session_id, artifact_id) -> download token
+        self._directory = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        """This store's own folder under root, created on first use"""
+        with self._lock:
+            if self._directory is None:
+                os.makedirs(self.root, exist_ok=True)
+                self._directory = tempfile.mkdtemp(prefix=f'store-{os.getpid()}-', dir=self.root)
+            return self._directory
+
+    def close(self):
+        """Remove every file this store wrote"""
+        with self._lock:
+            directory, self._directory = self._directory, None
+            self._files.clear()
+            self._tokens.clear()
+            self._token_of.clear()
+            self._size = 0
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def put(self, session_id, artifact_id, fmt, data):
+        """Write an artifact (unless already stored) and get its file name"""
+        name = f"{artifact_id}.{fmt}"
+        if not self._valid(session_id, name):
+            raise ValueError(f"Invalid artifact: {name}")
+        with self._lock:
+            if (session_id, name) in self._files:
+                return name
+
+        directory = os.path.join(self.directory, session_id)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        evicted = []
+        with self._lock:
+            self._size += len(data) - self._files.pop((session_id, name), (0, 0))[0]
+            self._files[(session_id, name)] = (len(data), time.time())
+            if (session_id, artifact_id) not in self._token_of:
+                token = secrets.token_urlsafe(24)
+                self._tokens[token] = (session_id, artifact_id)
+                self._token_of[(session_id, artifact_id)] = token
+            while self._size > self.max_bytes and len(self._files) > 1:
+                key, (size, _) = self._files.popitem(last=False)
+                self._size -= size
+                evicted.append(key)
+            self._forget_tokens(evicted)
+        self._remove(evicted)
+        return name
+
+    def token(self, session_id, artifact_id):
+        """Get the download token of a stored artifact (any format), or None"""
+        with self._lock:
+            return self._token_of.get((session_id, artifact_id))
+
+    def resolve(self, token):
+        """Get (session_id, artifact_id) for a download token, or None"""
+        with self._lock:
+            return self._tokens.get(token)
+
+    def path(self, session_id, name):
+        """Get the file path of a stored artifact, or None"""
+        if not self._valid(session_id, name):
+            return None
+        with self._lock:
+            if (session_id, name) not in self._files:
+                return None
+            return os.path.join(self._directory, session_id, name)
+
+    def get(self, session_id, name):
+        """Read a stored artifact's bytes, or None"""
+        path = self.path(session_id, name)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def expire(self, is_live, now=None):
+        """Drop artifacts older than ttl and those of sessions is_live rejects"""
+        now = now or time.time()
+        with self._lock:
+            expired = [key for key, (_, written) in self._files.items()
+                       if now - written > self.ttl or not is_live(key[0])]
+            for key in expired:
+                self._size -= self._files.pop(key)[0]
+            self._forget_tokens(expired)
+            live_sessions = {session_id for session_id, _ in self._files}
+            directory = self._directory
+        if directory is None:
+            return
+        self._remove(expired, directory)
+        # Remove directories of sessions with nothing left
+        for session_id in {session_id for session_id, _ in expired} - live_sessions:
+            try:
+                os.rmdir(os.path.join(directory, session_id))
+            except OSError:
+                pass
+
+    def _valid(self, session_id, name):
+        return bool(self._SESSION.match(session_id or '') and self._NAME.match(name or ''))
+
+    def _forget_tokens(self, keys):
+        """Drop the tokens of artifacts with no format left (lock held)"""
+        artifacts = {(session_id, name.rpartition('.')[0]) for session_id, name in keys}
+        stored = {(session_id, name.rpartition('.')[0]) for session_id, name in self._files}
+        for artifact in artifacts - stored:
+            self._tokens.pop(self._token_of.pop(artifact, None), None)
+
+    def _remove(self, keys, directory=None):
+        directory = directory or self.directory
+        for session_id, name in keys:
+            try:
+                os.remove(os.path.join(directory, session_id, name))
+            except OSError:
+                pass
+
+
+def convert_image(data, fmt):
+    """Convert PNG bytes to JPEG or PDF for download"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    with Image.open(io.BytesIO(data)) as image:
+        # Neither JPEG nor PDF keep transparency; flatten onto white
+        flat = Image.new('RGB', image.size, '#FFFFFF')
+        rgba = image.convert('RGBA')
+        flat.paste(rgba, mask=rgba.getchannel('A'))
+        if fmt == 'jpeg':
+            flat.save(buffer, format='JPEG', quality=92)
+        elif fmt == 'pdf':
+            flat.save(buffer, format='PDF', resolution=300)
+        else:
+            raise ValueError(f"Cannot convert to {fmt}")
+    return buffer.getvalue()
@@ -0,0 +1,36 @@
+from matplotlib.text import Text
+
+
+class ColumnLabels(Text):
+    """Multi-line text whose lines sit one per table row
+
+    matplotlib spaces lines using the pixel metrics of "lp", which depend on
+    the output dpi through glyph hinting, so the spacing is fitted to the row
+    height with the renderer that actually draws it.
+    """
+
+    def __init__(self, x, row_top, text, row_height, **kwargs):
+        super().__init__(x, row_top, text, ha='left', va='top', **kwargs)
+        self._row_top = row_top
+        self._row_height = row_height
+
+    def _fit_rows(self, renderer):
+        (_, y0), (_, y1) = self.axes.transData.transform([(0, 0), (0, self._row_height)])
+        row_pixels = abs(y1 - y0)
+        _, height, descent = renderer.get_text_width_height_descent(
+            'lp', self.get_fontproperties(), ismath=False)
+        ascent = height - descent
+        if ascent > 0 and row_pixels > height:
+            # Each line advances by linespacing * ascent + descent
+            self.set_linespacing((row_pixels - descent) / ascent)
+            # Center the first line's box in the first row
+            self.set_y(self._row_top - (row_pixels - height) / 2 * self._row_height / row_pixels)
+
+    def get_window_extent(self, renderer=None, dpi=None):
+        if renderer is not None:
+            self._fit_rows(renderer)
+        return super().get_window_extent(renderer, dpi)
+
+    def draw(self, renderer):
+        self._fit_rows(renderer)
+        super().draw(renderer)
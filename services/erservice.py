@@ -1,16 +1,53 @@
-import matplotlib
-import matplotlib.patches as patches
-import matplotlib.pyplot as plt
+import math
 
-matplotlib.use('Agg')
 import numpy as np
 
+from services.layout import LayoutEngine
+from services.router import EdgeRouter
+
+
+def _pyplot():
+    """Import pyplot on the Agg backend
+
+    Only drawing needs matplotlib, so importing this module (for layout,
+    routing and geometry) stays cheap and the first figure pays for it.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
 
 class ERDiagramGenerator:
+    # Table geometry in diagram units
+    ROW_HEIGHT = 2.2
+    HEADER_HEIGHT = 3.5
+    SHADOW_OFFSET = 0.3
+    MARGIN = 2
+    # Figure inches per diagram unit (an 18-inch figure used to span 100 units);
+    # larger diagrams are scaled down to MAX_FIGURE_INCHES on their long side
+    INCHES_PER_UNIT = 0.18
+    MAX_FIGURE_INCHES = 24
+    MIN_FIGURE_INCHES = 8  # Room for the title
+    TITLE_INCHES = 1
+    # Arrowhead length and half-width in diagram units
+    ARROW_LENGTH = 0.9
+    ARROW_WIDTH = 0.45
+    # Tiles drawn smaller than this (9 pt column text at 2.7 pt) skip text
+    MIN_LABEL_SCALE = 0.3
+    # Rendering to PNG peaks at the 4-byte RGBA canvas plus encoder buffers
+    # (about 4.1 bytes per pixel measured); fit_dpi lowers the DPI to keep
+    # that within the budget
+    CANVAS_BYTES_PER_PIXEL = 5
+    RENDER_BUDGET_MB = 128
+    MIN_RENDER_DPI = 100
+
     def __init__(self):
         self.fig = None
         self.ax = None
         self.table_dimensions = {}  # Stores width/height for each table
+        self.layout_engine = LayoutEngine()
+        self.edge_router = EdgeRouter()
         
         # Enhanced color scheme
         self.colors = {
@@ -24,231 +61,439 @@ class ERDiagramGenerator:
             'text': '#2C3E50'            # Dark blue-gray for text
         }
         
-    def generate_diagram(self, tables_data, relationships):
-        """Generate enhanced ER diagram using matplotlib"""
+    def generate_diagram(self, tables_data, relationships, layout='auto', table_layout=None,
+                         routes=None):
+        """Generate enhanced ER diagram using matplotlib
+
+        Artists are batched per layer (all shadows, all cells, all connectors
+        and one text block per table) because matplotlib's per-artist overhead,
+        not pixel work, dominates large diagrams. Pass routes from
+        route_relationships to skip routing.
+        """
+        plt = _pyplot()
         plt.style.use('default')
         
-        # Create figure with better proportions
-        fig, ax = plt.subplots(figsize=(18, 14))
-        ax.set_xlim(0, 100)
-        ax.set_ylim(0, 100)
+        # Place tables from the FK graph (unless already placed), then size the figure to fit them
+        if table_layout is None:
+            table_layout = self.compute_layout(tables_data, relationships, layout)
+        (min_x, min_y, max_x, max_y), scale = self.diagram_frame(table_layout)
+        
+        # The axes fill the figure below the title, so one unit is exactly
+        # INCHES_PER_UNIT * scale inches and text can be sized to the rows
+        fig_width, fig_height = self.figure_size(table_layout)
+        fig, ax = plt.subplots(figsize=(fig_width, fig_height))
+        fig.subplots_adjust(left=0, right=1, bottom=0, top=1 - self.TITLE_INCHES / fig_height)
+        ax.set_xlim(min_x, max_x)
+        ax.set_ylim(min_y, max_y)
         ax.axis('off')
         
         # Set background color
         fig.patch.set_facecolor('#FFFFFF')
         
-        # Calculate positions for tables with better spacing
-        num_tables = len(tables_data)
-        positions = self._calculate_positions(num_tables)
-        
-        # Draw tables with enhanced styling
-        table_positions = {}
-        for i, (table_name, table_info) in enumerate(tables_data.items()):
-            pos = positions[i]
-            table_positions[table_name] = pos
-            self._draw_table(ax, table_name, table_info['schema'], pos)
+        # Add subtle grid for better visual structure
+        self._add_subtle_background(ax, (min_x, min_y, max_x, max_y))
         
-        # Draw relationships with improved styling
-        for rel in relationships:
-            self._draw_relationship(ax, rel, table_positions)
+        # Draw tables, then relationships along routes that avoid the other tables
+        if routes is None:
+            routes = self.route_relationships(relationships, table_layout)
+        self._draw_layers(ax, tables_data, table_layout, relationships, routes, scale)
         
         # Enhanced title with better styling
-        plt.suptitle('ERGenix - Database ER Diagram', 
+        fig.suptitle('ERGenix - Database ER Diagram', 
                     fontsize=24, fontweight='bold', 
                     color=self.colors['header_bg'], 
-                    y=0.95, fontfamily='serif')
+                    y=1 - self.TITLE_INCHES * 0.45 / fig_height, fontfamily='serif')
         
-        # Add subtle grid for better visual structure
-        self._add_subtle_background(ax)
+        return fig
+    
+    def diagram_frame(self, table_layout):
+        """Get the plotted extent (min_x, min_y, max_x, max_y) and the scale of a full diagram"""
+        min_x, min_y, max_x, max_y = self.layout_extent(table_layout)
+        # Widen narrow diagrams (both sides equally) so the title fits
+        pad = max(0.0, self.MIN_FIGURE_INCHES / self.INCHES_PER_UNIT - (max_x - min_x)) / 2
+        min_x, max_x = min_x - pad, max_x + pad
+        width_inches = (max_x - min_x) * self.INCHES_PER_UNIT
+        height_inches = (max_y - min_y) * self.INCHES_PER_UNIT
+        # Fonts and lines are in points, so shrink them along with the figure
+        scale = min(1.0, self.MAX_FIGURE_INCHES / max(width_inches, height_inches))
+        return (min_x, min_y, max_x, max_y), scale
+
+    def figure_size(self, table_layout):
+        """Width and height in inches of the full diagram's figure, title included"""
+        (min_x, min_y, max_x, max_y), scale = self.diagram_frame(table_layout)
+        return ((max_x - min_x) * self.INCHES_PER_UNIT * scale,
+                (max_y - min_y) * self.INCHES_PER_UNIT * scale + self.TITLE_INCHES)
+
+    def canvas_bytes(self, table_layout, dpi):
+        """Estimated peak memory of rendering the full diagram to PNG at dpi"""
+        return self.figure_bytes(*self.figure_size(table_layout), dpi)
+
+    def fit_dpi(self, table_layout, budget_bytes=None, max_dpi=300, min_dpi=None):
+        """Highest DPI up to max_dpi at which the full diagram renders within budget_bytes
+
+        Defaults to RENDER_BUDGET_MB and MIN_RENDER_DPI. Returns None when even
+        min_dpi would exceed the budget; draw such diagrams as SVG or tiles.
+        """
+        return self.fit_figure_dpi(*self.figure_size(table_layout), budget_bytes, max_dpi, min_dpi)
+
+    @classmethod
+    def figure_bytes(cls, width, height, dpi):
+        """Estimated peak memory of rendering a width x height inch figure to PNG at dpi"""
+        return math.ceil(width * dpi) * math.ceil(height * dpi) * cls.CANVAS_BYTES_PER_PIXEL
+
+    @classmethod
+    def fit_figure_dpi(cls, width, height, budget_bytes=None, max_dpi=300, min_dpi=None):
+        """fit_dpi for any figure of width x height inches, such as the statistics charts"""
+        if budget_bytes is None:
+            budget_bytes = cls.RENDER_BUDGET_MB * 1024 * 1024
+        min_dpi = min(max_dpi, cls.MIN_RENDER_DPI if min_dpi is None else min_dpi)
+        dpi = min(max_dpi, int(math.sqrt(budget_bytes / (width * height
+                                                         * cls.CANVAS_BYTES_PER_PIXEL))))
+        # Pixel sizes round up, so step down until the estimate really fits
+        while dpi >= min_dpi and cls.figure_bytes(width, height, dpi) > budget_bytes:
+            dpi -= 1
+        return dpi if dpi >= min_dpi else None
+
+    def generate_patch(self, tables_data, table_layout, relationships, routes, region,
+                       image_size, dpi=300):
+        """Redraw region (diagram units) of a full diagram rendered at dpi
+
+        Returns (fig, (left, top)): a figure drawn exactly as generate_diagram
+        would draw that part, snapped to whole pixels of the full image of
+        image_size (width, height), and the pixel offset to paste it at. Only
+        the tables and routes that reach into the region are drawn.
+        """
+        (min_x, min_y, max_x, max_y), scale = self.diagram_frame(table_layout)
+        pixels = self.INCHES_PER_UNIT * scale * dpi  # Per diagram unit
+        # Text cut by the patch edge does not rasterize like the whole string,
+        # so grow the region until every table it touches lies fully inside
+        ink = {name: self.ink_box(name, tables_data[name]['schema'], table_layout[name])
+               for name in tables_data}
+        while True:
+            grown = region
+            for box in ink.values():
+                if self._overlaps(box, grown):
+                    grown = (min(grown[0], box[0]), min(grown[1], box[1]),
+                             max(grown[2], box[2]), max(grown[3], box[3]))
+            if grown == region:
+                break
+            region = grown
+        width, height = image_size
+        # Agg flips y about the whole-pixel image height, so the axes start a
+        # fraction of a pixel off the title height; keep that fraction
+        axes_top = height - (max_y - min_y) * pixels
+        left = max(0, int(np.floor((region[0] - min_x) * pixels)))
+        right = min(width, int(np.ceil((region[2] - min_x) * pixels)))
+        top = max(int(np.ceil(axes_top)), int(np.floor(axes_top + (max_y - region[3]) * pixels)))
+        bottom = min(height, int(np.ceil(axes_top + (max_y - region[1]) * pixels)))
+        bounds = (min_x + left / pixels, max_y - (bottom - axes_top) / pixels,
+                  min_x + right / pixels, max_y - (top - axes_top) / pixels)
+
+        # Text is flipped about the figure's unrounded height instead, so give
+        # the patch the same fraction of a pixel above its axes (and a hair
+        # more, so float error never truncates the patch a pixel short)
+        full_height = (max_y - min_y) * pixels + self.TITLE_INCHES * dpi
+        fraction = full_height - int(full_height)
+        fig = _pyplot().figure(figsize=((right - left + 1e-6) / dpi, (bottom - top + fraction + 1e-6) / dpi))
+        ax = fig.add_axes([0, 0, 1, (bottom - top) / (bottom - top + fraction + 1e-6)])
+        ax.set_xlim(bounds[0], bounds[2])
+        ax.set_ylim(bounds[1], bounds[3])
+        ax.axis('off')
+        fig.patch.set_facecolor('#FFFFFF')
+
+        # The grid spans the whole diagram, so draw it over the whole patch
+        self._add_subtle_background(ax, (max(bounds[0], min_x), max(bounds[1], min_y),
+                                         min(bounds[2], max_x), min(bounds[3], max_y)))
+        names = [name for name in tables_data if self._overlaps(ink[name], bounds)]
+        edges = [i for i, path in enumerate(routes)
+                 if path is not None and self._overlaps(self.route_box(path), bounds)]
+        self._draw_layers(ax, {name: tables_data[name] for name in names}, table_layout,
+                          [relationships[i] for i in edges], [routes[i] for i in edges], scale)
+        return fig, (left, top)
+
+    def ink_box(self, table_name, schema, dims):
+        """(left, bottom, right, top) of everything drawn for a table
+
+        Covers the shadow, the border stroke and header or column text that
+        runs past the box when the width is capped.
+        """
+        longest = max([len(table_name)] + [len(f"{col['column']} : {col['type']}") + 2
+                                           for col in schema])
+        overflow = max(0.0, longest * 0.6 + 4 - dims['width'])
+        top = dims['y'] + self.HEADER_HEIGHT
+        return (dims['x'] - overflow / 2 - 0.5, top - dims['height'] - self.SHADOW_OFFSET - 0.5,
+                dims['x'] + dims['width'] + overflow + self.SHADOW_OFFSET + 0.5, top + 0.5)
+
+    def table_box(self, dims):
+        """(left, bottom, right, top) of a table's box, header included"""
+        top = dims['y'] + self.HEADER_HEIGHT
+        return dims['x'], top - dims['height'], dims['x'] + dims['width'], top
+
+    def route_box(self, path):
+        """(left, bottom, right, top) of a routed connector with its arrowhead"""
+        xs, ys = path
+        reach = self.ARROW_WIDTH + 0.5
+        return min(xs) - reach, min(ys) - reach, max(xs) + reach, max(ys) + reach
+
+    @staticmethod
+    def _overlaps(a, b):
+        return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+    def generate_tile(self, tables_data, table_layout, relationships, routes, bounds,
+                      tile_size=256, dpi=100):
+        """Draw one square tile of a diagram, covering bounds in diagram units
+
+        Only the tables and routes passed in are drawn, so callers hand over
+        just what intersects the tile. Fonts and lines scale with the zoom,
+        and text is left out once it would be too small to read.
+        """
+        left, bottom, right, top = bounds
+        inches = tile_size / dpi
+        scale = inches / (right - left) / self.INCHES_PER_UNIT
         
-        plt.tight_layout()
+        fig = _pyplot().figure(figsize=(inches, inches))
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_xlim(left, right)
+        ax.set_ylim(bottom, top)
+        ax.axis('off')
+        fig.patch.set_facecolor('#FFFFFF')
+        
+        self._add_subtle_background(ax, bounds)
+        self._draw_layers(ax, tables_data, table_layout, relationships, routes, scale,
+                          labels=scale >= self.MIN_LABEL_SCALE)
         return fig
     
-    def _add_subtle_background(self, ax):
-        """Add a subtle background pattern"""
-        # Add very light grid lines
-        for i in range(0, 101, 20):
-            ax.axhline(y=i, color='#F0F0F0', linewidth=0.3, alpha=0.5)
-            ax.axvline(x=i, color='#F0F0F0', linewidth=0.3, alpha=0.5)
+    def _draw_layers(self, ax, tables_data, table_layout, relationships, routes, scale,
+                     labels=True):
+        """Collect every table's boxes and every route, then draw each layer as one collection"""
+        from matplotlib.collections import LineCollection, PolyCollection
+
+        layers = {'shadows': [], 'shadow_colors': [], 'cells': [], 'cell_colors': [],
+                  'cell_widths': [], 'connectors': []}
+        for table_name, table_info in tables_data.items():
+            dims = table_layout[table_name]
+            self._draw_table(ax, table_name, table_info['schema'], (dims['x'], dims['y']),
+                             scale, layers, labels)
+        
+        for rel, path in zip(relationships, routes):
+            if path is not None:
+                self._draw_relationship(ax, rel, path, scale, layers, labels)
+        
+        ax.add_collection(PolyCollection(self._quads(layers['shadows']),
+                                         facecolors=self._rgba(layers['shadow_colors']),
+                                         linewidths=0, zorder=1))
+        ax.add_collection(PolyCollection(self._quads(layers['cells']),
+                                         facecolors=self._rgba(layers['cell_colors']),
+                                         edgecolors=self.colors['table_border'],
+                                         linewidths=np.array(layers['cell_widths']) * scale,
+                                         zorder=1.1))
+        ax.add_collection(LineCollection(layers['connectors'], colors=self.colors['relationship'],
+                                         linewidths=2.5 * scale, alpha=0.8, zorder=2))
     
-    def _calculate_positions(self, num_tables):
-        """Calculate optimal positions for tables with better spacing"""
-        positions = []
-        if num_tables <= 4:
-            # Optimized positions for better visual balance
-            grid_positions = [(15, 75), (75, 75), (15, 25), (75, 25)]
-            positions = grid_positions[:num_tables]
-        else:
-            # Dynamic grid with improved spacing
-            cols = int(np.ceil(np.sqrt(num_tables)))
-            rows = int(np.ceil(num_tables / cols))
-            
-            # Calculate spacing to avoid overlap
-            x_spacing = 80 / cols
-            y_spacing = 70 / rows
-            
-            for i in range(num_tables):
-                row = i // cols
-                col = i % cols
-                x = 10 + (col * x_spacing)
-                y = 85 - (row * y_spacing)
-                positions.append((x, y))
-        
-        return positions
+    @staticmethod
+    def _quads(boxes):
+        """Boxes as one (n, 4, 2) array, which PolyCollection turns into paths much faster"""
+        return np.array(boxes, dtype=float).reshape(-1, 4, 2)
+
+    @staticmethod
+    def _rgba(colors):
+        """RGBA rows for a list of colors, converting each distinct color once"""
+        from matplotlib.colors import to_rgba
+
+        rgba = {color: to_rgba(color) for color in set(colors)}
+        return np.array([rgba[color] for color in colors]).reshape(-1, 4)
+
+    def _add_subtle_background(self, ax, extent):
+        """Add a subtle background pattern"""
+        from matplotlib.collections import LineCollection
+
+        # Add very light grid lines every 20 units across the diagram
+        min_x, min_y, max_x, max_y = extent
+        lines = ([[(x, min_y), (x, max_y)] for x in self.grid_lines(min_x, max_x)]
+                 + [[(min_x, y), (max_x, y)] for y in self.grid_lines(min_y, max_y)])
+        ax.add_collection(LineCollection(lines, colors='#F0F0F0', linewidths=0.3, alpha=0.5,
+                                         zorder=0.5))
+
+    @staticmethod
+    def grid_lines(low, high, step=20):
+        """Multiples of step between low and high"""
+        return np.arange(np.ceil(low / step) * step, high, step)
     
-    def _draw_table(self, ax, table_name, schema, position):
-        """Draw an enhanced table box with improved styling"""
+    def calculate_table_positions(self, tables_data, relationships=None, algorithm='auto'):
+        """Map each table name to its (x, y) anchor, in tables_data order"""
+        layout = self.compute_layout(tables_data, relationships, algorithm)
+        return {name: (dims['x'], dims['y']) for name, dims in layout.items()}
+
+    def compute_layout(self, tables_data, relationships=None, algorithm='auto', previous=None):
+        """Get the box of every table: {name: {'x', 'y', 'width', 'height'}}
+
+        (x, y) is the bottom-left corner of the header; columns extend below y.
+        Tables are placed by LayoutEngine using the relationships as FK edges.
+        Passing the previous result keeps unchanged tables where they were.
+        """
+        sizes = {table_name: self.table_size(table_name, table_info['schema'])
+                 for table_name, table_info in tables_data.items()}
+        edges = [(rel['from_table'], rel['to_table']) for rel in relationships or []]
+        # The engine works with whole boxes (header on top); shift to the header anchor
+        if previous:
+            previous = {name: (dims['x'], dims['y'] + self.HEADER_HEIGHT, dims['width'], dims['height'])
+                        for name, dims in previous.items()}
+        corners = self.layout_engine.layout(sizes, edges, algorithm, previous)
+        layout = {}
+        for table_name, (left, top) in corners.items():
+            width, height = sizes[table_name]
+            layout[table_name] = {'x': left, 'y': top - self.HEADER_HEIGHT,
+                                  'width': width, 'height': height}
+        return layout
+
+    def layout_extent(self, layout):
+        """Get (min_x, min_y, max_x, max_y) covering every table, shadow and margin"""
+        if not layout:
+            return 0, 0, 100, 100
+        min_x = min(dims['x'] for dims in layout.values())
+        max_x = max(dims['x'] + dims['width'] for dims in layout.values()) + self.SHADOW_OFFSET
+        min_y = min(dims['y'] + self.HEADER_HEIGHT - dims['height']
+                    for dims in layout.values()) - self.SHADOW_OFFSET
+        max_y = max(dims['y'] + self.HEADER_HEIGHT for dims in layout.values())
+        return (min_x - self.MARGIN, min_y - self.MARGIN,
+                max_x + self.MARGIN, max_y + self.MARGIN)
+
+    def table_size(self, table_name, schema):
+        """Get (width, height) of a table box in diagram units"""
+        max_text_width = max([len(table_name)] +
+                             [len(f"{col['column']} : {col['type']}") for col in schema])
+        width = min(max_text_width * 0.6 + 4, 28)
+        height = len(schema) * self.ROW_HEIGHT + self.HEADER_HEIGHT
+        return width, height
+
+    def route_relationships(self, relationships, layout, fixed=None):
+        """Get an orthogonal (xs, ys) route per relationship, or None if unplaced
+
+        fixed maps relationship indexes to routes that are still valid (see
+        services.incremental.reusable_routes) so only the others are routed.
+        """
+        boxes = {table_name: self.table_box(dims) for table_name, dims in layout.items()}
+        edges = [(rel['from_table'], rel['to_table']) for rel in relationships]
+        fixed = {i: list(zip(*path)) for i, path in (fixed or {}).items()}
+        return [None if points is None else self._xy(points)
+                for points in self.edge_router.route(edges, boxes, fixed)]
+
+    def plan_routes(self, relationships, layout):
+        """EdgeRouter plan of the relationships, for routing them a table pair at a time"""
+        boxes = {table_name: self.table_box(dims) for table_name, dims in layout.items()}
+        return self.edge_router.plan([(rel['from_table'], rel['to_table'])
+                                      for rel in relationships], boxes)
+
+    def route_bundle(self, plan, pair, sketch=False):
+        """Get {relationship index: (xs, ys)} for one table pair of a plan
+
+        sketch draws a plain elbow instead of routing around other tables.
+        """
+        router = self.edge_router
+        lanes = router.sketch_bundle(plan, pair) if sketch else router.route_bundle(plan, pair)
+        return {i: self._xy(points) for i, points in lanes.items()}
+
+    @staticmethod
+    def _xy(points):
+        return [x for x, _ in points], [y for _, y in points]
+
+    @staticmethod
+    def path_midpoint(xs, ys):
+        """Middle of the middle segment of a route, where its label goes"""
+        i = len(xs) // 2
+        return (xs[i - 1] + xs[i]) / 2, (ys[i - 1] + ys[i]) / 2
+
+    def _draw_table(self, ax, table_name, schema, position, scale, layers, labels=True):
+        """Add one table's boxes to the shared layers and (with labels) its text to the axes"""
+        from services.column_labels import ColumnLabels
+
         x, y = position
         
         # Calculate table dimensions with better proportions
-        max_text_width = max(len(table_name), 
-                            max(len(f"{col['column']} : {col['type']}") for col in schema))
-        width = min(max_text_width * 0.6 + 4, 28)
-        row_height = 2.2
-        header_height = 3.5
-        height = len(schema) * row_height + header_height
-        
-        # Add shadow effect
-        shadow_offset = 0.3
-        shadow_rect = patches.Rectangle((x + shadow_offset, y - shadow_offset), 
-                                      width, header_height,
-                                      linewidth=0, facecolor='#00000020')
-        ax.add_patch(shadow_rect)
-        
-        # Draw table header with gradient-like effect
-        header_rect = patches.Rectangle((x, y), width, header_height,
-                                      linewidth=2.5, 
-                                      edgecolor=self.colors['table_border'],
-                                      facecolor=self.colors['header_bg'])
-        ax.add_patch(header_rect)
+        width, height = self.table_size(table_name, schema)
+        row_height = self.ROW_HEIGHT
+        header_height = self.HEADER_HEIGHT
+        shadow_offset = self.SHADOW_OFFSET
+        
+        # Header box and its shadow
+        layers['shadows'].append(self._box(x + shadow_offset, y - shadow_offset, width, header_height))
+        layers['shadow_colors'].append('#00000020')
+        layers['cells'].append(self._box(x, y, width, header_height))
+        layers['cell_colors'].append(self.colors['header_bg'])
+        layers['cell_widths'].append(2.5)
         
         # Add header text with better styling
-        ax.text(x + width/2, y + header_height/2, table_name, 
-                ha='center', va='center',
-                fontweight='bold', fontsize=12,
-                color=self.colors['header_text'],
-                fontfamily='sans-serif')
+        if labels:
+            ax.text(x + width/2, y + header_height/2, table_name, 
+                    ha='center', va='center',
+                    fontweight='bold', fontsize=12 * scale,
+                    color=self.colors['header_text'],
+                    fontfamily='sans-serif')
         
-        # Draw columns with alternating colors and better formatting
+        # Column rows with alternating colors, PK/FK highlighting and shadows
+        lines = []
         for i, col in enumerate(schema):
             col_y = y - (i + 1) * row_height
             
-            # Determine background color based on key type
+            # Determine background color and marker based on key type
             if col['key'] == 'PRI':
                 bg_color = self.colors['pk_bg']
-            elif 'FK' in col.get('key', ''):
+                prefix = "🔑 "  # Key emoji for primary key
+            elif 'FK' in (col.get('key') or ''):
                 bg_color = self.colors['fk_bg']
+                prefix = "🔗 "  # Link emoji for foreign key
             else:
                 bg_color = self.colors['table_bg'] if i % 2 == 0 else '#FFFFFF'
+                prefix = ""
             
-            # Add shadow for each row
-            shadow_rect = patches.Rectangle((x + shadow_offset, col_y - shadow_offset), 
-                                          width, row_height,
-                                          linewidth=0, facecolor='#00000010')
-            ax.add_patch(shadow_rect)
-            
-            # Draw column rectangle
-            col_rect = patches.Rectangle((x, col_y), width, row_height,
-                                       linewidth=1.5, 
-                                       edgecolor=self.colors['table_border'],
-                                       facecolor=bg_color)
-            ax.add_patch(col_rect)
-            
-            # Format column text with better typography
-            col_text = f"{col['column']} : {col['type']}"
-            prefix = ""
-            if col['key'] == 'PRI':
-                prefix = "🔑 "  # Key emoji for primary key
-            elif 'FK' in col.get('key', ''):
-                prefix = "🔗 "  # Link emoji for foreign key
-            
-            # Add the text with improved positioning
-            ax.text(x + 1.5, col_y + row_height/2, prefix + col_text,
-                   ha='left', va='center', fontsize=9,
-                   color=self.colors['text'],
-                   fontweight='medium' if col['key'] == 'PRI' else 'normal',
-                   fontfamily='monospace')
+            layers['shadows'].append(self._box(x + shadow_offset, col_y - shadow_offset, width, row_height))
+            layers['shadow_colors'].append('#00000010')
+            layers['cells'].append(self._box(x, col_y, width, row_height))
+            layers['cell_colors'].append(bg_color)
+            layers['cell_widths'].append(1.5)
+            lines.append(f"{prefix}{col['column']} : {col['type']}")
+        
+        # All column labels as one text block, one line per row
+        if lines and labels:
+            ax.add_artist(ColumnLabels(x + 1.5, y, '\n'.join(lines), row_height,
+                                       fontsize=9 * scale, color=self.colors['text'],
+                                       fontfamily='monospace'))
         
         # Store table dimensions for relationship drawing
         self.table_dimensions[table_name] = {
             'x': x, 'y': y, 'width': width, 'height': height
         }
     
-    def _draw_relationship(self, ax, relationship, table_positions):
-        """Draw enhanced relationship lines between tables"""
-        from_table = relationship['from_table']
-        to_table = relationship['to_table']
-        
-        if from_table in table_positions and to_table in table_positions:
-            from_pos = table_positions[from_table]
-            to_pos = table_positions[to_table]
-            
-            # Calculate better connection points (edges of tables rather than centers)
-            from_x, from_y = self._get_connection_point(from_table, to_pos)
-            to_x, to_y = self._get_connection_point(to_table, from_pos)
-            
-            # Draw curved line for better aesthetics
-            if abs(from_x - to_x) > abs(from_y - to_y):
-                # Horizontal curve
-                mid_x = (from_x + to_x) / 2
-                curve_x = [from_x, mid_x, mid_x, to_x]
-                curve_y = [from_y, from_y, to_y, to_y]
-            else:
-                # Vertical curve
-                mid_y = (from_y + to_y) / 2
-                curve_x = [from_x, from_x, to_x, to_x]
-                curve_y = [from_y, mid_y, mid_y, to_y]
-            
-            # Draw the curved relationship line
-            ax.plot(curve_x, curve_y, color=self.colors['relationship'],
-                   linewidth=2.5, alpha=0.8, linestyle='-')
+    @staticmethod
+    def _box(x, y, width, height):
+        """Corners of an axis-aligned box with bottom-left (x, y)"""
+        return [(x, y), (x + width, y), (x + width, y + height), (x, y + height)]
+    
+    def _draw_relationship(self, ax, relationship, path, scale, layers, labels=True):
+        """Add a relationship connector and arrowhead to the shared layers"""
+        curve_x, curve_y = path
+        if len(curve_x) >= 2:
+            to_x, to_y = curve_x[-1], curve_y[-1]
+            layers['connectors'].append(list(zip(curve_x, curve_y)))
             
-            # Add enhanced arrowhead
-            ax.annotate('', xy=(to_x, to_y), xytext=(curve_x[-2], curve_y[-2]),
-                       arrowprops=dict(arrowstyle='->', 
-                                     color=self.colors['relationship'],
-                                     lw=2.5, alpha=0.9))
+            # Open arrowhead along the last segment, pointing at the referenced table
+            dx, dy = to_x - curve_x[-2], to_y - curve_y[-2]
+            length = np.hypot(dx, dy)
+            if length > 0:
+                ux, uy = dx / length, dy / length
+                base_x, base_y = to_x - ux * self.ARROW_LENGTH, to_y - uy * self.ARROW_LENGTH
+                layers['connectors'].append([
+                    (base_x - uy * self.ARROW_WIDTH, base_y + ux * self.ARROW_WIDTH),
+                    (to_x, to_y),
+                    (base_x + uy * self.ARROW_WIDTH, base_y - ux * self.ARROW_WIDTH)
+                ])
             
             # Add relationship label if available
-            if 'relationship_type' in relationship:
-                mid_x = (from_x + to_x) / 2
-                mid_y = (from_y + to_y) / 2
+            if labels and 'relationship_type' in relationship:
+                mid_x, mid_y = self.path_midpoint(curve_x, curve_y)
                 ax.text(mid_x, mid_y, relationship['relationship_type'],
-                       ha='center', va='center', fontsize=8,
+                       ha='center', va='center', fontsize=8 * scale,
                        bbox=dict(boxstyle='round,pad=0.3', 
                                facecolor='white', 
                                edgecolor=self.colors['relationship'],
                                alpha=0.9))
-    
-    def _get_connection_point(self, table_name, target_pos):
-        """Calculate the best connection point on the edge of a table"""
-        if table_name not in self.table_dimensions:
-            # Fallback to center if dimensions not available
-            return target_pos
-        
-        dims = self.table_dimensions[table_name]
-        table_center_x = dims['x'] + dims['width'] / 2
-        table_center_y = dims['y'] - dims['height'] / 2
-        
-        target_x, target_y = target_pos
-        
-        # Determine which edge of the table to connect to
-        dx = target_x - table_center_x
-        dy = target_y - table_center_y
-        
-        if abs(dx) > abs(dy):
-            # Connect to left or right edge
-            if dx > 0:
-                # Connect to right edge
-                return dims['x'] + dims['width'], table_center_y
-            else:
-                # Connect to left edge
-                return dims['x'], table_center_y
-        else:
-            # Connect to top or bottom edge
-            if dy > 0:
-                # Connect to top edge
-                return table_center_x, dims['y']
-            else:
-                # Connect to bottom edge
-                return table_center_x, dims['y'] - dims['height']
\ No newline at end of file
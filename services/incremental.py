@@ -0,0 +1,195 @@
+import threading
+from collections import OrderedDict
+
+from database.catalog_diff import affected_tables, diff_catalogs
+from services.render_cache import RenderCache
+from services.router import SpatialGrid
+
+
+class Drawing:
+    """A laid-out and routed diagram: everything its images are drawn from
+
+    key hashes the whole drawing, so images rendered from it can be cached
+    and compared by key. routes is None for a drawing served as tiles, which
+    route themselves.
+    """
+
+    def __init__(self, tables_data, relationships, table_layout, routes):
+        self.tables_data = tables_data
+        self.relationships = relationships
+        self.table_layout = table_layout
+        self.routes = routes
+        self.key = RenderCache.make_key(tables_data, relationships, table_layout, routes)
+
+
+class DrawingStore:
+    """Remembers the last drawing of each (connection, database) diagram
+
+    The next diagram of the same database is compared against it so only
+    what changed is routed and redrawn. Entries are evicted
+    least-recently-used beyond max_entries.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conn_id, database):
+        """Get the last drawing, or None"""
+        with self._lock:
+            drawing = self._entries.get((conn_id, database))
+            if drawing is not None:
+                self._entries.move_to_end((conn_id, database))
+            return drawing
+
+    def put(self, conn_id, database, drawing):
+        with self._lock:
+            self._entries[(conn_id, database)] = drawing
+            self._entries.move_to_end((conn_id, database))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def relationship_key(rel):
+    return rel['from_table'], rel['to_table'], rel['from_column'], rel['to_column']
+
+
+def reusable_routes(generator, previous, relationships, table_layout):
+    """Routes of the previous drawing that are still valid, by relationship index
+
+    A route is kept when the router would place its ports the same way: the
+    boxes of both tables and of every table connected to either are
+    unchanged, as are the relationships between all of them. It must also
+    stay clear of tables that were added or moved since. Removed tables take
+    their relationships with them, and a table that lost one has changed
+    links, so routes next to removed tables are routed again too.
+    """
+    if previous is None:
+        return {}
+    old_routes = {}
+    for rel, path in zip(previous.relationships, previous.routes):
+        old_routes.setdefault(relationship_key(rel), []).append(path)
+
+    old_links, new_links = _links(previous.relationships), _links(relationships)
+    added = set(table_layout) - set(previous.table_layout)
+    moved = {name for name in set(table_layout) & set(previous.table_layout)
+             if previous.table_layout[name] != table_layout[name]}
+    changed = added | moved
+    grid = SpatialGrid([generator.table_box(table_layout[name]) for name in changed])
+
+    fixed = {}
+    for i, rel in enumerate(relationships):
+        paths = old_routes.get(relationship_key(rel))
+        ends = (rel['from_table'], rel['to_table'])
+        if not paths or paths[0] is None or changed.intersection(ends):
+            continue
+        if any(old_links.get(name) != new_links.get(name) for name in ends):
+            continue
+        if any(partner in changed for name in ends for partner in new_links.get(name, {})):
+            continue
+        path = paths.pop(0)
+        if not _crosses(path, grid):
+            fixed[i] = path
+    return fixed
+
+
+def dirty_regions(generator, previous, drawing, max_regions=8, max_fraction=0.5):
+    """Parts of the previous image to redraw for the new drawing, in diagram units
+
+    Covers the old and new ink of tables the catalog diff touches or the
+    layout moved, and of every route that changed. Returns None when a full
+    render is needed instead: the plotted extent or scale changed (so every
+    pixel moved), or the regions would cover more than max_fraction of the
+    diagram. Beyond max_regions, regions are merged into their bounding box.
+    """
+    frame, scale = generator.diagram_frame(drawing.table_layout)
+    if (frame, scale) != generator.diagram_frame(previous.table_layout):
+        return None
+
+    changed = affected_tables(diff_catalogs(previous.tables_data, drawing.tables_data))
+    changed.update(name for name, dims in drawing.table_layout.items()
+                   if previous.table_layout.get(name) != dims)
+    regions = []
+    for state in (previous, drawing):
+        for name in changed:
+            if name in state.tables_data:
+                regions.append(generator.ink_box(name, state.tables_data[name]['schema'],
+                                                 state.table_layout[name]))
+
+    old_paths = {}
+    for rel, path in zip(previous.relationships, previous.routes):
+        old_paths.setdefault(relationship_key(rel), []).append(path)
+    for rel, path in zip(drawing.relationships, drawing.routes):
+        paths = old_paths.get(relationship_key(rel))
+        if paths and paths[0] == path:
+            paths.pop(0)
+        elif path is not None:
+            regions.append(generator.route_box(path))
+    # Whatever is left over was drawn before and is gone now
+    regions.extend(generator.route_box(path) for paths in old_paths.values()
+                   for path in paths if path is not None)
+
+    regions = _merge(regions)
+    if len(regions) > max_regions:
+        regions = [_union(regions)]
+    area = (frame[2] - frame[0]) * (frame[3] - frame[1])
+    if sum((r[2] - r[0]) * (r[3] - r[1]) for r in regions) > max_fraction * area:
+        return None
+    return regions
+
+
+def _links(relationships):
+    """{table: {partner: [relationship keys]}} in both directions"""
+    links = {}
+    for rel in relationships:
+        a, b = rel['from_table'], rel['to_table']
+        links.setdefault(a, {}).setdefault(b, []).append(relationship_key(rel))
+        if a != b:
+            links.setdefault(b, {}).setdefault(a, []).append(relationship_key(rel))
+    return links
+
+
+def _crosses(path, grid):
+    """Whether an orthogonal route passes through any box of a SpatialGrid"""
+    xs, ys = path
+    return any(grid.hits(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+               for x1, y1, x2, y2 in zip(xs, ys, xs[1:], ys[1:]))
+
+
+def _merge(boxes):
+    """Union overlapping (or touching) boxes until none overlap
+
+    Each pass finds overlapping pairs through a SpatialGrid and unions every
+    connected group at once; passes repeat while unions overlap new boxes.
+    """
+    boxes = list(boxes)
+    while len(boxes) > 1:
+        grid = SpatialGrid(boxes)
+        group = list(range(len(boxes)))
+
+        def find(i):
+            while group[i] != i:
+                group[i] = group[group[i]]
+                i = group[i]
+            return i
+
+        joined = False
+        for i, box in enumerate(boxes):
+            for j in grid.query(*box, margin=1e-9):
+                a, b = find(i), find(j)
+                if a != b:
+                    group[max(a, b)] = min(a, b)
+                    joined = True
+        if not joined:
+            break
+        members = {}
+        for i in range(len(boxes)):
+            members.setdefault(find(i), []).append(boxes[i])
+        boxes = [_union(part) for part in members.values()]
+    return boxes
+
+
+def _union(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
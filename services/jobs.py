@@ -0,0 +1,219 @@
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work once the job has been cancelled"""
+
+
+class Job:
+    """One background request: its state, progress events and result
+
+    Work reports progress through progress(), which also raises JobCancelled
+    once the job is cancelled, so a cancelled job stops at its next stage.
+    Work blocked in a database query registers a hook with cancelling() that
+    aborts the query on cancel. Events are numbered so a Server-Sent Events
+    client can resume after reconnecting (Last-Event-ID). session_id is the
+    session the job was started for; only that session may see it.
+    """
+
+    FINISHED = ('done', 'failed', 'cancelled')
+
+    def __init__(self, kind, session_id=None):
+        self.id = secrets.token_urlsafe(16)
+        self.kind = kind
+        self.session_id = session_id
+        self.state = 'queued'
+        self.stage = None
+        self.done = None
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._events = []  # (sequence, event, data), sequence from 1
+        self._cancel_hooks = []
+        self._cond = threading.Condition()
+
+    def progress(self, stage, done=None, total=None, check=True):
+        """Report the current stage (and item counts); raises JobCancelled if cancelled
+
+        Pass check=False from callbacks inside code that handles cancel_event itself.
+        """
+        if check:
+            self.check()
+        with self._cond:
+            self.stage, self.done, self.total = stage, done, total
+            self._emit('progress', {'stage': stage, 'done': done, 'total': total})
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled('Job cancelled')
+
+    @contextmanager
+    def cancelling(self, hook):
+        """Call hook (e.g. to abort a running query) if the job is cancelled meanwhile"""
+        with self._cond:
+            self._cancel_hooks.append(hook)
+        try:
+            self.check()
+            yield
+        finally:
+            with self._cond:
+                self._cancel_hooks.remove(hook)
+
+    def cancel(self):
+        """Ask the job to stop; False if it has already finished"""
+        with self._cond:
+            if self.state in self.FINISHED:
+                return False
+            self.cancel_event.set()
+            hooks = list(self._cancel_hooks)
+        for hook in hooks:
+            try:
+                hook()
+            except Exception:
+                pass
+        return True
+
+    def snapshot(self, include_result=False):
+        """JSON-serializable status, with the result once done if asked"""
+        with self._cond:
+            status = {'job_id': self.id, 'kind': self.kind, 'state': self.state,
+                      'stage': self.stage, 'done': self.done, 'total': self.total}
+            if self.error is not None:
+                status['error'] = self.error
+            if include_result and self.state == 'done':
+                status['result'] = self.result
+            return status
+
+    def follow(self, after=0, keepalive=15):
+        """Yield (sequence, event, data) past sequence after until the job finishes
+
+        Yields None whenever keepalive seconds pass without an event, so the
+        caller can keep an idle connection open.
+        """
+        while True:
+            with self._cond:
+                if len(self._events) <= after and self.state not in self.FINISHED:
+                    self._cond.wait(keepalive)
+                events = self._events[after:]
+                finished = self.state in self.FINISHED
+            if not events and not finished:
+                yield None
+            for event in events:
+                yield event
+            after += len(events)
+            if finished and after >= len(self._events):
+                return
+
+    def _start(self):
+        with self._cond:
+            self.state = 'running'
+            self._emit('state', {'state': 'running'})
+
+    def _finish(self, state, result=None, error=None):
+        with self._cond:
+            self.state = state
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            data = {'state': state}
+            if error is not None:
+                data['error'] = error
+            self._emit(state, data)
+
+    def _emit(self, event, data):
+        """Append an event and wake followers (condition held)"""
+        self._events.append((len(self._events) + 1, event, data))
+        self._cond.notify_all()
+
+
+class JobManager:
+    """Runs long requests as background jobs on a bounded thread pool
+
+    submit() returns at once with a Job; the work function is called as
+    fn(job, *args) and its return value becomes the job's result. Finished
+    jobs are kept for ttl seconds so clients can fetch results, then dropped
+    on the next submit. Jobs belong to the session that submitted them:
+    get() with a session_id finds only that session's jobs, and expire()
+    cancels and drops the jobs of ended sessions.
+    """
+
+    def __init__(self, max_workers=4, ttl=600):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='ergenix-jobs')
+
+    def submit(self, kind, fn, *args, session_id=None):
+        """Queue fn(job, *args) for a session and get its Job"""
+        self.expire()
+        job = Job(kind, session_id)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id, session_id=None):
+        """Get a job, or None; given a session_id, None unless the job is that session's"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (session_id is not None and job.session_id != session_id):
+            return None
+        return job
+
+    def cancel(self, job_id, session_id=None):
+        """Cancel a job; None if unknown or another session's, False if already finished"""
+        job = self.get(job_id, session_id)
+        return None if job is None else job.cancel()
+
+    def counts(self):
+        """Get the number of kept jobs in each state"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return counts
+
+    def expire(self, now=None, is_live=None):
+        """Drop jobs finished more than ttl seconds ago, and those of sessions is_live rejects
+
+        Jobs of ended sessions are cancelled as well, so their work stops.
+        """
+        now = now or time.time()
+        ended = []
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if is_live is not None and job.session_id is not None \
+                        and not is_live(job.session_id):
+                    ended.append(self._jobs.pop(job_id))
+                elif job.finished is not None and now - job.finished > self.ttl:
+                    del self._jobs[job_id]
+        for job in ended:
+            job.cancel()
+
+    def _run(self, job, fn, args):
+        if job.cancel_event.is_set():
+            job._finish('cancelled')
+            return
+        job._start()
+        try:
+            result = fn(job, *args)
+        except Exception as e:
+            # Work interrupted by a cancel fails with a driver error, not JobCancelled
+            if job.cancel_event.is_set():
+                job._finish('cancelled')
+            else:
+                job._finish('failed', error=str(e))
+            return
+        if job.cancel_event.is_set():
+            job._finish('cancelled')
+        else:
+            job._finish('done', result=result)
@@ -0,0 +1,458 @@
+import math
+import statistics
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LayoutEngine:
+    """Places table boxes using the foreign key graph
+
+    Algorithms:
+        grid    - size-aware grid in the given order (no graph needed)
+        layered - Sugiyama-style: tables in rows by FK depth, referenced tables
+                  above the tables that reference them, rows ordered by the
+                  barycenter heuristic; components are packed side by side
+        force   - force-directed refinement of the layered layout, with
+                  Barnes-Hut style aggregated repulsion in NumPy
+
+    Inputs are box sizes {name: (width, height)} and FK edges [(from, to)];
+    the result maps each name to the (left, top) corner of its box, y up.
+    Every algorithm sizes rows and gaps from the real boxes, so tables never
+    overlap and the canvas simply grows with the schema.
+
+    Given the previous layout, unchanged tables keep their coordinates and only
+    new or resized tables (and whatever they now overlap) are placed, so a
+    small edit to the selection costs time proportional to the edit.
+    """
+
+    ALGORITHMS = ('auto', 'grid', 'layered', 'force')
+    # Canvas area per unit of box area that the force layout is compacted to
+    DENSITY = 2.5
+    # Below this share of reusable boxes a fresh layout looks better
+    MIN_REUSE = 0.5
+
+    def __init__(self, gap=4.0):
+        self.gap = gap
+
+    def layout(self, sizes, edges, algorithm='auto', previous=None):
+        """Get {name: (left, top)} for every box in sizes
+
+        previous is an earlier result as {name: (left, top, width, height)};
+        when most of it still applies the layout is updated incrementally.
+        """
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"Unsupported layout algorithm: {algorithm}")
+        names = list(sizes)
+        if not names:
+            return {}
+        edges = [(a, b) for a, b in edges if a in sizes and b in sizes and a != b]
+
+        if previous:
+            positions = self._incremental(names, sizes, edges, previous)
+            if positions is not None:
+                return positions
+
+        if algorithm == 'auto':
+            algorithm = 'layered' if edges else 'grid'
+        if algorithm == 'grid':
+            return self._grid(names, sizes)
+        positions = self._layered(names, sizes, edges)
+        if algorithm == 'force':
+            positions = self._force(names, sizes, edges, positions)
+        return positions
+
+    # Incremental
+
+    def _incremental(self, names, sizes, edges, previous):
+        """Keep unchanged boxes in place and fit the rest around them, or None"""
+        kept, moved = {}, []
+        for name in names:
+            if name not in previous:
+                continue
+            left, top, width, height = previous[name]
+            if (width, height) == tuple(sizes[name]):
+                kept[name] = (left, top)
+            else:
+                moved.append(name)
+        if len(kept) < len(names) * self.MIN_REUSE:
+            return None
+
+        # Resized tables stay anchored at their old corner and push aside the
+        # unchanged tables they now cover; those are re-placed near their spot
+        for name in list(moved):
+            left, top = previous[name][:2]
+            width, height = sizes[name]
+            for other in list(kept):
+                o_left, o_top = kept[other]
+                o_width, o_height = sizes[other]
+                if (left < o_left + o_width + self.gap and o_left < left + width + self.gap
+                        and top - height < o_top + self.gap and o_top - o_height < top + self.gap):
+                    del kept[other]
+                    moved.append(other)
+
+        centers = {}
+        for name in moved:
+            left, top = previous[name][:2]
+            centers[name] = (left + sizes[name][0] / 2, top - sizes[name][1] / 2)
+
+        # New tables start next to the tables they reference or are referenced by
+        added = [name for name in names if name not in previous]
+        if added:
+            neighbors = {}
+            for a, b in edges:
+                neighbors.setdefault(a, []).append(b)
+                neighbors.setdefault(b, []).append(a)
+            placed = {name: (left + sizes[name][0] / 2, top - sizes[name][1] / 2)
+                      for name, (left, top) in kept.items()}
+            right = max([left + sizes[name][0] for name, (left, _) in kept.items()] or [0.0])
+            column_top = max([top for _, top in kept.values()] or [0.0])
+            for name in added:
+                anchors = [placed.get(other) or centers.get(other)
+                           for other in neighbors.get(name, ())]
+                anchors = [anchor for anchor in anchors if anchor is not None]
+                if anchors:
+                    centers[name] = (sum(x for x, _ in anchors) / len(anchors),
+                                     sum(y for _, y in anchors) / len(anchors))
+                else:
+                    # Unrelated tables go in a column to the right of the diagram
+                    width, height = sizes[name]
+                    centers[name] = (right + self.gap + width / 2, column_top - height / 2)
+                    column_top -= height + self.gap
+
+        positions = self.remove_overlaps(moved + added, sizes, centers, fixed=kept)
+        return {name: positions[name] for name in names}
+
+    # Grid
+
+    def _grid(self, names, sizes):
+        cols = int(math.ceil(math.sqrt(len(names))))
+        col_widths = [0.0] * cols
+        row_heights = [0.0] * int(math.ceil(len(names) / cols))
+        for i, name in enumerate(names):
+            width, height = sizes[name]
+            col_widths[i % cols] = max(col_widths[i % cols], width)
+            row_heights[i // cols] = max(row_heights[i // cols], height)
+
+        col_x = np.concatenate([[0.0], np.cumsum(np.array(col_widths) + self.gap)])
+        row_y = np.concatenate([[0.0], np.cumsum(np.array(row_heights) + self.gap)])
+        return {name: (float(col_x[i % cols]), -float(row_y[i // cols]))
+                for i, name in enumerate(names)}
+
+    # Layered (Sugiyama-style)
+
+    def _layered(self, names, sizes, edges):
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        graph.add_nodes_from(names)
+        graph.add_edges_from(edges)
+        order = {name: i for i, name in enumerate(names)}
+
+        blocks = []
+        components = sorted(nx.weakly_connected_components(graph),
+                            key=lambda comp: min(order[name] for name in comp))
+        for component in components:
+            subgraph = graph.subgraph(component)
+            layers = self._assign_layers(subgraph, order)
+            rows = self._order_layers(subgraph, layers)
+            blocks.append(self._place_rows(rows, sizes))
+        return self._pack_blocks(blocks)
+
+    def _assign_layers(self, graph, order):
+        """Referenced tables go to lower layers; FK cycles share a layer"""
+        import networkx as nx
+
+        condensed = nx.condensation(graph)
+        depth = {}
+        for scc in reversed(list(nx.topological_sort(condensed))):
+            parents = [depth[succ] for succ in condensed.successors(scc)]
+            depth[scc] = max(parents) + 1 if parents else 0
+
+        layers = {}
+        for scc, members in condensed.nodes(data='members'):
+            layers.setdefault(depth[scc], []).extend(members)
+        return [sorted(layers[level], key=order.get) for level in sorted(layers)]
+
+    def _order_layers(self, graph, layers, sweeps=4):
+        """Reduce crossings by reordering each layer at its neighbors' barycenter"""
+        undirected = graph.to_undirected(as_view=True)
+        position = {}
+        for layer in layers:
+            for i, name in enumerate(layer):
+                position[name] = i / max(len(layer) - 1, 1)
+        level = {name: i for i, layer in enumerate(layers) for name in layer}
+
+        for sweep in range(sweeps):
+            downward = sweep % 2 == 0
+            indices = range(1, len(layers)) if downward else range(len(layers) - 2, -1, -1)
+            for i in indices:
+                def barycenter(name):
+                    fixed = [position[other] for other in undirected.neighbors(name)
+                             if (level[other] < i) == downward and level[other] != i]
+                    return sum(fixed) / len(fixed) if fixed else position[name]
+                layers[i] = sorted(layers[i], key=barycenter)
+                for j, name in enumerate(layers[i]):
+                    position[name] = j / max(len(layers[i]) - 1, 1)
+        return layers
+
+    def _place_rows(self, layers, sizes):
+        """Lay each layer out as a centered row, wrapping very wide layers"""
+        area = sum(sizes[name][0] * sizes[name][1] for layer in layers for name in layer)
+        widest = max(sizes[name][0] for layer in layers for name in layer)
+        max_row_width = max(widest, math.sqrt(area) * 2.0)
+
+        rows = []
+        for layer in layers:
+            row, row_width = [], 0.0
+            for name in layer:
+                width = sizes[name][0]
+                if row and row_width + width > max_row_width:
+                    rows.append((row, row_width - self.gap))
+                    row, row_width = [], 0.0
+                row.append(name)
+                row_width += width + self.gap
+            rows.append((row, row_width - self.gap))
+
+        block_width = max(width for _, width in rows)
+        positions, top = {}, 0.0
+        for row, row_width in rows:
+            x = (block_width - row_width) / 2
+            for name in row:
+                positions[name] = (x, top)
+                x += sizes[name][0] + self.gap
+            top -= max(sizes[name][1] for name in row) + self.gap * 2
+        return positions, block_width, -top - self.gap * 2
+
+    def _pack_blocks(self, blocks):
+        """Shelf-pack component blocks, tallest first, into a roughly square canvas"""
+        area = sum(width * height for _, width, height in blocks)
+        max_width = max(max(width for _, width, _ in blocks), math.sqrt(area) * 1.3)
+
+        positions = {}
+        x = top = shelf_height = 0.0
+        for block, width, height in sorted(blocks, key=lambda b: -b[2]):
+            if x > 0 and x + width > max_width:
+                top -= shelf_height + self.gap * 2
+                x = shelf_height = 0.0
+            for name, (bx, by) in block.items():
+                positions[name] = (x + bx, top + by)
+            x += width + self.gap * 2
+            shelf_height = max(shelf_height, height)
+        return positions
+
+    # Force-directed with Barnes-Hut style repulsion
+
+    def _force(self, names, sizes, edges, initial, iterations=60):
+        n = len(names)
+        index = {name: i for i, name in enumerate(names)}
+        dims = np.array([sizes[name] for name in names], dtype=float)
+        radius = np.hypot(dims[:, 0], dims[:, 1]) / 2
+        # Work on box centers; the layered layout is a good, deterministic start
+        pos = np.array([[initial[name][0] + sizes[name][0] / 2,
+                         initial[name][1] - sizes[name][1] / 2] for name in names])
+        if n < 2:
+            return initial
+
+        src = np.array([index[a] for a, _ in edges], dtype=int)
+        dst = np.array([index[b] for _, b in edges], dtype=int)
+        ideal = radius.mean() * 2 + self.gap
+        temperature = ideal * 2
+        cooling = 0.05 ** (1 / iterations)
+        gravity = 0.05
+
+        for _ in range(iterations):
+            disp = self._repulsion(pos, radius)
+            if len(src):
+                delta = pos[src] - pos[dst]
+                dist = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-6)
+                pull = delta * (dist / ideal)[:, None]
+                np.add.at(disp, src, -pull)
+                np.add.at(disp, dst, pull)
+            # Gravity keeps disconnected components from drifting apart
+            disp -= (pos - pos.mean(axis=0)) * (gravity * np.sqrt(n))
+            length = np.maximum(np.hypot(disp[:, 0], disp[:, 1]), 1e-9)
+            pos += disp / length[:, None] * np.minimum(length, temperature)[:, None]
+            temperature *= cooling
+
+        # Repulsion spreads sparse graphs further than needed; pull the whole
+        # picture in to a comfortable density before resolving overlaps (a
+        # typical box pads the extent; the largest would let one huge table
+        # squeeze everything else together)
+        extent = np.ptp(pos, axis=0) + np.median(dims, axis=0)
+        footprint = ((dims[:, 0] + self.gap) * (dims[:, 1] + self.gap)).sum()
+        scale = math.sqrt(footprint * self.DENSITY / max(extent[0] * extent[1], 1e-9))
+        if scale < 1:
+            pos = (pos - pos.mean(axis=0)) * scale
+
+        # Strongly connected tables claim their spot first
+        degree = np.bincount(np.concatenate([src, dst]), minlength=n) if len(src) else np.zeros(n)
+        placement = [names[i] for i in np.argsort(-degree, kind='stable')]
+        centers = {name: pos[index[name]] for name in names}
+        return self.remove_overlaps(placement, sizes, centers)
+
+    def _repulsion(self, pos, radius, leaf_size=4):
+        """Size-aware repulsion on every box, O(n log n) via a quadtree of cells
+
+        Far cells act through their aggregates (count, sum of radii, sum of
+        squared radii, centroid), which expand the per-pair force
+        (r_i + r_j + gap)^2 / d exactly for members at the centroid. Cells are
+        handled level by level with the classic interaction list (children of
+        the parent's neighbors that are not our own neighbors); the 3x3
+        neighborhood at the finest level is computed pair by pair.
+        """
+        n = len(pos)
+        disp = np.zeros_like(pos)
+        lo = pos.min(axis=0)
+        span = max(float((pos.max(axis=0) - lo).max()), 1e-6) * 1.0001
+        unit = (pos - lo) / span
+        reach = radius + self.gap
+        depth = max(2, int(math.ceil(math.log(max(n / leaf_size, 1), 4))))
+
+        # Children of the parent's 3x3 neighbors, relative to 2 * parent
+        far = np.array([(ox, oy) for ox in range(-2, 4) for oy in range(-2, 4)])
+        for level in range(2, depth + 1):
+            size = 2 ** level
+            cell = np.minimum((unit * size).astype(int), size - 1)
+            cell_id = cell[:, 0] * size + cell[:, 1]
+            count = np.bincount(cell_id, minlength=size * size)
+            sum_x = np.bincount(cell_id, pos[:, 0], minlength=size * size)
+            sum_y = np.bincount(cell_id, pos[:, 1], minlength=size * size)
+            sum_r = np.bincount(cell_id, radius, minlength=size * size)
+            sum_r2 = np.bincount(cell_id, radius ** 2, minlength=size * size)
+
+            cx = (cell[:, 0] // 2 * 2)[:, None] + far[:, 0]
+            cy = (cell[:, 1] // 2 * 2)[:, None] + far[:, 1]
+            valid = ((cx >= 0) & (cx < size) & (cy >= 0) & (cy < size)
+                     & ((np.abs(cx - cell[:, :1]) > 1) | (np.abs(cy - cell[:, 1:]) > 1)))
+            other = np.where(valid, cx * size + cy, 0)
+            members = count[other] * valid
+            safe = np.maximum(members, 1)
+            dx = pos[:, :1] - sum_x[other] / safe
+            dy = pos[:, 1:] - sum_y[other] / safe
+            dist2 = np.maximum(dx * dx + dy * dy, 1e-12)
+            weight = (members * reach[:, None] ** 2 + 2 * reach[:, None] * sum_r[other] * valid
+                      + sum_r2[other] * valid) / dist2
+            disp[:, 0] += (dx * weight).sum(axis=1)
+            disp[:, 1] += (dy * weight).sum(axis=1)
+
+        # Near field: exact pairs within the finest 3x3 neighborhood
+        size = 2 ** depth
+        cell = np.minimum((unit * size).astype(int), size - 1)
+        cell_id = cell[:, 0] * size + cell[:, 1]
+        by_cell = np.argsort(cell_id, kind='stable')
+        count = np.bincount(cell_id, minlength=size * size)
+        start = np.concatenate([[0], np.cumsum(count)[:-1]])
+        rank = np.arange(n) - start[cell_id[by_cell]]
+        members = np.full((size * size, count.max()), -1, dtype=int)
+        members[cell_id[by_cell], rank] = by_cell
+
+        near = np.array([(ox, oy) for ox in (-1, 0, 1) for oy in (-1, 0, 1)])
+        cx = cell[:, :1] + near[:, 0]
+        cy = cell[:, 1:] + near[:, 1]
+        valid = (cx >= 0) & (cx < size) & (cy >= 0) & (cy < size)
+        others = members[np.where(valid, cx * size + cy, 0)].reshape(n, -1)
+        mask = (others >= 0) & np.repeat(valid, members.shape[1], axis=1)
+        mask &= others != np.arange(n)[:, None]
+        others = np.where(mask, others, 0)
+        dx = pos[:, :1] - pos[others, 0]
+        dy = pos[:, 1:] - pos[others, 1]
+        dist2 = np.maximum(dx * dx + dy * dy, 1e-12)
+        weight = (reach[:, None] + radius[others]) ** 2 * mask / dist2
+        disp[:, 0] += (dx * weight).sum(axis=1)
+        disp[:, 1] += (dy * weight).sum(axis=1)
+        return disp
+
+    def remove_overlaps(self, order, sizes, centers, fixed=None):
+        """Place boxes at (or spiral out from) their wanted centers without overlap
+
+        Boxes are placed in the given order and checked against the already
+        placed ones through a coarse spatial hash; boxes in fixed
+        (name -> (left, top)) are reserved first and never move. Returns
+        {name: (left, top)} for the boxes in order and in fixed.
+        """
+        fixed = fixed or {}
+        # Buckets fit a typical box; bigger ones are entered in every bucket
+        # they cover, so one huge table does not make every bucket huge
+        all_sizes = [max(sizes[name]) for name in list(order) + list(fixed)]
+        bucket = max(statistics.median(all_sizes), self.gap) if all_sizes else 1.0
+        buckets = {}
+        positions = {}
+        gap = self.gap
+
+        def keys(left, top, width, height):
+            x0, x1 = int(math.floor(left / bucket)), int(math.floor((left + width) / bucket))
+            y0, y1 = int(math.floor((top - height) / bucket)), int(math.floor(top / bucket))
+            return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+        def free(left, top, width, height):
+            # Neighbours within gap may sit in the next bucket over
+            for key in keys(left - gap, top + gap, width + gap * 2, height + gap * 2):
+                for ol, ot, ow, oh in buckets.get(key, ()):
+                    if (left < ol + ow + gap and ol < left + width + gap
+                            and top - height < ot + gap and ot - oh < top + gap):
+                        return False
+            return True
+
+        def occupy(left, top, width, height):
+            box = (left, top, width, height)
+            for key in keys(left, top, width, height):
+                buckets.setdefault(key, []).append(box)
+
+        for name, (left, top) in fixed.items():
+            occupy(left, top, *sizes[name])
+            positions[name] = (left, top)
+
+        for name in order:
+            width, height = sizes[name]
+            cx, cy = centers[name]
+            step = max(min(width, height), gap)
+            ring = 0
+            while name not in positions:
+                if ring == 0:
+                    candidates = [(0, 0)]
+                else:
+                    candidates = ([(dx, -ring) for dx in range(-ring, ring + 1)]
+                                  + [(dx, ring) for dx in range(-ring, ring + 1)]
+                                  + [(-ring, dy) for dy in range(-ring + 1, ring)]
+                                  + [(ring, dy) for dy in range(-ring + 1, ring)])
+                    candidates.sort(key=lambda c: c[0] ** 2 + c[1] ** 2)
+                for dx, dy in candidates:
+                    left = cx - width / 2 + dx * step
+                    top = cy + height / 2 + dy * step
+                    if free(left, top, width, height):
+                        occupy(left, top, width, height)
+                        positions[name] = (float(left), float(top))
+                        break
+                ring += 1
+        return positions
+
+
+class LayoutStore:
+    """Remembers the last layout of each (connection, database) diagram
+
+    Entries hold the algorithm and the boxes {name: {'x', 'y', 'width',
+    'height'}} as drawn, and are evicted least-recently-used beyond max_entries.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conn_id, database, algorithm):
+        """Get the last layout drawn with this algorithm, or None"""
+        with self._lock:
+            entry = self._entries.get((conn_id, database))
+            if entry is None or entry[0] != algorithm:
+                return None
+            self._entries.move_to_end((conn_id, database))
+            return entry[1]
+
+    def put(self, conn_id, database, algorithm, layout):
+        with self._lock:
+            self._entries[(conn_id, database)] = (algorithm, layout)
+            self._entries.move_to_end((conn_id, database))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
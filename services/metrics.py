@@ -0,0 +1,301 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets, in seconds and in bytes
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense, one series per label set"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, le=bound)}'
+                             f' {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, le="+Inf")}'
+                         f' {values[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labelvalues)} {values[-2]:.6g}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labelvalues)} {values[-1]}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label set"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._series[labelvalues] = self._series.get(labelvalues, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            series = dict(self._series)
+        for labelvalues, value in sorted(series.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {value}')
+        return lines
+
+
+class Gauge:
+    """Value read when metrics are scraped
+
+    read() returns a number, or {label values tuple: number} with labelnames.
+    """
+
+    def __init__(self, name, documentation, read, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {value}')
+        return lines
+
+
+class Registry:
+    """Metrics exposed together on one scrape endpoint"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def expose(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.expose())
+            except Exception:
+                pass  # A failing gauge must not hide the other metrics
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+STAGE_SECONDS = registry.register(Histogram(
+    'ergenix_stage_seconds', 'Time spent per processing stage', ('stage',)))
+QUERIES = registry.register(Counter(
+    'ergenix_db_queries_total', 'Statements executed per DatabaseManager method', ('method',)))
+PAYLOAD_BYTES = registry.register(Histogram(
+    'ergenix_payload_bytes', 'Size of rendered images and other payloads', ('kind',),
+    BYTES_BUCKETS))
+REQUEST_SECONDS = registry.register(Histogram(
+    'ergenix_request_seconds', 'Request handling time', ('endpoint', 'status')))
+RESPONSE_BYTES = registry.register(Histogram(
+    'ergenix_response_bytes', 'Response body size', ('endpoint',), BYTES_BUCKETS))
+
+
+class Timings:
+    """Stage durations, query counts and payload sizes of one request (or render)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}   # name -> [seconds, calls]
+        self.queries = {}  # stage name -> statements
+        self.sizes = {}    # kind -> bytes
+
+    def add(self, name, seconds):
+        entry = self.stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def server_timing(self):
+        """Value of a Server-Timing header, durations in milliseconds"""
+        parts = []
+        for name, (seconds, calls) in self.stages.items():
+            part = f'{name};dur={seconds * 1000:.1f}'
+            notes = [f'{calls} calls'] if calls > 1 else []
+            if self.queries.get(name):
+                count = self.queries[name]
+                notes.append(f"{count} {'query' if count == 1 else 'queries'}")
+            if notes:
+                part += ';desc="' + ', '.join(notes) + '"'
+            parts.append(part)
+        for kind, size in self.sizes.items():
+            parts.append(f'{kind}-bytes;desc="{size}"')
+        parts.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(parts)
+
+
+# Timings of the request (or worker render) running in this context, if any;
+# job threads have none and only feed the histograms
+_current = contextvars.ContextVar('ergenix_timings', default=None)
+
+
+def begin():
+    """Start collecting timings for the current request and get them"""
+    timings = Timings()
+    _current.set(timings)
+    return timings
+
+
+def current():
+    return _current.get()
+
+
+def record(name, seconds):
+    """Record a stage duration in the histogram and the current timings"""
+    STAGE_SECONDS.observe(seconds, name)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as a stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def payload(kind, size):
+    """Record the size of a produced payload (e.g. 'png')"""
+    PAYLOAD_BYTES.observe(size, kind)
+    timings = _current.get()
+    if timings is not None:
+        timings.sizes[kind] = timings.sizes.get(kind, 0) + size
+
+
+def merge(stages, sizes):
+    """Record stages and sizes reported from elsewhere (e.g. a render worker)"""
+    for name, seconds in stages:
+        record(name, seconds)
+    for kind, size in sizes.items():
+        payload(kind, size)
+
+
+@contextmanager
+def collect():
+    """Collect the enclosed block's timings apart from any current ones
+
+    Yields Timings; used in render workers, whose stages are sent back with
+    the result and merged into the requesting process.
+    """
+    token = _current.set(Timings())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def instrument_database(db_manager, methods):
+    """Time and count the statements of DatabaseManager methods
+
+    Wraps the instance's methods so each outermost call is a 'db.<method>'
+    stage and every cursor.execute() inside it (including nested
+    DatabaseManager calls) is counted for that method.
+    """
+    for method in methods:
+        setattr(db_manager, method, _instrumented(getattr(db_manager, method), method))
+
+
+def _instrumented(fn, method):
+    name = f'db.{method}'
+
+    @functools.wraps(fn)
+    def wrapper(conn, *args, **kwargs):
+        if isinstance(conn, _CountingConnection):
+            return fn(conn, *args, **kwargs)
+        counted = _CountingConnection(conn)
+        started = time.perf_counter()
+        try:
+            return fn(counted, *args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - started)
+            QUERIES.inc(counted.statements, method)
+            timings = _current.get()
+            if timings is not None:
+                timings.queries[name] = timings.queries.get(name, 0) + counted.statements
+    return wrapper
+
+
+class _CountingConnection:
+    """Forwards to a DB-API connection, counting statements run on its cursors"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.statements = 0
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self, self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _CountingCursor:
+    def __init__(self, counted, cursor):
+        self._counted = counted
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        self._counted.statements += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class RenderCache:
+    """Two-tier cache for rendered artifacts, keyed by content hash
+
+    The memory tier is an LRU bounded by total bytes. The optional disk tier
+    keeps one file per key under disk_dir and evicts the least recently used
+    files once disk_bytes is exceeded. Keys come from make_key, a SHA-256 over
+    the canonical JSON of everything that determines the output, so they double
+    as strong ETags.
+    """
+
+    def __init__(self, memory_bytes=64 * 1024 * 1024, disk_dir=None,
+                 disk_bytes=512 * 1024 * 1024):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> size, least recently used first
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(*parts):
+        """Stable hash of JSON-serializable render inputs"""
+        payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Get cached bytes from memory, then disk (promoting hits), or None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+
+        if not on_disk:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._disk_size -= self._disk.pop(key, 0)
+            return None
+        with self._lock:
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """Store bytes in both tiers"""
+        with self._lock:
+            self._remember(key, data)
+        if not self.disk_dir or len(data) > self.disk_bytes:
+            return
+
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        evicted = []
+        with self._lock:
+            self._disk_size += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Get entry counts and bytes held per tier"""
+        with self._lock:
+            return {'memory_entries': len(self._memory), 'memory_bytes': self._memory_size,
+                    'disk_entries': len(self._disk), 'disk_bytes': self._disk_size}
+
+    def _remember(self, key, data):
+        """Insert into the memory LRU (lock held)"""
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU from files left by a previous run, oldest first"""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            if name.endswith('.tmp'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_size += size
@@ -0,0 +1,252 @@
+import io
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from services import metrics
+
+
+class RenderPoolSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Renderer is busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderTooLarge(Exception):
+    """Raised when a render would need more memory than its budget allows"""
+
+    def __init__(self, needed_bytes, budget_bytes, what='Diagram',
+                 advice='request SVG or tiles instead'):
+        super().__init__(f"{what} needs about {needed_bytes // 2 ** 20} MB to render, over the "
+                         f"{budget_bytes // 2 ** 20} MB limit; {advice}")
+        self.needed_bytes = needed_bytes
+        self.budget_bytes = budget_bytes
+
+
+class RenderPool:
+    """Renders figures in a pool of worker processes
+
+    Each worker process has its own matplotlib state, so figures render in
+    parallel instead of queueing behind one lock. Only plain table,
+    relationship and statistics dicts go to a worker; PNG bytes come back,
+    along with the worker's stage timings for the caller's metrics.
+
+    At most max_workers + max_queue renders may be in flight. Beyond that a
+    render fails fast with RenderPoolSaturated, so the caller can answer 503
+    with a Retry-After estimate.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None, render_timeout=120):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = self.max_workers * 2 if max_queue is None else max_queue
+        self.render_timeout = render_timeout
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._in_flight = 0
+        self._avg_seconds = 2.0  # Moving average of render time, for Retry-After
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def render_diagram(self, tables_data, relationships, dpi=300, layout='auto', table_layout=None,
+                       cancel_event=None, routes=None):
+        """Render an ER diagram to PNG bytes in a worker process"""
+        return self._submit(render_diagram_png, tables_data, relationships, dpi, layout,
+                            table_layout, routes, cancel_event=cancel_event)
+
+    def render_patch(self, base, tables_data, table_layout, relationships, routes, regions,
+                     dpi=300, cancel_event=None):
+        """Redraw regions of a rendered diagram's PNG bytes in a worker process"""
+        return self._submit(render_patch_png, base, tables_data, table_layout, relationships,
+                            routes, regions, dpi, cancel_event=cancel_event)
+
+    def render_tile(self, tile, dpi=100):
+        """Render one diagram tile (TileSet.contents) to PNG bytes in a worker process"""
+        return self._submit(render_tile_png, tile, dpi)
+
+    def render_statistics(self, statistics, dpi=300, cancel_event=None):
+        """Render the statistics charts to PNG bytes in a worker process"""
+        return self._submit(render_statistics_png, statistics, dpi, cancel_event=cancel_event)
+
+    def stats(self):
+        """Get pool sizing and load counters"""
+        with self._lock:
+            return {'workers': self.max_workers, 'max_queue': self.max_queue,
+                    'in_flight': self._in_flight,
+                    'queued': max(0, self._in_flight - self.max_workers)}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args, cancel_event=None):
+        """Run fn in a worker and wait for it; setting cancel_event stops the wait
+
+        A render already running in a worker cannot be interrupted, but a
+        cancelled caller no longer waits for it and a queued one never starts.
+        The render's slot is only freed once the worker is done with it, so a
+        caller that times out or is cancelled cannot let more renders in than
+        there are slots.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise RenderPoolSaturated(self._retry_after())
+        with self._lock:
+            self._in_flight += 1
+        started = time.time()
+        future = None
+        try:
+            future = self._get_executor().submit(_measured, fn, started, *args)
+            future.add_done_callback(self._release)
+            if cancel_event is None:
+                try:
+                    result = future.result(timeout=self.render_timeout)
+                except FutureTimeoutError:
+                    future.cancel()
+                    raise TimeoutError("Render timed out")
+            else:
+                deadline = started + self.render_timeout
+                while not future.done():
+                    if cancel_event.is_set():
+                        future.cancel()
+                        raise Exception("Render cancelled")
+                    if time.time() > deadline:
+                        future.cancel()
+                        raise TimeoutError("Render timed out")
+                    wait([future], timeout=0.2)
+                result = future.result()
+            result, stages, sizes = result
+            metrics.merge(stages, sizes)
+            elapsed = time.time() - started
+            with self._lock:
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            with self._lock:
+                self._executor = None
+            raise Exception("Render worker crashed; please retry")
+        finally:
+            if future is None:
+                # Never reached a worker
+                self._release()
+
+    def _release(self, future=None):
+        """Free a render's slot (also the done callback of its future)"""
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a threaded server process
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _retry_after(self):
+        """Seconds until a slot is likely free, from queue depth and render time"""
+        with self._lock:
+            waves = self._in_flight / self.max_workers
+            return max(1, math.ceil(self._avg_seconds * waves))
+
+
+# Worker-side entry points; generators are created once per worker process
+_generators = {}
+
+
+def _measured(fn, submitted, *args):
+    """Run fn in a worker and get (result, [(stage, seconds)], {kind: bytes})"""
+    with metrics.collect() as timings:
+        metrics.record('render.wait', time.time() - submitted)
+        result = fn(*args)
+    return result, [(name, seconds) for name, (seconds, _) in timings.stages.items()], timings.sizes
+
+
+def render_diagram_png(tables_data, relationships, dpi=300, layout='auto', table_layout=None,
+                       routes=None):
+    """Draw an ER diagram and encode it as PNG (runs inside a worker)"""
+    import matplotlib.pyplot as plt
+
+    from services.erservice import ERDiagramGenerator
+
+    if 'diagram' not in _generators:
+        _generators['diagram'] = ERDiagramGenerator()
+    generator = _generators['diagram']
+    with metrics.stage('render.draw'):
+        fig = generator.generate_diagram(tables_data, relationships, layout, table_layout, routes)
+    # The diagram axes already fill the figure; skipping the tight bbox pass
+    # avoids laying out every label twice
+    return _to_png(plt, fig, dpi, tight=False)
+
+
+def render_patch_png(base, tables_data, table_layout, relationships, routes, regions, dpi=300):
+    """Redraw regions of a diagram PNG and re-encode it (runs inside a worker)"""
+    import matplotlib.pyplot as plt
+    from PIL import Image
+
+    from services.erservice import ERDiagramGenerator
+
+    if 'diagram' not in _generators:
+        _generators['diagram'] = ERDiagramGenerator()
+    generator = _generators['diagram']
+    with Image.open(io.BytesIO(base)) as image:
+        image.load()
+        for region in regions:
+            with metrics.stage('render.draw'):
+                fig, offset = generator.generate_patch(tables_data, table_layout, relationships,
+                                                       routes, region, image.size, dpi)
+            with Image.open(io.BytesIO(_to_png(plt, fig, dpi, tight=False))) as patch:
+                image.paste(patch.convert(image.mode), offset)
+        buffer = io.BytesIO()
+        with metrics.stage('render.encode'):
+            image.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+
+def render_tile_png(tile, dpi=100):
+    """Draw one diagram tile and encode it as PNG (runs inside a worker)"""
+    import matplotlib.pyplot as plt
+
+    from services.erservice import ERDiagramGenerator
+
+    if 'diagram' not in _generators:
+        _generators['diagram'] = ERDiagramGenerator()
+    with metrics.stage('render.draw'):
+        fig = _generators['diagram'].generate_tile(dpi=dpi, **tile)
+    # The tile must come out exactly tile_size pixels square
+    return _to_png(plt, fig, dpi, tight=False)
+
+
+def render_statistics_png(statistics, dpi=300):
+    """Draw the statistics charts and encode them as PNG (runs inside a worker)"""
+    import matplotlib.pyplot as plt
+
+    from services.statsservice import StatisticsChartGenerator
+
+    if 'statistics' not in _generators:
+        _generators['statistics'] = StatisticsChartGenerator()
+    generator = _generators['statistics']
+    with metrics.stage('render.draw'):
+        fig = generator.generate_chart(statistics)
+    return _to_png(plt, fig, dpi)
+
+
+def _to_png(plt, fig, dpi, tight=True):
+    buffer = io.BytesIO()
+    try:
+        with metrics.stage('render.savefig'):
+            fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight' if tight else None)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+        buffer.close()
@@ -0,0 +1,554 @@
+import heapq
+import math
+
+import numpy as np
+
+
+class SpatialGrid:
+    """Uniform grid of buckets over table rectangles
+
+    Rectangles are (left, bottom, right, top). A query only visits the buckets
+    a segment or box covers, so checking a route costs time proportional to
+    its length rather than to the number of tables.
+    """
+
+    def __init__(self, rects, bucket=None):
+        self.rects = rects
+        sizes = [max(r[2] - r[0], r[3] - r[1]) for r in rects]
+        self.bucket = bucket or max(sum(sizes) / len(sizes) if sizes else 1.0, 1.0)
+        self._buckets = {}
+        for i, rect in enumerate(rects):
+            for key in self._keys(*rect):
+                self._buckets.setdefault(key, []).append(i)
+
+    def _keys(self, left, bottom, right, top):
+        x0, x1 = int(math.floor(left / self.bucket)), int(math.floor(right / self.bucket))
+        y0, y1 = int(math.floor(bottom / self.bucket)), int(math.floor(top / self.bucket))
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def cells(self, left, bottom, right, top, pad=0):
+        """Keys of the buckets a box covers, grown by pad buckets on every side"""
+        grow = pad * self.bucket
+        return set(self._keys(left - grow, bottom - grow, right + grow, top + grow))
+
+    def members(self, cells):
+        """Indices of rectangles that overlap any of the buckets"""
+        found = set()
+        for key in cells:
+            found.update(self._buckets.get(key, ()))
+        return found
+
+    def hits(self, left, bottom, right, top, margin=0.0):
+        """Whether any rectangle intersects the box grown by margin; stops at the first"""
+        for key in self._keys(left - margin, bottom - margin, right + margin, top + margin):
+            for i in self._buckets.get(key, ()):
+                r_left, r_bottom, r_right, r_top = self.rects[i]
+                if (left - margin < r_right and r_left < right + margin
+                        and bottom - margin < r_top and r_bottom < top + margin):
+                    return True
+        return False
+
+    def query(self, left, bottom, right, top, margin=0.0):
+        """Indices of rectangles that intersect the box grown by margin"""
+        found = set()
+        for key in self._keys(left - margin, bottom - margin, right + margin, top + margin):
+            for i in self._buckets.get(key, ()):
+                if i in found:
+                    continue
+                r_left, r_bottom, r_right, r_top = self.rects[i]
+                if (left - margin < r_right and r_left < right + margin
+                        and bottom - margin < r_top and r_bottom < top + margin):
+                    found.add(i)
+        return found
+
+
+class _Budget:
+    """A* work left for one EdgeRouter.route call, in node expansions"""
+
+    def __init__(self, left):
+        self.left = left
+
+
+class RoutePlan:
+    """Where the routes of a set of edges start and end, before any is routed
+
+    Made by EdgeRouter.plan: edges bundled by unordered table pair, the
+    sides and ports of every bundle, and a SpatialGrid of the tables. Ports
+    depend on every bundle meeting a side, so they are placed for all edges
+    at once; the bundles can then be routed one at a time, in any order.
+    """
+
+    def __init__(self, edges, boxes, grid, bundles, sides, ports):
+        self.edges = edges
+        self.boxes = boxes
+        self.grid = grid
+        self.bundles = bundles  # (a, b) sorted -> [edge index]
+        self.sides = sides      # (a, b) -> (side of a, side of b)
+        self.ports = ports      # ((a, b), name) -> (x, y)
+        self.largest = max((max(r[2] - r[0], r[3] - r[1]) for r in grid.rects), default=0.0)
+
+    def ends(self, pair):
+        """Ports of a bundle on its first and second table"""
+        return self.ports[(pair, pair[0])], self.ports[(pair, pair[1])]
+
+
+class EdgeRouter:
+    """Routes relationships as orthogonal polylines around table boxes
+
+    For every table pair the router picks a side of each table, leaves it
+    through a short stub, and tries the cheap shapes first (L, Z and U routes
+    through channels next to whatever blocks the direct ones); only when all
+    of those hit a table does it fall back to A* over the channels between
+    the tables nearby. Obstacle checks go through a SpatialGrid and only look
+    at a corridor along the route, so its cost depends on the tables the route
+    passes, not on the whole diagram.
+
+    A* is held to a budget of search_budget node expansions per bundle,
+    shared by the whole diagram; a bucket of a search's corridor costs one
+    expansion too, for building the grid. Shorter routes are routed first,
+    and once the budget is spent the rest take the candidate shape that
+    touches the fewest tables. A single route's cost grows with its length,
+    which grows with the diagram, so only a shared budget keeps total routing
+    time close to linear in the number of relationships.
+
+    Several FKs between the same two tables share one route and are drawn as
+    parallel lanes. The routes meeting one side of a table get their own
+    evenly spread ports.
+    """
+
+    def __init__(self, clearance=1.0, stub=1.5, lane=0.6, bend_cost=4.0, greed=1.5,
+                 max_channels=12, max_expansions=20000, corridors=(1, 3), search_budget=200):
+        self.clearance = clearance
+        self.stub = stub
+        self.lane = lane
+        self.bend_cost = bend_cost
+        self.greed = greed
+        self.max_channels = max_channels
+        self.max_expansions = max_expansions
+        self.corridors = corridors
+        self.search_budget = search_budget
+
+    def route(self, edges, boxes, fixed=None):
+        """Get a list of polylines [(x, y), ...] for edges [(from, to)], None if unplaced
+
+        boxes maps a table name to (left, bottom, right, top). Each polyline
+        starts on the border of the "from" table and ends on the "to" table.
+        fixed maps edge indexes to polylines to keep; a bundle whose edges are
+        all fixed is not routed again.
+        """
+        fixed = fixed or {}
+        plan = self.plan(edges, boxes)
+        routes = [None] * len(edges)
+        budget = _Budget(self.search_budget * len(plan.bundles))
+        # Short routes first: they are most of a diagram and cheap to search
+        order = sorted(plan.bundles, key=lambda pair: self._distance(*plan.ends(pair)))
+        for pair in order:
+            members = plan.bundles[pair]
+            if all(i in fixed for i in members):
+                for i in members:
+                    routes[i] = fixed[i]
+                continue
+            for i, lane in self.route_bundle(plan, pair, budget).items():
+                routes[i] = lane
+        return routes
+
+    def plan(self, edges, boxes):
+        """Get the RoutePlan of edges [(from, to)] between boxes {name: (l, b, r, t)}"""
+        # Bundle edges by unordered table pair
+        bundles = {}
+        for i, (a, b) in enumerate(edges):
+            if a in boxes and b in boxes and a != b:
+                bundles.setdefault(tuple(sorted((a, b))), []).append(i)
+
+        # Pick a side of each table for every bundle, then spread the ports on each side
+        sides = {}
+        by_side = {}
+        for pair in bundles:
+            a, b = pair
+            side_a, side_b = self._sides(boxes[a], boxes[b])
+            sides[pair] = (side_a, side_b)
+            by_side.setdefault((a, side_a), []).append((pair, b))
+            by_side.setdefault((b, side_b), []).append((pair, a))
+        ports = {}
+        for (name, side), members in by_side.items():
+            left, bottom, right, top = boxes[name]
+            horizontal = side in ('top', 'bottom')
+            # Order ports by where the other table is, which avoids crossings at the side
+            members.sort(key=lambda m: self._center(boxes[m[1]])[0 if horizontal else 1])
+            low, high = (left, right) if horizontal else (bottom, top)
+            for k, (pair, _) in enumerate(members):
+                along = low + (high - low) * (k + 1) / (len(members) + 1)
+                if horizontal:
+                    ports[(pair, name)] = (along, top if side == 'top' else bottom)
+                else:
+                    ports[(pair, name)] = (right if side == 'right' else left, along)
+        return RoutePlan(edges, boxes, SpatialGrid(list(boxes.values())), bundles, sides, ports)
+
+    def route_bundle(self, plan, pair, budget=None):
+        """Get {edge index: polyline} for the bundle of a table pair in a plan
+
+        Searches take their expansions from budget; by default the bundle
+        gets search_budget of its own, so its routes do not depend on which
+        other bundles were routed before.
+        """
+        if budget is None:
+            budget = _Budget(self.search_budget)
+        port_a, port_b = plan.ends(pair)
+        path = self._route_pair(plan.grid, port_a, port_b, *plan.sides[pair], budget)
+        return self._lanes(plan, pair, path)
+
+    def sketch_bundle(self, plan, pair):
+        """Get {edge index: polyline} for a bundle drawn as a plain elbow, ignoring other tables"""
+        port_a, port_b = plan.ends(pair)
+        side_a, side_b = plan.sides[pair]
+        start, end = self._stub(port_a, side_a), self._stub(port_b, side_b)
+        if side_a in ('left', 'right'):
+            middle = (start[0] + end[0]) / 2
+            elbow = [(middle, start[1]), (middle, end[1])]
+        else:
+            middle = (start[1] + end[1]) / 2
+            elbow = [(start[0], middle), (end[0], middle)]
+        return self._lanes(plan, pair, self._simplify([port_a, start] + elbow + [end, port_b]))
+
+    def reach(self, plan, pair):
+        """(left, bottom, right, top) that every route of a bundle stays within
+
+        Searches keep to corridor buckets around the box of the two stubs,
+        and the simple shapes run beside tables that overlap that box.
+        """
+        (sx, sy), (tx, ty) = (self._stub(port, side)
+                              for port, side in zip(plan.ends(pair), plan.sides[pair]))
+        grow = ((max(self.corridors, default=0) + 1) * plan.grid.bucket + plan.largest
+                + 2 * self.clearance)
+        return min(sx, tx) - grow, min(sy, ty) - grow, max(sx, tx) + grow, max(sy, ty) + grow
+
+    def _lanes(self, plan, pair, path):
+        """Parallel FKs become lanes around the shared route of their bundle"""
+        a, b = pair
+        members = plan.bundles[pair]
+        width = self._side_length(plan.boxes[a], plan.sides[pair][0])
+        width = min(width, self._side_length(plan.boxes[b], plan.sides[pair][1]))
+        step = min(self.lane, width / (len(members) + 1))
+        lanes = {}
+        for k, i in enumerate(members):
+            lane = self._offset(path, (k - (len(members) - 1) / 2) * step)
+            lanes[i] = lane if plan.edges[i][0] == a else lane[::-1]
+        return lanes
+
+    # Sides and ports
+
+    @staticmethod
+    def _center(box):
+        return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+
+    def _sides(self, box_a, box_b):
+        """Facing sides of two boxes, by the dominant direction between them"""
+        (ax, ay), (bx, by) = self._center(box_a), self._center(box_b)
+        # Compare gaps rather than center distances so tall/wide boxes pick sensibly
+        gap_x = max(box_b[0] - box_a[2], box_a[0] - box_b[2])
+        gap_y = max(box_b[1] - box_a[3], box_a[1] - box_b[3])
+        if gap_x > gap_y:
+            return ('right', 'left') if bx > ax else ('left', 'right')
+        return ('top', 'bottom') if by > ay else ('bottom', 'top')
+
+    @staticmethod
+    def _distance(p, q):
+        return abs(p[0] - q[0]) + abs(p[1] - q[1])
+
+    @staticmethod
+    def _side_length(box, side):
+        return box[2] - box[0] if side in ('top', 'bottom') else box[3] - box[1]
+
+    def _stub(self, port, side):
+        dx, dy = {'left': (-1, 0), 'right': (1, 0), 'bottom': (0, -1), 'top': (0, 1)}[side]
+        return port[0] + dx * self.stub, port[1] + dy * self.stub
+
+    # Routing
+
+    def _route_pair(self, grid, port_a, port_b, side_a, side_b, budget=None):
+        start, end = self._stub(port_a, side_a), self._stub(port_b, side_b)
+        # Stubs sit outside the clearance of their own table, so every table counts
+        margin = min(self.clearance, self.stub * 0.9)
+
+        # Cheapest shape first; only the first clear one is needed
+        candidates = sorted(([start] + middle + [end]
+                             for middle in self._candidates(grid, start, end, margin)),
+                            key=self._cost)
+        best = None
+        for points in candidates:
+            if self._clear(grid, points, margin):
+                best = points
+                break
+        if best is None and (budget is None or budget.left > 0):
+            best = self._search(grid, start, end, margin, budget)
+        if best is None:
+            # Boxed in or out of budget: the shape crossing the fewest tables
+            best = min(candidates, key=lambda points: len(self._touching(grid, points, margin)))
+        return self._simplify([port_a] + best + [port_b])
+
+    def _candidates(self, grid, start, end, margin):
+        """Middle points of L, Z and U shaped routes between two stubs"""
+        (sx, sy), (tx, ty) = start, end
+        xs = {(sx + tx) / 2}
+        ys = {(sy + ty) / 2}
+        # Channels just beside any table in the way of the L routes; past a
+        # handful of blockers a simple shape rarely fits, so leave it to A*
+        blockers = set()
+        for box in self._l_boxes(start, end):
+            blockers |= grid.query(*box, margin)
+        if len(blockers) > self.max_channels:
+            blockers = ()
+        for i in blockers:
+            left, bottom, right, top = grid.rects[i]
+            xs.update((left - margin * 1.5, right + margin * 1.5))
+            ys.update((bottom - margin * 1.5, top + margin * 1.5))
+
+        yield [(tx, sy)]
+        yield [(sx, ty)]
+        for x in xs:
+            yield [(x, sy), (x, ty)]
+        for y in ys:
+            yield [(sx, y), (tx, y)]
+
+    @staticmethod
+    def _l_boxes(start, end):
+        """Boxes of the four segments of the two L routes between two points"""
+        (sx, sy), (tx, ty) = start, end
+        for x, y in ((tx, sy), (sx, ty)):
+            yield min(sx, x), min(sy, y), max(sx, x), max(sy, y)
+            yield min(x, tx), min(y, ty), max(x, tx), max(y, ty)
+
+    def _clear(self, grid, points, margin):
+        for (x1, y1), (x2, y2) in zip(points, points[1:]):
+            if grid.hits(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2), margin):
+                return False
+        return True
+
+    def _touching(self, grid, points, margin):
+        """Indices of the tables within margin of a polyline"""
+        found = set()
+        for (x1, y1), (x2, y2) in zip(points, points[1:]):
+            found |= grid.query(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2), margin)
+        return found
+
+    def _cost(self, points):
+        length = sum(abs(x2 - x1) + abs(y2 - y1) for (x1, y1), (x2, y2) in zip(points, points[1:]))
+        return length + self.bend_cost * (len(points) - 2)
+
+    def _search(self, grid, start, end, margin, budget=None):
+        """A* with a bend penalty over the channels in a corridor between two stubs, or None
+
+        The corridor is the SpatialGrid buckets within a few buckets of either
+        L route between the stubs, widened when no path fits. The grid lines
+        are the clearance lines of the tables in the corridor (plus the stubs
+        themselves), so every gap between those tables has a line through it,
+        and nodes outside the corridor are blocked. The work grows with the
+        length of the route rather than with the area between the stubs.
+        """
+        (sx, sy), (tx, ty) = start, end
+        # A stub inside another table's clearance can be neither left nor reached
+        if grid.hits(sx, sy, sx, sy, margin) or grid.hits(tx, ty, tx, ty, margin):
+            return None
+        for pad in self.corridors:
+            cells = set()
+            for box in self._l_boxes(start, end):
+                cells |= grid.cells(*box, pad)
+            if budget is not None:
+                # Collecting the corridor's tables and building its grid
+                # cost about one expansion per bucket; past the budget, none
+                # of it is worth starting
+                if len(cells) >= budget.left:
+                    return None
+                budget.left -= len(cells)
+            obstacles = grid.members(cells)
+            while True:
+                if budget is not None and budget.left <= 0:
+                    return None
+                path = self._search_window([grid.rects[i] for i in obstacles], start, end, margin,
+                                           cells, grid.bucket, budget)
+                if path is None:
+                    break
+                # A grid edge across a wide gap can leave the corridor; route
+                # again around whatever it ran into
+                missed = self._touching(grid, path, margin) - obstacles
+                if not missed:
+                    return path
+                obstacles |= missed
+        return None
+
+    def _search_window(self, obstacles, start, end, margin, cells=None, bucket=1.0, budget=None):
+        """A* between two points around the obstacles, inside the buckets in cells if given
+
+        Blocked nodes and grid edges are marked per obstacle with NumPy slicing.
+        A straight run toward the goal's lines jumps to the last node it can
+        reach. Expansions are taken from budget, if given.
+        """
+        edge = margin + 1e-6  # Lines run just outside each table's clearance
+        xs = np.array(sorted({start[0], end[0]} | {x for o in obstacles
+                                                   for x in (o[0] - edge, o[2] + edge)}))
+        ys = np.array(sorted({start[1], end[1]} | {y for o in obstacles
+                                                   for y in (o[1] - edge, o[3] + edge)}))
+        nx, ny = len(xs), len(ys)
+        node_blocked = np.zeros((nx, ny), dtype=bool)
+        h_blocked = np.zeros((max(nx - 1, 0), ny), dtype=bool)  # (i, j) -> (i + 1, j)
+        v_blocked = np.zeros((nx, max(ny - 1, 0)), dtype=bool)  # (i, j) -> (i, j + 1)
+        grown = np.array(obstacles, dtype=float).reshape(-1, 4) + [-margin, -margin, margin, margin]
+        # Lines strictly inside each grown box
+        bounds = zip(np.searchsorted(xs, grown[:, 0], 'right').tolist(),
+                     np.searchsorted(xs, grown[:, 2], 'left').tolist(),
+                     np.searchsorted(ys, grown[:, 1], 'right').tolist(),
+                     np.searchsorted(ys, grown[:, 3], 'left').tolist())
+        for i0, i1, j0, j1 in bounds:
+            node_blocked[i0:i1, j0:j1] = True
+            # Grid edges overlapping the box on a line inside it
+            h_blocked[max(i0 - 1, 0):i1, j0:j1] = True
+            v_blocked[i0:i1, max(j0 - 1, 0):j1] = True
+        if cells:
+            # Nodes outside the corridor's buckets are off limits
+            keys = np.array(list(cells))
+            low = keys.min(axis=0) - 1
+            inside = np.zeros(tuple(keys.max(axis=0) - low + 2), dtype=bool)
+            inside[keys[:, 0] - low[0], keys[:, 1] - low[1]] = True
+            bx = np.clip(np.floor(xs / bucket).astype(int) - low[0], 0, inside.shape[0] - 1)
+            by = np.clip(np.floor(ys / bucket).astype(int) - low[1], 0, inside.shape[1] - 1)
+            node_blocked |= ~inside[np.ix_(bx, by)]
+        xs, ys = xs.tolist(), ys.tolist()
+        source = (xs.index(start[0]), ys.index(start[1]))
+        goal = (xs.index(end[0]), ys.index(end[1]))
+        # Flat bytes index quickly from Python: cell (i, j) is at i * ny + j, and
+        # at j * nx + i in the copies by row, where a run along a row is one slice
+        node_rows, h_rows = node_blocked.T.tobytes(), h_blocked.T.tobytes()
+        node_blocked, h_blocked, v_blocked = (node_blocked.tobytes(), h_blocked.tobytes(),
+                                              v_blocked.tobytes())
+
+        gx, gy = xs[goal[0]], ys[goal[1]]
+
+        def estimate(i, j):
+            # Off both of the goal's lines, at least one more bend is needed
+            bend = self.bend_cost if i != goal[0] and j != goal[1] else 0
+            return self.greed * (abs(gx - xs[i]) + abs(gy - ys[j])) + bend
+
+        # State is (i, j, direction); direction None at the start. Ties on the
+        # estimate go to the deepest state, so the search runs straight at the
+        # goal instead of flooding every equally short staircase.
+        queue = [(estimate(*source), -0.0, source[0], source[1], None)]
+        came_from = {(source[0], source[1], None): None}
+        best = {(source[0], source[1], None): 0.0}
+        cheapest = {source: 0.0}
+        limit = self.max_expansions if budget is None else min(self.max_expansions, budget.left)
+        expansions = 0
+        while queue and expansions < limit:
+            _, cost, i, j, direction = heapq.heappop(queue)
+            cost = -cost
+            if cost > best.get((i, j, direction), math.inf):
+                continue
+            if (i, j) == goal:
+                if budget is not None:
+                    budget.left -= expansions
+                points, state = [], (i, j, direction)
+                while state is not None:
+                    points.append((xs[state[0]], ys[state[1]]))
+                    state = came_from[state]
+                return self._simplify(points[::-1])
+            expansions += 1
+            moves = [(0, i + 1, j), (1, i - 1, j), (2, i, j + 1), (3, i, j - 1)]
+            # Toward the goal, the farthest node a straight run reaches before
+            # something blocks it is one move, so an open channel costs one
+            # expansion rather than one per grid line
+            if goal[0] != i:
+                base = j * (nx - 1)
+                if goal[0] > i:
+                    edge = h_rows.find(1, base + i, base + goal[0])
+                    node = node_rows.find(1, j * nx + i + 1, j * nx + goal[0] + 1)
+                    far = min(goal[0] if edge < 0 else edge - base,
+                              goal[0] if node < 0 else node - j * nx - 1)
+                else:
+                    edge = h_rows.rfind(1, base + goal[0], base + i)
+                    node = node_rows.rfind(1, j * nx + goal[0], j * nx + i)
+                    far = max(goal[0] if edge < 0 else edge - base + 1,
+                              goal[0] if node < 0 else node - j * nx + 1)
+                if abs(far - i) > 1:
+                    moves.append((0 if far > i else 1, far, j))
+            if goal[1] != j:
+                base = i * (ny - 1)
+                if goal[1] > j:
+                    edge = v_blocked.find(1, base + j, base + goal[1])
+                    node = node_blocked.find(1, i * ny + j + 1, i * ny + goal[1] + 1)
+                    far = min(goal[1] if edge < 0 else edge - base,
+                              goal[1] if node < 0 else node - i * ny - 1)
+                else:
+                    edge = v_blocked.rfind(1, base + goal[1], base + j)
+                    node = node_blocked.rfind(1, i * ny + goal[1], i * ny + j)
+                    far = max(goal[1] if edge < 0 else edge - base + 1,
+                              goal[1] if node < 0 else node - i * ny + 1)
+                if abs(far - j) > 1:
+                    moves.append((2 if far > j else 3, i, far))
+            for move, ni, nj in moves:
+                # Moves come in opposite pairs; turning back is never shorter
+                if direction is not None and move == direction ^ 1:
+                    continue
+                if not (0 <= ni < nx and 0 <= nj < ny):
+                    continue
+                if abs(ni - i) + abs(nj - j) == 1:
+                    if move < 2 and h_blocked[min(i, ni) * ny + j]:
+                        continue
+                    if move >= 2 and v_blocked[i * (ny - 1) + min(j, nj)]:
+                        continue
+                if node_blocked[ni * ny + nj] and (ni, nj) != goal:
+                    continue
+                new_cost = (cost + abs(xs[ni] - xs[i]) + abs(ys[nj] - ys[j])
+                            + (self.bend_cost if direction not in (None, move) else 0))
+                # One bend turns a cheaper arrival at this node into any direction
+                if new_cost >= cheapest.get((ni, nj), math.inf) + self.bend_cost:
+                    continue
+                if new_cost < best.get((ni, nj, move), math.inf):
+                    best[(ni, nj, move)] = new_cost
+                    if new_cost < cheapest.get((ni, nj), math.inf):
+                        cheapest[(ni, nj)] = new_cost
+                    came_from[(ni, nj, move)] = (i, j, direction)
+                    heapq.heappush(queue, (new_cost + estimate(ni, nj), -new_cost, ni, nj, move))
+        if budget is not None:
+            budget.left -= expansions
+        return None
+
+    # Geometry
+
+    @staticmethod
+    def _simplify(points):
+        """Drop repeated and collinear points"""
+        result = []
+        for point in points:
+            if result and abs(point[0] - result[-1][0]) < 1e-9 and abs(point[1] - result[-1][1]) < 1e-9:
+                continue
+            if len(result) >= 2:
+                (x0, y0), (x1, y1) = result[-2], result[-1]
+                if (abs(x0 - x1) < 1e-9 and abs(x1 - point[0]) < 1e-9) or \
+                        (abs(y0 - y1) < 1e-9 and abs(y1 - point[1]) < 1e-9):
+                    result[-1] = point
+                    continue
+            result.append(point)
+        return result
+
+    @staticmethod
+    def _offset(points, distance):
+        """Shift an orthogonal polyline sideways by distance (to the left of travel)"""
+        if not distance or len(points) < 2:
+            return list(points)
+
+        def normal(p, q):
+            dx, dy = q[0] - p[0], q[1] - p[1]
+            length = math.hypot(dx, dy) or 1.0
+            return -dy / length, dx / length
+
+        normals = [normal(p, q) for p, q in zip(points, points[1:])]
+        shifted = []
+        for i, (x, y) in enumerate(points):
+            before = normals[i - 1] if i > 0 else None
+            after = normals[i] if i < len(normals) else None
+            if before is None or after is None or before == after:
+                nx, ny = before or after
+            else:
+                # Corner of a horizontal and a vertical segment: shift by both
+                nx, ny = before[0] + after[0], before[1] + after[1]
+            shifted.append((x + nx * distance, y + ny * distance))
+        return shifted
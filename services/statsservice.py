@@ -0,0 +1,71 @@
+class StatisticsChartGenerator:
+    # Each table is a bar with a rotated label in both charts of a row; the
+    # figure widens with the tables, up to MAX_WIDTH_INCHES
+    INCHES_PER_TABLE = 0.5
+    MIN_WIDTH_INCHES = 10
+    MAX_WIDTH_INCHES = 40
+    HEIGHT_INCHES = 10
+
+    def figure_size(self, statistics):
+        """Width and height in inches of the charts of these tables"""
+        width = 4 + self.INCHES_PER_TABLE * len(statistics)
+        return (min(self.MAX_WIDTH_INCHES, max(self.MIN_WIDTH_INCHES, width)),
+                self.HEIGHT_INCHES)
+
+    def generate_chart(self, statistics):
+        """Generate the four table statistics charts using matplotlib"""
+        # Imported here so sizing a chart does not load matplotlib
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=self.figure_size(statistics))
+        
+        # Row count chart
+        tables = list(statistics.keys())
+        # Counts that timed out without an estimate are charted as zero
+        row_counts = [statistics[table]['row_count'] or 0 for table in tables]
+        ax1.bar(tables, row_counts, color='skyblue')
+        ax1.set_title('Row Count by Table')
+        ax1.set_xlabel('Tables')
+        ax1.set_ylabel('Row Count')
+        plt.setp(ax1.get_xticklabels(), rotation=45, ha='right')
+        
+        # Column count chart
+        col_counts = [statistics[table]['column_count'] for table in tables]
+        ax2.bar(tables, col_counts, color='lightgreen')
+        ax2.set_title('Column Count by Table')
+        ax2.set_xlabel('Tables')
+        ax2.set_ylabel('Column Count')
+        plt.setp(ax2.get_xticklabels(), rotation=45, ha='right')
+        
+        # Size chart (if available)
+        sizes = []
+        size_tables = []
+        for table in tables:
+            size = statistics[table]['size_mb']
+            if size != 'N/A' and size is not None:
+                sizes.append(float(size))
+                size_tables.append(table)
+        
+        if sizes:
+            ax3.bar(size_tables, sizes, color='orange')
+            ax3.set_title('Table Size (MB)')
+            ax3.set_xlabel('Tables')
+            ax3.set_ylabel('Size (MB)')
+            plt.setp(ax3.get_xticklabels(), rotation=45, ha='right')
+        else:
+            ax3.text(0.5, 0.5, 'Size data not available', ha='center', va='center', transform=ax3.transAxes)
+            ax3.set_title('Table Size (MB)')
+        
+        # Summary pie chart
+        total_rows = sum(row_counts)
+        if total_rows > 0:
+            ax4.pie(row_counts, labels=tables, autopct='%1.1f%%', startangle=90)
+            ax4.set_title('Data Distribution by Table')
+        else:
+            ax4.text(0.5, 0.5, 'No data available', ha='center', va='center', transform=ax4.transAxes)
+            ax4.set_title('Data Distribution by Table')
+        
+        plt.tight_layout()
+        return fig
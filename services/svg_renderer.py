@@ -0,0 +1,139 @@
+from xml.sax.saxutils import escape, quoteattr
+
+
+class SVGDiagramRenderer:
+    """Renders ER diagrams straight to SVG markup, without matplotlib
+
+    Uses the same table layout, geometry and color scheme as ERDiagramGenerator
+    so both backends draw the same diagram; this one just writes the shapes as
+    text instead of rasterizing a figure.
+    """
+
+    # One diagram unit is 12.96pt in the 18-inch matplotlib figure; at 96 px/in
+    # that is 17.28 px, so fonts keep the same physical size as in the PNG.
+    SCALE = 17.28
+    MARGIN = 2
+    TITLE_HEIGHT = 6
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.colors = generator.colors
+
+    def render(self, tables_data, relationships, layout='auto', table_layout=None, routes=None):
+        """Get the diagram as an SVG document string (routes as from route_relationships)"""
+        if table_layout is None:
+            table_layout = self.generator.compute_layout(tables_data, relationships, layout)
+        if routes is None:
+            routes = self.generator.route_relationships(relationships, table_layout)
+
+        # Canvas covers every table, plus room for the title
+        min_x, min_y, max_x, max_y = self.generator.layout_extent(table_layout)
+        max_y += self.TITLE_HEIGHT
+        origin = (min_x, max_y)
+
+        width = (max_x - min_x) * self.SCALE
+        height = (max_y - min_y) * self.SCALE
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+            f'viewBox="0 0 {width:.1f} {height:.1f}" font-family="sans-serif">',
+            '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" '
+            'markerHeight="8" orient="auto-start-reverse">'
+            f'<path d="M 0 0 L 10 5 L 0 10" fill="none" stroke="{self.colors["relationship"]}" '
+            'stroke-width="1.5"/></marker></defs>',
+            '<rect width="100%" height="100%" fill="#FFFFFF"/>',
+            self._background(origin, (min_x, min_y, max_x, max_y - self.TITLE_HEIGHT)),
+            f'<text x="{width / 2:.1f}" y="{self.TITLE_HEIGHT * self.SCALE * 0.6:.1f}" '
+            f'text-anchor="middle" font-size="32" font-weight="bold" font-family="serif" '
+            f'fill="{self.colors["header_bg"]}">ERGenix - Database ER Diagram</text>',
+        ]
+
+        for table_name, table_info in tables_data.items():
+            parts.append(self._table(origin, table_name, table_info['schema'], table_layout[table_name]))
+
+        for rel, path in zip(relationships, routes):
+            if path is not None:
+                parts.append(self._relationship(origin, rel, *path))
+
+        parts.append('</svg>')
+        return '\n'.join(parts)
+
+    def _point(self, origin, x, y):
+        """Convert diagram units (y up) to SVG pixels (y down) from the top-left origin"""
+        return (x - origin[0]) * self.SCALE, (origin[1] - y) * self.SCALE
+
+    def _rect(self, origin, x, y, width, height, **attrs):
+        """SVG rect for a box whose bottom-left corner is (x, y) in diagram units"""
+        left, top = self._point(origin, x, y + height)
+        extra = ' '.join(f'{key.replace("_", "-")}="{value}"' for key, value in attrs.items())
+        return (f'<rect x="{left:.1f}" y="{top:.1f}" width="{width * self.SCALE:.1f}" '
+                f'height="{height * self.SCALE:.1f}" {extra}/>')
+
+    def _background(self, origin, extent):
+        """Same very light grid as ERDiagramGenerator._add_subtle_background"""
+        min_x, min_y, max_x, max_y = extent
+        lines = []
+        for x in self.generator.grid_lines(min_x, max_x):
+            x1, y1 = self._point(origin, x, min_y)
+            x2, y2 = self._point(origin, x, max_y)
+            lines.append(f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}"/>')
+        for y in self.generator.grid_lines(min_y, max_y):
+            x1, y1 = self._point(origin, min_x, y)
+            x2, y2 = self._point(origin, max_x, y)
+            lines.append(f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}"/>')
+        return ('<g stroke="#F0F0F0" stroke-width="0.4" stroke-opacity="0.5">'
+                + ''.join(lines) + '</g>')
+
+    def _table(self, origin, table_name, schema, dims):
+        """Header, column rows and shadows for one table, as an SVG group"""
+        x, y, width = dims['x'], dims['y'], dims['width']
+        row_height = self.generator.ROW_HEIGHT
+        header_height = self.generator.HEADER_HEIGHT
+        shadow = self.generator.SHADOW_OFFSET
+        border = self.colors['table_border']
+
+        parts = [f'<g class="table" data-table={quoteattr(table_name)}>',
+                 self._rect(origin, x + shadow, y - shadow, width, header_height,
+                            fill='#000000', fill_opacity='0.125'),
+                 self._rect(origin, x, y, width, header_height, fill=self.colors['header_bg'],
+                            stroke=border, stroke_width='3.3')]
+        cx, cy = self._point(origin, x + width / 2, y + header_height / 2)
+        parts.append(f'<text x="{cx:.1f}" y="{cy:.1f}" text-anchor="middle" '
+                     f'dominant-baseline="central" font-size="16" font-weight="bold" '
+                     f'fill="{self.colors["header_text"]}">{escape(table_name)}</text>')
+
+        for i, col in enumerate(schema):
+            col_y = y - (i + 1) * row_height
+            if col['key'] == 'PRI':
+                bg_color = self.colors['pk_bg']
+                prefix = "🔑 "
+            elif 'FK' in (col.get('key') or ''):
+                bg_color = self.colors['fk_bg']
+                prefix = "🔗 "
+            else:
+                bg_color = self.colors['table_bg'] if i % 2 == 0 else '#FFFFFF'
+                prefix = ""
+            parts.append(self._rect(origin, x + shadow, col_y - shadow, width, row_height,
+                                    fill='#000000', fill_opacity='0.063'))
+            parts.append(self._rect(origin, x, col_y, width, row_height, fill=bg_color,
+                                    stroke=border, stroke_width='2'))
+            tx, ty = self._point(origin, x + 1.5, col_y + row_height / 2)
+            weight = ' font-weight="500"' if col['key'] == 'PRI' else ''
+            parts.append(f'<text x="{tx:.1f}" y="{ty:.1f}" dominant-baseline="central" '
+                         f'font-size="12" font-family="monospace"{weight} '
+                         f'fill="{self.colors["text"]}">'
+                         f'{escape(prefix + str(col["column"]) + " : " + str(col["type"]))}</text>')
+        parts.append('</g>')
+        return ''.join(parts)
+
+    def _relationship(self, origin, relationship, curve_x, curve_y):
+        """Routed connector with an arrowhead at the referenced table"""
+        points = ' '.join('%.1f,%.1f' % self._point(origin, x, y) for x, y in zip(curve_x, curve_y))
+        parts = [f'<polyline points="{points}" fill="none" stroke="{self.colors["relationship"]}" '
+                 f'stroke-width="3.3" stroke-opacity="0.8" marker-end="url(#arrow)"/>']
+        if 'relationship_type' in relationship:
+            mx, my = self._point(origin, *self.generator.path_midpoint(curve_x, curve_y))
+            parts.append(f'<text x="{mx:.1f}" y="{my:.1f}" text-anchor="middle" '
+                         f'dominant-baseline="central" font-size="11" '
+                         f'fill="{self.colors["text"]}">'
+                         f'{escape(str(relationship["relationship_type"]))}</text>')
+        return ''.join(parts)
@@ -0,0 +1,82 @@
+import io
+import os
+
+from PIL import Image
+
+from services.artifacts import ArtifactStore, convert_image
+
+SESSION = 'session-a'
+KEY = 'ab' * 32
+
+
+def png(color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGBA', (4, 4), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_put_writes_once_and_tokens_resolve_to_their_artifact(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    name = store.put(SESSION, KEY, 'png', b'first')
+    assert name == f'{KEY}.png'
+    # Artifact ids are content hashes, so a second put keeps the file
+    assert store.put(SESSION, KEY, 'png', b'second') == name
+    assert store.get(SESSION, name) == b'first'
+    token = store.token(SESSION, KEY)
+    assert store.resolve(token) == (SESSION, KEY)
+    # Another format of the same artifact shares its token
+    store.put(SESSION, KEY, 'svg', b'<svg/>')
+    assert store.token(SESSION, KEY) == token
+    assert store.token('session-b', KEY) is None
+
+
+def test_invalid_names_are_refused(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    assert store.path(SESSION, '../secret.png') is None
+    assert store.path('../x', f'{KEY}.png') is None
+    for session_id, artifact_id, fmt in (('../x', KEY, 'png'), (SESSION, 'nothex', 'png'),
+                                         (SESSION, KEY, 'exe')):
+        try:
+            store.put(session_id, artifact_id, fmt, b'')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'{artifact_id}.{fmt} was stored')
+
+
+def test_oldest_artifacts_go_first_past_max_bytes(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=10)
+    old = store.put(SESSION, 'a' * 64, 'png', b'x' * 6)
+    old_token = store.token(SESSION, 'a' * 64)
+    new = store.put(SESSION, 'b' * 64, 'png', b'y' * 6)
+    assert store.path(SESSION, old) is None and store.resolve(old_token) is None
+    assert store.get(SESSION, new) == b'y' * 6
+
+
+def test_expire_drops_old_files_and_ended_sessions(tmp_path):
+    store = ArtifactStore(str(tmp_path), ttl=60)
+    kept = store.put(SESSION, 'a' * 64, 'png', b'a')
+    ended = store.put('session-b', 'b' * 64, 'png', b'b')
+    path = store.path('session-b', ended)
+    store.expire(lambda session_id: session_id == SESSION)
+    assert store.path('session-b', ended) is None and not os.path.exists(path)
+    assert store.path(SESSION, kept) is not None
+    store.expire(lambda session_id: True, now=os.path.getmtime(store.path(SESSION, kept)) + 120)
+    assert store.path(SESSION, kept) is None
+
+
+def test_close_removes_only_its_own_folder(tmp_path):
+    (tmp_path / 'other').mkdir()
+    store = ArtifactStore(str(tmp_path))
+    store.put(SESSION, KEY, 'png', b'x')
+    store.close()
+    assert os.listdir(tmp_path) == ['other']
+
+
+def test_png_converts_to_flat_jpeg_and_pdf():
+    jpeg = convert_image(png((255, 0, 0, 0)), 'jpeg')
+    with Image.open(io.BytesIO(jpeg)) as image:
+        # Transparent pixels come out white
+        assert image.format == 'JPEG' and image.getpixel((0, 0))[0] > 250
+        assert min(image.getpixel((0, 0))) > 240
+    assert convert_image(png(), 'pdf').startswith(b'%PDF')
@@ -0,0 +1,62 @@
+import pytest
+
+from services.erservice import ERDiagramGenerator
+
+
+def grid_layout(columns, rows, width=20, height=30, gap=10):
+    return {f't{i}_{j}': {'x': i * (width + gap), 'y': j * (height + gap),
+                          'width': width, 'height': height}
+            for i in range(columns) for j in range(rows)}
+
+
+GENERATOR = ERDiagramGenerator()
+SMALL = grid_layout(2, 2)
+LARGE = grid_layout(30, 30)
+
+
+def test_small_diagram_renders_at_full_resolution():
+    assert GENERATOR.fit_dpi(SMALL) == 300
+
+
+@pytest.mark.parametrize('budget_mb', [16, 32, 64, 128, 256])
+def test_fit_dpi_is_the_highest_dpi_within_the_budget(budget_mb):
+    budget = budget_mb * 1024 * 1024
+    dpi = GENERATOR.fit_dpi(LARGE, budget_bytes=budget, min_dpi=1)
+    assert GENERATOR.canvas_bytes(LARGE, dpi) <= budget
+    if dpi < 300:
+        assert GENERATOR.canvas_bytes(LARGE, dpi + 1) > budget
+
+
+def test_default_budget_lowers_the_dpi_of_large_diagrams():
+    dpi = GENERATOR.fit_dpi(LARGE)
+    assert GENERATOR.MIN_RENDER_DPI <= dpi < 300
+    assert GENERATOR.canvas_bytes(LARGE, dpi) <= GENERATOR.RENDER_BUDGET_MB * 1024 * 1024
+
+
+def test_fit_dpi_gives_up_below_the_minimum():
+    budget = GENERATOR.canvas_bytes(LARGE, 100) - 1
+    assert GENERATOR.fit_dpi(LARGE, budget_bytes=budget, min_dpi=100) is None
+    assert GENERATOR.fit_dpi(LARGE, budget_bytes=budget, min_dpi=99) == 99
+
+
+def test_any_figure_fits_the_same_budget():
+    # The layout's figure gets the same DPI as its size in inches
+    width, height = GENERATOR.figure_size(LARGE)
+    assert GENERATOR.fit_figure_dpi(width, height) == GENERATOR.fit_dpi(LARGE)
+    assert GENERATOR.figure_bytes(15, 10, 300) == 4500 * 3000 * GENERATOR.CANVAS_BYTES_PER_PIXEL
+    assert GENERATOR.fit_figure_dpi(15, 10, budget_bytes=1024 * 1024) is None
+
+
+def test_compute_layout_keeps_unchanged_tables_where_they_were():
+    def table(*columns):
+        return {'schema': [{'column': name, 'type': 'INTEGER'} for name in columns],
+                'foreign_keys': []}
+    tables = {f't{i}': table('id', 'name', f'c{i}') for i in range(12)}
+    relationships = [{'from_table': f't{i}', 'to_table': f't{i - 1}'} for i in range(1, 12)]
+    first = GENERATOR.compute_layout(tables, relationships)
+    tables['t4'] = table('id')  # Shrunk
+    tables['extra'] = table('id', 'name')
+    second = GENERATOR.compute_layout(tables, relationships, previous=first)
+    assert second['t4']['x'] == first['t4']['x'] and second['t4']['y'] == first['t4']['y']
+    assert sum(second[name] != first[name] for name in first) == 1
+    assert 'extra' in second
@@ -0,0 +1,159 @@
+import random
+
+import pytest
+
+from benchmarks.render_benchmark import synthetic_schema
+from services.erservice import ERDiagramGenerator
+from services.incremental import (Drawing, DrawingStore, _merge, dirty_regions,
+                                  relationship_key, reusable_routes)
+
+GENERATOR = ERDiagramGenerator()
+
+
+@pytest.fixture(scope='module')
+def drawing():
+    tables_data, relationships = synthetic_schema(30)
+    layout = GENERATOR.compute_layout(tables_data, relationships, 'layered')
+    return draw(tables_data, relationships, layout)
+
+
+def draw(tables_data, relationships, layout, fixed=None):
+    routes = GENERATOR.route_relationships(relationships, layout, fixed=fixed)
+    return Drawing(tables_data, relationships, layout, routes)
+
+
+def crosses(path, box):
+    xs, ys = path
+    return any(min(x1, x2) < box[2] and box[0] < max(x1, x2)
+               and min(y1, y2) < box[3] and box[1] < max(y1, y2)
+               for x1, y1, x2, y2 in zip(xs, ys, xs[1:], ys[1:]))
+
+
+def neighbours(relationships, tables):
+    """Tables and every table related to one of them"""
+    found = set(tables)
+    for rel in relationships:
+        if rel['from_table'] in tables or rel['to_table'] in tables:
+            found.update((rel['from_table'], rel['to_table']))
+    return found
+
+
+def test_unchanged_drawings_keep_every_route(drawing):
+    fixed = reusable_routes(GENERATOR, drawing, drawing.relationships, drawing.table_layout)
+    assert fixed == dict(enumerate(drawing.routes))
+    assert reusable_routes(GENERATOR, None, drawing.relationships, drawing.table_layout) == {}
+
+
+def test_routes_through_an_added_table_are_dropped(drawing):
+    # A new, unrelated table right on the middle of the longest route segment
+    xs, ys = max(drawing.routes, key=lambda path: max(abs(x2 - x1) + abs(y2 - y1) for x1, y1, x2, y2
+                                                      in zip(path[0], path[1], path[0][1:],
+                                                             path[1][1:])))
+    k = max(range(len(xs) - 1), key=lambda i: abs(xs[i + 1] - xs[i]) + abs(ys[i + 1] - ys[i]))
+    mx, my = (xs[k] + xs[k + 1]) / 2, (ys[k] + ys[k + 1]) / 2
+    layout = dict(drawing.table_layout, extra={'x': mx - 2, 'y': my + 2 - GENERATOR.HEADER_HEIGHT,
+                                               'width': 4.0, 'height': 4.0})
+    box = GENERATOR.table_box(layout['extra'])
+    assert box == pytest.approx((mx - 2, my - 2, mx + 2, my + 2))
+
+    fixed = reusable_routes(GENERATOR, drawing, drawing.relationships, layout)
+    blocked = {i for i, path in enumerate(drawing.routes) if crosses(path, box)}
+    assert blocked and set(fixed) == set(range(len(drawing.routes))) - blocked
+
+
+def test_routes_near_a_moved_table_are_dropped(drawing):
+    name = 'table_3'
+    layout = dict(drawing.table_layout)
+    layout[name] = dict(layout[name], y=layout[name]['y'] + 0.5)
+    fixed = reusable_routes(GENERATOR, drawing, drawing.relationships, layout)
+    near = neighbours(drawing.relationships, {name})
+    box = GENERATOR.table_box(layout[name])
+    expected = {i for i, (rel, path) in enumerate(zip(drawing.relationships, drawing.routes))
+                if not near.intersection((rel['from_table'], rel['to_table']))
+                and not crosses(path, box)}
+    assert len(near) > 1 and fixed and set(fixed) == expected
+
+
+def test_routes_next_to_a_removed_table_are_dropped(drawing):
+    name = 'table_3'
+    near = neighbours(drawing.relationships, {name})
+    tables_data = {table: data for table, data in drawing.tables_data.items() if table != name}
+    relationships = [rel for rel in drawing.relationships if name not in (rel['from_table'],
+                                                                          rel['to_table'])]
+    layout = {table: dims for table, dims in drawing.table_layout.items() if table != name}
+    fixed = reusable_routes(GENERATOR, drawing, relationships, layout)
+
+    old = {relationship_key(rel): path for rel, path in zip(drawing.relationships,
+                                                            drawing.routes)}
+    expected = {i for i, rel in enumerate(relationships)
+                if not near.intersection((rel['from_table'], rel['to_table']))}
+    assert fixed and set(fixed) == expected
+    assert all(fixed[i] == old[relationship_key(relationships[i])] for i in fixed)
+    # The new drawing routes the rest around the gap
+    assert all(path is not None for path in draw(tables_data, relationships, layout,
+                                                 fixed=fixed).routes)
+
+
+def test_dirty_regions_cover_changed_tables_and_routes(drawing):
+    assert dirty_regions(GENERATOR, drawing, drawing) == []
+
+    name = 'table_5'
+    tables_data = dict(drawing.tables_data)
+    tables_data[name] = dict(tables_data[name], schema=tables_data[name]['schema']
+                             + [{'column': 'added', 'type': 'TEXT', 'key': ''}])
+    routes = list(drawing.routes)
+    xs, ys = routes[0]
+    routes[0] = (xs[:1] + [xs[0]] + xs[-1:], ys[:1] + [ys[-1]] + ys[-1:])
+    changed = Drawing(tables_data, drawing.relationships, drawing.table_layout, routes)
+    regions = dirty_regions(GENERATOR, drawing, changed)
+    ink = GENERATOR.ink_box(name, tables_data[name]['schema'], drawing.table_layout[name])
+    for box in (ink, GENERATOR.route_box(drawing.routes[0]), GENERATOR.route_box(routes[0])):
+        assert any(r[0] <= box[0] and r[1] <= box[1] and box[2] <= r[2] and box[3] <= r[3]
+                   for r in regions)
+    frame = GENERATOR.diagram_frame(drawing.table_layout)[0]
+    area = (frame[2] - frame[0]) * (frame[3] - frame[1])
+    assert sum((r[2] - r[0]) * (r[3] - r[1]) for r in regions) < 0.5 * area
+
+
+def test_dirty_regions_fall_back_to_a_full_render(drawing):
+    # A table moved out past the edge changes the plotted extent
+    layout = dict(drawing.table_layout)
+    layout['table_5'] = dict(layout['table_5'], x=layout['table_5']['x'] + 1000)
+    assert dirty_regions(GENERATOR, drawing, draw(drawing.tables_data, drawing.relationships,
+                                                  layout)) is None
+    # Most of the diagram changed: cheaper to redraw it all
+    tables_data = {name: dict(data, schema=data['schema'][:1] + [
+        {'column': 'renamed', 'type': 'TEXT', 'key': ''}]) for name, data in
+        drawing.tables_data.items()}
+    changed = Drawing(tables_data, drawing.relationships, drawing.table_layout, drawing.routes)
+    assert dirty_regions(GENERATOR, drawing, changed) is None
+
+
+def test_merge_joins_overlapping_and_touching_boxes_only():
+    boxes = [(0, 0, 2, 2), (1, 1, 3, 3), (3, 0, 4, 1), (10, 10, 11, 11), (2.5, 2.5, 12, 2.6)]
+    # The thin box widens the first group past the lone box, which stays apart
+    assert sorted(_merge(boxes)) == [(0, 0, 12, 3), (10, 10, 11, 11)]
+    assert _merge([]) == [] and _merge([(0, 0, 1, 1)]) == [(0, 0, 1, 1)]
+
+
+def test_merge_leaves_no_overlaps_and_covers_every_box():
+    rng = random.Random(5)
+    boxes = []
+    for _ in range(3000):
+        x, y = rng.uniform(0, 3000), rng.uniform(0, 3000)
+        boxes.append((x, y, x + rng.uniform(1, 30), y + rng.uniform(1, 30)))
+    merged = _merge(boxes)
+    assert 1 < len(merged) < len(boxes)
+    assert not any(a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+                   for i, a in enumerate(merged) for b in merged[i + 1:])
+    assert all(any(m[0] <= b[0] and m[1] <= b[1] and b[2] <= m[2] and b[3] <= m[3]
+                   for m in merged) for b in boxes)
+
+
+def test_drawing_store_keeps_the_most_recent_drawings(drawing):
+    store = DrawingStore(max_entries=2)
+    store.put('a', 'db', drawing)
+    store.put('b', 'db', drawing)
+    assert store.get('a', 'db') is drawing
+    store.put('c', 'db', drawing)
+    assert store.get('b', 'db') is None and store.get('a', 'db') is drawing
@@ -0,0 +1,60 @@
+import threading
+
+from services.jobs import JobManager
+
+
+def wait(job, timeout=5):
+    """Block until a job finishes; its events end with the final state"""
+    for _ in job.follow(keepalive=timeout):
+        pass
+    return job
+
+
+def test_jobs_report_progress_and_their_result():
+    manager = JobManager(max_workers=1)
+
+    def work(job, count):
+        for done in range(count):
+            job.progress('counting', done, count)
+        return {'counted': count}
+
+    job = wait(manager.submit('count', work, 3, session_id='a'))
+    assert job.snapshot(include_result=True)['result'] == {'counted': 3}
+    names = [name for _, name, _ in job._events]
+    assert names == ['state', 'progress', 'progress', 'progress', 'done']
+
+
+def test_jobs_are_found_only_by_their_session():
+    manager = JobManager(max_workers=1)
+    job = wait(manager.submit('noop', lambda job: None, session_id='a'))
+    assert manager.get(job.id, session_id='a') is job
+    assert manager.get(job.id, session_id='b') is None
+    assert manager.cancel(job.id, session_id='b') is None
+    assert manager.get('missing', session_id='a') is None
+
+
+def test_ended_sessions_lose_their_jobs_and_running_ones_are_cancelled():
+    manager = JobManager(max_workers=2)
+    started = threading.Event()
+
+    def block(job):
+        started.set()
+        job.cancel_event.wait(5)
+        job.check()
+
+    running = manager.submit('block', block, session_id='gone')
+    kept = wait(manager.submit('noop', lambda job: None, session_id='live'))
+    assert started.wait(5)
+    manager.expire(is_live=lambda session_id: session_id == 'live')
+    assert wait(running).state == 'cancelled'
+    assert manager.get(running.id) is None
+    assert manager.get(kept.id) is kept
+
+
+def test_finished_jobs_are_dropped_after_ttl():
+    manager = JobManager(max_workers=1, ttl=10)
+    job = wait(manager.submit('noop', lambda job: None))
+    manager.expire(now=job.finished + 5)
+    assert manager.get(job.id) is job
+    manager.expire(now=job.finished + 11)
+    assert manager.get(job.id) is None
@@ -0,0 +1,148 @@
+import random
+import time
+
+import pytest
+
+from services.layout import LayoutEngine, LayoutStore
+
+
+def overlapping(positions, sizes, gap=0.0):
+    """Pairs of boxes closer than gap; positions are (left, top) with y up"""
+    boxes = [(name, left, top - sizes[name][1], left + sizes[name][0], top)
+             for name, (left, top) in positions.items()]
+    return [(a[0], b[0]) for i, a in enumerate(boxes) for b in boxes[i + 1:]
+            if a[1] < b[3] + gap and b[1] < a[3] + gap and a[2] < b[4] + gap and b[2] < a[4] + gap]
+
+
+def random_sizes(count, seed=1):
+    rng = random.Random(seed)
+    return {f't{i}': (rng.uniform(8, 28), rng.uniform(6, 40)) for i in range(count)}
+
+
+def test_remove_overlaps_separates_boxes_wanting_the_same_spot():
+    engine = LayoutEngine(gap=4.0)
+    sizes = random_sizes(60)
+    positions = engine.remove_overlaps(list(sizes), sizes, {name: (0.0, 0.0) for name in sizes})
+    assert set(positions) == set(sizes)
+    # The gap is kept as well, less a hair for float rounding
+    assert overlapping(positions, sizes, gap=4.0 - 1e-9) == []
+
+
+def test_remove_overlaps_never_moves_fixed_boxes():
+    engine = LayoutEngine()
+    sizes = random_sizes(20)
+    fixed = {'t0': (0.0, 10.0), 't1': (40.0, 10.0)}
+    order = [name for name in sizes if name not in fixed]
+    positions = engine.remove_overlaps(order, sizes, {name: (5.0, 5.0) for name in order},
+                                       fixed=fixed)
+    assert positions['t0'] == fixed['t0'] and positions['t1'] == fixed['t1']
+    assert overlapping(positions, sizes) == []
+
+
+@pytest.mark.parametrize('algorithm', LayoutEngine.ALGORITHMS)
+def test_every_algorithm_leaves_no_overlaps(algorithm):
+    sizes = random_sizes(80, seed=2)
+    rng = random.Random(3)
+    edges = [(f't{i}', f't{rng.randrange(i)}') for i in range(1, 80) if rng.random() < 0.8]
+    positions = LayoutEngine().layout(sizes, edges, algorithm)
+    assert set(positions) == set(sizes)
+    assert overlapping(positions, sizes) == []
+
+
+def best_time(fn, runs=2):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def test_one_huge_table_does_not_slow_overlap_removal():
+    engine = LayoutEngine()
+    rng = random.Random(4)
+    sizes = random_sizes(1500, seed=4)
+    centers = {name: (rng.uniform(0, 1200), rng.uniform(0, 1200)) for name in sizes}
+    plain = best_time(lambda: engine.remove_overlaps(list(sizes), sizes, centers))
+
+    # A 300-column table: as tall as the whole picture is wide
+    sizes['huge'] = (12.0, 660.0)
+    centers['huge'] = (600.0, 600.0)
+    order = ['huge'] + [name for name in sizes if name != 'huge']
+    positions = {}
+    with_huge = best_time(lambda: positions.update(engine.remove_overlaps(order, sizes, centers)))
+    assert overlapping(positions, sizes) == []
+    # Buckets sized by the largest box made this about 4x slower
+    assert with_huge < plain * 2 + 0.05
+
+
+def test_force_layout_with_a_huge_table_leaves_no_overlaps():
+    sizes = random_sizes(300, seed=5)
+    sizes['huge'] = (12.0, 660.0)
+    rng = random.Random(6)
+    edges = [(f't{i}', f't{rng.randrange(i)}') for i in range(1, 300)]
+    positions = LayoutEngine().layout(sizes, edges, 'force')
+    assert overlapping(positions, sizes) == []
+
+
+def boxes(positions, sizes):
+    """A layout result in the previous= form {name: (left, top, width, height)}"""
+    return {name: (left, top) + tuple(sizes[name]) for name, (left, top) in positions.items()}
+
+
+def chain(count, seed=7):
+    sizes = random_sizes(count, seed=seed)
+    return sizes, [(f't{i}', f't{i - 1}') for i in range(1, count)]
+
+
+@pytest.mark.parametrize('algorithm', LayoutEngine.ALGORITHMS)
+def test_added_tables_leave_existing_ones_in_place(algorithm):
+    engine = LayoutEngine()
+    sizes, edges = chain(40)
+    first = engine.layout(sizes, edges, algorithm)
+    grown = dict(sizes, new_a=(20.0, 30.0), new_b=(10.0, 12.0))
+    second = engine.layout(grown, edges + [('new_a', 't5'), ('new_b', 'new_a')], algorithm,
+                           previous=boxes(first, sizes))
+    assert {name: second[name] for name in first} == first
+    assert overlapping(second, grown) == []
+
+
+def test_removed_tables_leave_the_rest_in_place():
+    engine = LayoutEngine()
+    sizes, edges = chain(40)
+    first = engine.layout(sizes, edges)
+    kept = {name: size for name, size in sizes.items() if name not in ('t3', 't20')}
+    second = engine.layout(kept, edges, previous=boxes(first, sizes))
+    assert second == {name: first[name] for name in kept}
+
+
+def test_resized_table_stays_anchored_and_pushes_its_neighbours_aside():
+    engine = LayoutEngine()
+    sizes, edges = chain(40)
+    first = engine.layout(sizes, edges)
+    resized = dict(sizes, t10=(sizes['t10'][0] + 30, sizes['t10'][1] + 40))
+    second = engine.layout(resized, edges, previous=boxes(first, sizes))
+    assert second['t10'] == pytest.approx(first['t10'])
+    assert overlapping(second, resized) == []
+    moved = [name for name in first if name != 't10' and second[name] != first[name]]
+    assert len(moved) < len(first) / 2
+
+
+def test_mostly_new_selection_is_laid_out_afresh():
+    engine = LayoutEngine()
+    sizes, edges = chain(40)
+    small = {name: sizes[name] for name in list(sizes)[:10]}
+    previous = boxes(engine.layout(small, edges), small)
+    assert engine.layout(sizes, edges, previous=previous) == engine.layout(sizes, edges)
+
+
+def test_layout_store_is_per_algorithm_and_bounded():
+    store = LayoutStore(max_entries=2)
+    store.put('c1', 'db', 'force', {'a': 1})
+    assert store.get('c1', 'db', 'force') == {'a': 1}
+    assert store.get('c1', 'db', 'grid') is None
+    store.put('c2', 'db', 'grid', {})
+    store.get('c1', 'db', 'force')
+    store.put('c3', 'db', 'grid', {})
+    assert store.get('c2', 'db', 'grid') is None
+    assert store.get('c1', 'db', 'force') == {'a': 1}
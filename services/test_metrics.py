@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+
+from database.erdb import DatabaseManager
+from services import metrics
+
+
+def test_histograms_expose_cumulative_buckets():
+    histogram = metrics.Histogram('t_seconds', 'Test', ('stage',), buckets=(1, 5))
+    for value in (0.5, 2, 2, 9):
+        histogram.observe(value, 'x"y')
+    assert histogram.expose() == [
+        '# HELP t_seconds Test', '# TYPE t_seconds histogram',
+        't_seconds_bucket{stage="x\\"y",le="1"} 1',
+        't_seconds_bucket{stage="x\\"y",le="5"} 3',
+        't_seconds_bucket{stage="x\\"y",le="+Inf"} 4',
+        't_seconds_sum{stage="x\\"y"} 13.5',
+        't_seconds_count{stage="x\\"y"} 4',
+    ]
+
+
+def test_registry_skips_failing_gauges():
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter('t_total', 'Test', ('method',)))
+    counter.inc(2, 'a')
+    counter.inc(1, 'a')
+    registry.register(metrics.Gauge('t_broken', 'Test', lambda: 1 / 0))
+    registry.register(metrics.Gauge('t_pools', 'Test', lambda: {('idle',): 3}, ('state',)))
+    assert registry.expose().splitlines() == [
+        '# HELP t_total Test', '# TYPE t_total counter', 't_total{method="a"} 3',
+        '# HELP t_pools Test', '# TYPE t_pools gauge', 't_pools{state="idle"} 3',
+    ]
+
+
+def test_stages_go_to_the_current_timings_only():
+    with metrics.collect() as timings:
+        with metrics.stage('layout'):
+            pass
+        with metrics.stage('layout'):
+            pass
+        metrics.payload('png', 2048)
+        with metrics.collect() as worker:
+            with metrics.stage('render.draw'):
+                pass
+        metrics.merge([('render.draw', 0.25)], {'png': 10})
+        # Other threads (such as jobs) have no current timings
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(metrics.current()))
+        thread.start()
+        thread.join()
+    assert seen == [None] and metrics.current() is not timings
+    assert set(worker.stages) == {'render.draw'}
+    assert timings.stages['layout'][1] == 2 and timings.stages['render.draw'] == [0.25, 1]
+    assert timings.sizes == {'png': 2058}
+    header = timings.server_timing()
+    assert header.startswith('layout;dur=') and 'desc="2 calls"' in header
+    assert 'render.draw;dur=250.0' in header and 'png-bytes;desc="2058"' in header
+    assert header.split(', ')[-1].startswith('total;dur=')
+
+
+def test_database_methods_count_their_statements_once():
+    manager = DatabaseManager()
+    metrics.instrument_database(manager, ('get_tables', 'get_catalog'))
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE a (id INTEGER PRIMARY KEY)')
+    with metrics.collect() as timings:
+        assert manager.get_tables(conn, 'sqlite') == ['a']
+        manager.get_catalog(conn, 'sqlite')
+    assert timings.queries['db.get_tables'] >= 1 and timings.queries['db.get_catalog'] >= 1
+    assert timings.stages['db.get_tables'][1] == 1 and timings.stages['db.get_catalog'][1] == 1
+    assert 'ergenix_db_queries_total{method="get_catalog"}' in metrics.registry.expose()
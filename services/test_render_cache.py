@@ -0,0 +1,30 @@
+from services.render_cache import RenderCache
+
+
+def test_keys_do_not_depend_on_dict_order():
+    assert RenderCache.make_key({'a': 1, 'b': [1, 2]}, 'png') == \
+        RenderCache.make_key({'b': [1, 2], 'a': 1}, 'png')
+    assert RenderCache.make_key({'a': 1}, 'png') != RenderCache.make_key({'a': 1}, 'svg')
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = RenderCache(memory_bytes=10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    assert cache.get('a') == b'12345'  # Now b is the oldest
+    cache.put('c', b'12345')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'12345' and cache.get('c') == b'12345'
+    assert cache.stats()['memory_bytes'] == 10
+
+
+def test_disk_tier_outlives_the_process_and_is_bounded(tmp_path):
+    cache = RenderCache(memory_bytes=0, disk_dir=str(tmp_path), disk_bytes=10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    reopened = RenderCache(memory_bytes=100, disk_dir=str(tmp_path), disk_bytes=10)
+    assert reopened.get('a') == b'12345'
+    assert reopened.stats()['memory_entries'] == 1  # Promoted on the hit
+    reopened.put('c', b'12345')
+    assert reopened.stats()['disk_entries'] == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['a', 'c']
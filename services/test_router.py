@@ -0,0 +1,85 @@
+import random
+
+from services.router import EdgeRouter, SpatialGrid
+
+# Two tables with a wall of 13 blocks between them: too many blockers for the
+# simple shapes, so only A* gets around it
+WALL = {f'w{k}': (45.0, -14.0 + 3 * k, 65.0, -11.0 + 3 * k) for k in range(13)}
+BOXES = {'a': (0.0, 0.0, 10.0, 10.0), 'b': (100.0, 0.0, 110.0, 10.0), **WALL}
+
+
+def crossed(points, boxes, own=()):
+    """Names of boxes whose inside a polyline passes through"""
+    names = [name for name in boxes if name not in own]
+    grid = SpatialGrid([boxes[name] for name in names])
+    found = set()
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        found |= {names[i] for i in grid.query(min(x1, x2) + 1e-6, min(y1, y2) + 1e-6,
+                                               max(x1, x2) - 1e-6, max(y1, y2) - 1e-6)}
+    return found
+
+
+def on_border(point, box):
+    x, y = point
+    left, bottom, right, top = box
+    inside = left - 1e-9 <= x <= right + 1e-9 and bottom - 1e-9 <= y <= top + 1e-9
+    return inside and min(x - left, right - x, y - bottom, top - y) < 1e-9
+
+
+def test_routes_run_between_their_tables_without_crossing_others():
+    [route] = EdgeRouter().route([('a', 'b')], BOXES)
+    assert on_border(route[0], BOXES['a']) and on_border(route[-1], BOXES['b'])
+    assert crossed(route, BOXES, own=('a', 'b')) == set()
+    # Orthogonal segments only
+    assert all(x1 == x2 or y1 == y2 for (x1, y1), (x2, y2) in zip(route, route[1:]))
+
+
+def test_out_of_budget_routes_take_a_simple_shape():
+    [route] = EdgeRouter(search_budget=0).route([('a', 'b')], BOXES)
+    assert on_border(route[0], BOXES['a']) and on_border(route[-1], BOXES['b'])
+    assert len(route) <= 6
+    assert crossed(route, BOXES, own=('a', 'b'))
+
+
+def test_budget_goes_to_short_routes_first():
+    # Same wall, and a second pair of tables far apart behind another one
+    boxes = dict(BOXES)
+    boxes.update({'c': (0.0, 400.0, 10.0, 410.0), 'd': (400.0, 400.0, 410.0, 410.0)})
+    boxes.update({f'v{k}': (200.0, 340.0 + 10 * k, 210.0, 350.0 + 10 * k) for k in range(13)})
+    router = EdgeRouter(search_budget=80)
+    near, far = router.route([('c', 'd'), ('a', 'b')], boxes)[::-1]
+    assert crossed(near, boxes, own=('a', 'b')) == set()
+    assert crossed(far, boxes, own=('c', 'd'))
+
+
+def test_search_finds_a_clear_path_through_scattered_tables():
+    rng = random.Random(3)
+    obstacles = []
+    for _ in range(150):
+        x, y = rng.uniform(10, 290), rng.uniform(-140, 140)
+        obstacles.append((x, y, x + rng.uniform(4, 20), y + rng.uniform(4, 20)))
+    obstacles = [o for o in obstacles if not (o[0] < 6 and o[1] < 6) and o[2] < 295]
+    router = EdgeRouter()
+    path = router._search_window(obstacles, (0.0, 0.0), (300.0, 0.0), 1.0)
+    assert path[0] == (0.0, 0.0) and path[-1] == (300.0, 0.0)
+    boxes = {i: (o[0] - 1.0, o[1] - 1.0, o[2] + 1.0, o[3] + 1.0) for i, o in enumerate(obstacles)}
+    assert crossed(path, boxes) == set()
+
+
+def test_parallel_relationships_become_separate_lanes():
+    boxes = {'a': (0.0, 0.0, 10.0, 10.0), 'b': (40.0, 0.0, 50.0, 10.0)}
+    routes = EdgeRouter().route([('a', 'b'), ('b', 'a'), ('a', 'b')], boxes)
+    assert len({tuple(route) for route in routes}) == 3
+    # Each route starts on its own "from" table
+    assert on_border(routes[1][0], boxes['b']) and on_border(routes[1][-1], boxes['a'])
+
+
+def test_fixed_routes_are_kept_and_missing_tables_give_none():
+    fixed_route = [(10.0, 5.0), (100.0, 5.0)]
+    routes = EdgeRouter().route([('a', 'b'), ('a', 'gone')], BOXES, fixed={0: fixed_route})
+    assert routes == [fixed_route, None]
+
+
+def test_routing_is_deterministic():
+    edges = [('a', 'b'), ('a', 'w0'), ('w12', 'b'), ('w3', 'a')]
+    assert EdgeRouter().route(edges, BOXES) == EdgeRouter().route(edges, BOXES)
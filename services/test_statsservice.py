@@ -0,0 +1,33 @@
+import io
+
+from PIL import Image
+
+from services.erservice import ERDiagramGenerator
+from services.render_pool import render_statistics_png
+from services.statsservice import StatisticsChartGenerator
+
+CHARTS = StatisticsChartGenerator()
+
+
+def statistics(count):
+    return {f'table_{i}': {'row_count': i * 10, 'column_count': 3, 'size_mb': 'N/A'}
+            for i in range(count)}
+
+
+def test_charts_widen_with_their_tables_up_to_a_limit():
+    assert CHARTS.figure_size(statistics(2)) == (CHARTS.MIN_WIDTH_INCHES, CHARTS.HEIGHT_INCHES)
+    small, wide = CHARTS.figure_size(statistics(20))[0], CHARTS.figure_size(statistics(50))[0]
+    assert CHARTS.MIN_WIDTH_INCHES < small < wide
+    assert CHARTS.figure_size(statistics(5000))[0] == CHARTS.MAX_WIDTH_INCHES
+
+
+def test_charts_render_within_the_budget_they_were_sized_for():
+    stats = statistics(60)
+    width, height = CHARTS.figure_size(stats)
+    budget = 32 * 1024 * 1024
+    dpi = ERDiagramGenerator.fit_figure_dpi(width, height, budget)
+    assert dpi < 300
+    with Image.open(io.BytesIO(render_statistics_png(stats, dpi))) as image:
+        # Trimmed to the drawn area, so never larger than the sized canvas
+        assert image.width <= width * dpi + 1 and image.height <= height * dpi + 1
+        assert image.width * image.height * ERDiagramGenerator.CANVAS_BYTES_PER_PIXEL <= budget
@@ -0,0 +1,91 @@
+import pytest
+
+from benchmarks.render_benchmark import synthetic_schema
+from services.erservice import ERDiagramGenerator
+from services.tiles import TileSet, TileStore
+
+GENERATOR = ERDiagramGenerator()
+
+
+@pytest.fixture(scope='module')
+def diagram():
+    tables_data, relationships = synthetic_schema(150)
+    return tables_data, relationships, GENERATOR.compute_layout(tables_data, relationships,
+                                                                'layered')
+
+
+def crossing(path, bounds):
+    """Whether a route, arrowheads included, reaches into bounds"""
+    left, bottom, right, top = bounds
+    reach = GENERATOR.ARROW_WIDTH
+    points = list(zip(*path))
+    return any(min(x1, x2) - reach < right and left < max(x1, x2) + reach
+               and min(y1, y2) - reach < top and bottom < max(y1, y2) + reach
+               for (x1, y1), (x2, y2) in zip(points, points[1:]))
+
+
+def test_overview_tiles_route_nothing(diagram):
+    tile_set = TileSet(GENERATOR, *diagram)
+    assert 0 < tile_set.detail_zoom <= tile_set.max_zoom
+    tile = tile_set.contents(0, 0, 0)
+    assert set(tile['tables_data']) == set(diagram[0])
+    # Plain elbows for every relationship, and none routed
+    assert len(tile['routes']) == len(diagram[1])
+    assert tile_set.routes == [None] * len(diagram[1])
+
+
+def test_detailed_tiles_route_only_what_reaches_them(diagram):
+    tables_data, relationships, layout = diagram
+    tile_set = TileSet(GENERATOR, tables_data, relationships, layout)
+    z = tile_set.detail_zoom
+    tile = tile_set.contents(z, 0, 0)
+    routed = [path for path in tile_set.routes if path is not None]
+    assert 0 < len(routed) < len(relationships)
+    assert tile['routes'] and all(path in routed for path in tile['routes'])
+
+
+def test_detailed_tiles_hold_every_route_crossing_them(diagram):
+    tables_data, relationships, layout = diagram
+    tile_set = TileSet(GENERATOR, tables_data, relationships, layout)
+    plan = GENERATOR.plan_routes(relationships, layout)
+    full = {}
+    for pair in plan.bundles:
+        full.update(GENERATOR.route_bundle(plan, pair))
+    z = tile_set.detail_zoom
+    for x in range(2 ** z):
+        for y in range(2 ** z):
+            bounds = tile_set.tile_bounds(z, x, y)
+            tile = tile_set.contents(z, x, y)
+            expected = [i for i in sorted(full) if crossing(full[i], bounds)]
+            # Routed tile by tile, the routes are the ones routing each pair gives
+            assert tile['routes'] == [full[i] for i in expected]
+            assert tile['relationships'] == [relationships[i] for i in expected]
+
+
+def test_routed_drawings_draw_their_routes_at_every_zoom(diagram):
+    tables_data, relationships, layout = diagram
+    routes = GENERATOR.route_relationships(relationships, layout)
+    tile_set = TileSet(GENERATOR, tables_data, relationships, layout, routes=routes)
+    assert tile_set.contents(0, 0, 0)['routes'] == [path for path in routes if path is not None]
+    deep = tile_set.contents(tile_set.max_zoom, 0, 0)
+    assert all(path in routes for path in deep['routes'])
+
+
+def test_put_returns_a_token_per_session():
+    store = TileStore()
+    first = store.put('d1', object(), 'session-a')
+    assert store.resolve(first) == ('session-a', 'd1')
+    # Same session and diagram, same token; another session gets its own
+    assert store.put('d1', store.get('d1'), 'session-a') == first
+    other = store.put('d1', store.get('d1'), 'session-b')
+    assert other != first and store.resolve(other) == ('session-b', 'd1')
+
+
+def test_evicted_and_expired_tile_sets_lose_their_tokens():
+    store = TileStore(max_entries=2)
+    old = store.put('d1', object(), 'a')
+    kept = store.put('d2', object(), 'b')
+    store.put('d3', object(), 'b')
+    assert store.get('d1') is None and store.resolve(old) is None
+    store.expire(lambda session_id: session_id != 'b')
+    assert store.resolve(kept) is None
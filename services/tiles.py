@@ -0,0 +1,206 @@
+import math
+import secrets
+import threading
+from collections import OrderedDict
+
+from services.router import SpatialGrid
+
+
+class TileSet:
+    """A laid out diagram cut into a pyramid of square tiles
+
+    Zoom level 0 is one tile covering the whole diagram and every level
+    doubles the tiles per side. Tile (z, x, y) counts x to the right and y
+    downwards from the top-left corner, as web map viewers do. Tables and
+    route segments are indexed in SpatialGrids, so picking the contents of a
+    tile only touches what lies near it.
+
+    Without routes, nothing is routed up front. Below detail_zoom, where a
+    table is a few pixels wide, relationships are drawn as plain elbows; a
+    deeper tile routes only the table pairs whose routes can reach it, and
+    keeps them for the tiles after it, so the first tiles do not wait for
+    the whole diagram to be routed.
+    """
+
+    # Deepest zoom draws about 24 pixels per diagram unit (rows ~50 px tall)
+    MAX_PIXELS_PER_UNIT = 24
+    # Routes are routed from about 2 pixels per unit (tables ~35 px wide)
+    DETAIL_PIXELS_PER_UNIT = 2
+
+    def __init__(self, generator, tables_data, relationships, table_layout, tile_size=256,
+                 routes=None):
+        self.tables_data = tables_data
+        self.relationships = relationships
+        self.table_layout = table_layout
+        self.tile_size = tile_size
+
+        self.min_x, self.min_y, self.max_x, self.max_y = generator.layout_extent(table_layout)
+        # The pyramid is square; the diagram sits in its top-left corner
+        self.side = max(self.max_x - self.min_x, self.max_y - self.min_y)
+        self.max_zoom = self._zoom(self.MAX_PIXELS_PER_UNIT)
+
+        # Tables with their shadows
+        self._names = list(table_layout)
+        shadow = generator.SHADOW_OFFSET
+        self._tables = SpatialGrid([
+            (dims['x'], dims['y'] + generator.HEADER_HEIGHT - dims['height'] - shadow,
+             dims['x'] + dims['width'] + shadow, dims['y'] + generator.HEADER_HEIGHT)
+            for dims in table_layout.values()
+        ])
+        self._generator = generator
+        self._reach = generator.ARROW_WIDTH
+        self._lock = threading.Lock()
+
+        if routes is not None:
+            # Routed already: every zoom draws these
+            self.routes = routes
+            self.detail_zoom = self.max_zoom + 1
+            self._plan = None
+            self._sketches = routes
+        else:
+            # routes fills in as tiles route their table pairs; None until then
+            self.routes = [None] * len(relationships)
+            self.detail_zoom = min(self._zoom(self.DETAIL_PIXELS_PER_UNIT), self.max_zoom + 1)
+            self._plan = generator.plan_routes(relationships, table_layout)
+            self._pairs = list(self._plan.bundles)
+            self._routed = set()
+            self._sketches = [None] * len(relationships)
+            for pair in self._pairs:
+                for i, path in generator.route_bundle(self._plan, pair, sketch=True).items():
+                    self._sketches[i] = path
+            router = generator.edge_router
+            self._pair_reach = SpatialGrid([router.reach(self._plan, pair)
+                                            for pair in self._pairs])
+        # Every segment of the routes drawn below detail_zoom, with room for arrowheads
+        segments, self._segment_routes = [], []
+        for i, path in enumerate(self._sketches):
+            if path is None:
+                continue
+            for box in self._segment_boxes(path):
+                segments.append(box)
+                self._segment_routes.append(i)
+        self._segments = SpatialGrid(segments)
+
+    def _zoom(self, pixels_per_unit):
+        """First zoom level drawing at least pixels_per_unit pixels per diagram unit"""
+        return max(0, math.ceil(math.log2(pixels_per_unit * self.side / self.tile_size)))
+
+    def _segment_boxes(self, path):
+        reach = self._reach
+        points = list(zip(*path))
+        return [(min(x1, x2) - reach, min(y1, y2) - reach, max(x1, x2) + reach, max(y1, y2) + reach)
+                for (x1, y1), (x2, y2) in zip(points, points[1:])]
+
+    def size(self):
+        """Width and height of the diagram in zoom level 0 pixels"""
+        return ((self.max_x - self.min_x) / self.side * self.tile_size,
+                (self.max_y - self.min_y) / self.side * self.tile_size)
+
+    def has_tile(self, z, x, y):
+        return 0 <= z <= self.max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+    def tile_bounds(self, z, x, y):
+        """(left, bottom, right, top) of a tile in diagram units"""
+        span = self.side / 2 ** z
+        left = self.min_x + x * span
+        top = self.max_y - y * span
+        return left, top - span, left + span, top
+
+    def contents(self, z, x, y):
+        """Arguments for ERDiagramGenerator.generate_tile, holding only what the tile shows"""
+        bounds = self.tile_bounds(z, x, y)
+        names = [self._names[i] for i in sorted(self._tables.query(*bounds))]
+        if z >= self.detail_zoom:
+            routes, edges = self.routes, self._routed_edges(bounds)
+        else:
+            routes = self._sketches
+            edges = sorted({self._segment_routes[i] for i in self._segments.query(*bounds)})
+        return {
+            'tables_data': {name: self.tables_data[name] for name in names},
+            'table_layout': {name: self.table_layout[name] for name in names},
+            'relationships': [self.relationships[i] for i in edges],
+            'routes': [routes[i] for i in edges],
+            'bounds': bounds,
+            'tile_size': self.tile_size
+        }
+
+    def _routed_edges(self, bounds):
+        """Indexes of the routes crossing bounds, routing the table pairs that can reach it"""
+        pairs = [self._pairs[k] for k in sorted(self._pair_reach.query(*bounds))]
+        with self._lock:
+            missing = [pair for pair in pairs if pair not in self._routed]
+        # Routed outside the lock; each pair routes the same whichever tile asks
+        routed = {}
+        for pair in missing:
+            routed.update(self._generator.route_bundle(self._plan, pair))
+        with self._lock:
+            for i, path in routed.items():
+                self.routes[i] = path
+            self._routed.update(missing)
+        left, bottom, right, top = bounds
+        edges = []
+        for pair in pairs:
+            for i in self._plan.bundles[pair]:
+                if any(box[0] < right and left < box[2] and box[1] < top and bottom < box[3]
+                       for box in self._segment_boxes(self.routes[i])):
+                    edges.append(i)
+        return sorted(edges)
+
+
+class TileStore:
+    """Tile sets by diagram id, evicted least-recently-used beyond max_entries
+
+    Tile URLs carry a random token per (session, diagram) rather than the
+    diagram id, so tiles are only served to a session the diagram was drawn
+    for; put() returns it and resolve() maps it back. Tokens go with their tile set, and
+    expire() drops those of ended sessions.
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tokens = {}    # tile token -> (session_id, diagram_id)
+        self._token_of = {}  # (session_id, diagram_id) -> tile token
+        self._lock = threading.Lock()
+
+    def get(self, diagram_id):
+        """Get the tile set for a diagram id, or None"""
+        with self._lock:
+            tile_set = self._entries.get(diagram_id)
+            if tile_set is not None:
+                self._entries.move_to_end(diagram_id)
+            return tile_set
+
+    def put(self, diagram_id, tile_set, session_id):
+        """Store a tile set and get its tile token for a session
+
+        The token is made under the same lock as the entry, so it is valid
+        until the tile set is evicted, however busy the store is.
+        """
+        with self._lock:
+            self._entries[diagram_id] = tile_set
+            self._entries.move_to_end(diagram_id)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget(lambda key: key[1] == evicted)
+            token = self._token_of.get((session_id, diagram_id))
+            if token is None:
+                token = secrets.token_urlsafe(24)
+                self._tokens[token] = (session_id, diagram_id)
+                self._token_of[(session_id, diagram_id)] = token
+            return token
+
+    def resolve(self, token):
+        """Get (session_id, diagram_id) for a tile token, or None"""
+        with self._lock:
+            return self._tokens.get(token)
+
+    def expire(self, is_live):
+        """Drop the tokens of sessions is_live rejects"""
+        with self._lock:
+            self._forget(lambda key: not is_live(key[0]))
+
+    def _forget(self, matches):
+        """Drop the tokens whose (session_id, diagram_id) matches (lock held)"""
+        for key in [key for key in self._token_of if matches(key)]:
+            self._tokens.pop(self._token_of.pop(key), None)
@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+
+TABLES = ['users', 'orders', 'items', 'products']
+
+
+def test_connect_lists_the_database(client, schema_path):
+    response = client.post('/connect', json={'db_type': 'sqlite', 'host': schema_path,
+                                             'user': 'test', 'password': 'test'})
+    assert response.json['success'] and response.json['databases'] == [schema_path]
+
+
+def test_diagram_revalidates_with_its_etag(client, session):
+    request = dict(session, tables=TABLES, format='svg')
+    first = client.post('/generate_er_diagram', json=request)
+    assert first.status_code == 200 and first.json['success']
+    etag = first.headers['ETag']
+
+    again = client.post('/generate_er_diagram', json=request, headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+    assert again.headers['ETag'] == etag
+
+    # A different selection is a different diagram
+    other = client.post('/generate_er_diagram', json=dict(request, tables=TABLES[:2]),
+                        headers={'If-None-Match': etag})
+    assert other.status_code == 200 and other.headers['ETag'] != etag
+
+
+def test_statistics_revalidate_with_their_etag(client, session):
+    request = dict(session, tables=TABLES)
+    first = client.post('/get_statistics', json=request)
+    assert first.json['success'], first.json
+    assert first.json['statistics']['users']['row_count'] == 20
+    again = client.post('/get_statistics', json=request,
+                        headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_tiles_are_served_to_their_session_only(app_module, client, session):
+    response = client.post('/generate_er_diagram', json=dict(session, tables=TABLES,
+                                                              format='tiles'))
+    assert response.json['success'] and response.json['diagram_format'] == 'tiles'
+    tile_url = response.json['tile_url']
+    assert '/None/' not in tile_url
+
+    tile = client.get(tile_url.format(z=0, x=0, y=0))
+    assert tile.status_code == 200 and tile.data.startswith(b'\x89PNG')
+    again = client.get(tile_url.format(z=0, x=0, y=0),
+                       headers={'If-None-Match': tile.headers['ETag']})
+    assert again.status_code == 304
+    deepest = response.json['max_zoom']
+    assert client.get(tile_url.format(z=deepest, x=0, y=0)).status_code == 200
+    assert client.get(tile_url.format(z=deepest + 1, x=0, y=0)).status_code == 404
+
+    app_module.connection_manager.close_session(session['connection_id'])
+    assert client.get(tile_url.format(z=0, x=0, y=0)).status_code == 404
+
+
+def test_jobs_answer_only_their_session(app_module, client, session, schema_path):
+    accepted = client.post('/generate_er_diagram', json=dict(session, tables=TABLES,
+                                                              format='svg', **{'async': True}))
+    assert accepted.status_code == 202
+    owner = {'connection_id': session['connection_id']}
+    other = client.post('/connect', json={'db_type': 'sqlite', 'host': schema_path,
+                                          'user': 'test', 'password': 'test'}).json
+
+    events = client.get(accepted.json['events_url'], query_string=owner).get_data(as_text=True)
+    assert 'event: done' in events
+    status = client.get(accepted.json['status_url'], query_string=owner).json
+    assert status['state'] == 'done' and status['result']['diagram_format'] == 'svg'
+
+    # Another session, or none, cannot see, follow or cancel the job
+    stranger = {'connection_id': other['connection_id']}
+    for query in (stranger, {}):
+        assert client.get(accepted.json['status_url'], query_string=query).status_code == 404
+        assert client.get(accepted.json['events_url'], query_string=query).status_code == 404
+    cancel_url = f"/jobs/{accepted.json['job_id']}/cancel"
+    assert client.post(cancel_url, json=stranger).status_code == 404
+    assert client.post(cancel_url, json=owner).json == {'success': True, 'cancelled': False}
+
+    # Ending the session drops its jobs
+    app_module.connection_manager.close_session(session['connection_id'])
+    app_module.job_manager.expire(is_live=app_module.connection_manager.has_session)
+    assert app_module.job_manager.get(accepted.json['job_id']) is None
+
+
+def test_downloads_stream_with_ranges_and_revalidate(app_module, client, session):
+    response = client.post('/generate_er_diagram', json=dict(session, tables=TABLES,
+                                                              format='png'))
+    assert response.json['success'] and 'diagram' not in response.json
+    url = response.json['diagram_url']
+
+    full = client.get(url)
+    assert full.status_code == 200 and full.mimetype == 'image/png'
+    assert full.data.startswith(b'\x89PNG')
+    assert int(full.headers['Content-Length']) == len(full.data)
+    assert full.headers['Accept-Ranges'] == 'bytes'
+    assert 'private' in full.headers['Cache-Control']
+
+    part = client.get(url, headers={'Range': 'bytes=0-7'})
+    assert part.status_code == 206 and part.data == full.data[:8]
+    assert part.headers['Content-Range'] == f'bytes 0-7/{len(full.data)}'
+    tail = client.get(url, headers={'Range': 'bytes=-4'})
+    assert tail.status_code == 206 and tail.data == full.data[-4:]
+    assert client.get(url, headers={'If-None-Match': full.headers['ETag']}).status_code == 304
+
+    # PNGs also download as JPEG or PDF
+    jpeg = client.get(url.replace('.png', '.jpeg'), query_string={'attachment': 1})
+    assert jpeg.status_code == 200 and jpeg.mimetype == 'image/jpeg'
+    assert jpeg.headers['Content-Disposition'].startswith('attachment')
+    assert client.get(url.replace('.png', '.pdf')).data.startswith(b'%PDF')
+
+    # Unknown tokens, mismatched names and ended sessions are not found
+    token, name = url.split('/')[-2:]
+    assert client.get(f'/download/nope/{name}').status_code == 404
+    assert client.get(f'/download/{token}/{"0" * 64}.png').status_code == 404
+    app_module.connection_manager.close_session(session['connection_id'])
+    assert client.get(url).status_code == 404
+
+
+def test_column_profiles_come_from_a_sample(client, session):
+    response = client.post('/get_column_profiles', json=dict(session, tables=['users', 'nope']))
+    assert response.json['success'] and response.json['partial']
+    users = response.json['profiles']['users']
+    assert users['sample_rows'] == 20 and users['method'] == 'head'
+    assert users['columns']['id']['distinct_estimate'] == 20
+    assert users['columns']['name']['min'] == 'user 1'
+    assert 'error' in response.json['profiles']['nope']
+
+
+def test_snapshots_diff_and_redraw_only_what_changed(app_module, client, session, schema_path,
+                                                     monkeypatch):
+    taken = client.post('/snapshots', json=session).json
+    assert taken['success'] and taken['tables'] == 4
+
+    renders = []
+    for name in ('render_diagram', 'render_patch'):
+        original = getattr(app_module.render_pool, name)
+        monkeypatch.setattr(app_module.render_pool, name,
+                            lambda *args, _name=name, _original=original, **kwargs:
+                            renders.append(_name) or _original(*args, **kwargs))
+    request = dict(session, tables=TABLES, format='png')
+    assert client.post('/generate_er_diagram', json=request).json['success']
+    renders.clear()  # Earlier tests may have rendered this one already
+
+    # Same length, so the layout stays as it was
+    conn = sqlite3.connect(schema_path)
+    conn.execute('ALTER TABLE products RENAME COLUMN title TO label')
+    conn.commit()
+    conn.close()
+    diff = client.post('/snapshots/diff', json={'connection_id': session['connection_id'],
+                                                'from': taken['snapshot_id']}).json
+    assert diff['changed'] and list(diff['diff']['altered_tables']) == ['products']
+
+    # Only the altered table is redrawn on top of the last image
+    assert client.post('/generate_er_diagram', json=request).json['success']
+    assert renders == ['render_patch']
+
+    # The snapshot draws offline, and going back redraws the same table again
+    offline = client.post(f"/snapshots/{taken['snapshot_id']}/diagram",
+                          json={'connection_id': session['connection_id'], 'format': 'png'})
+    assert offline.json['success'] and set(offline.json['tables_data']) == set(TABLES)
+    assert renders[-1] == 'render_patch'
+    assert client.post('/snapshots/nope/diagram',
+                       json={'connection_id': session['connection_id']}).status_code == 404
+
+
+def test_neighborhoods_select_tables_by_foreign_key_hops(client, session):
+    hood = {'tables': ['orders'], 'depth': 1, 'direction': 'both'}
+    response = client.post('/get_neighborhood', json=dict(session, **hood)).json
+    assert response['success'] and response['hops'] == {'orders': 0, 'users': 1, 'items': 1}
+    referenced = client.post('/get_neighborhood', json=dict(session, tables=['items'], depth=2,
+                                                            direction='referenced')).json
+    assert set(referenced['tables']) == {'items', 'orders', 'products', 'users'}
+    assert not client.post('/get_neighborhood', json=dict(session, tables=[])).json['success']
+
+    diagram = client.post('/generate_er_diagram', json=dict(session, neighborhood=hood,
+                                                             format='svg')).json
+    assert diagram['success'] and set(diagram['tables_data']) == {'orders', 'users', 'items'}
+
+
+def test_importing_the_app_loads_no_drivers_plotting_or_threads(tmp_path, schema_path):
+    script = f"""
+import sys, threading
+import app
+heavy = ('matplotlib', 'psycopg2', 'mysql.connector', 'networkx', 'pandas')
+print(sorted(m for m in heavy if m in sys.modules), threading.active_count())
+client = app.app.test_client()
+connected = client.post('/connect', json={{'db_type': 'sqlite', 'host': {schema_path!r},
+                                          'user': 'u', 'password': 'p'}}).json
+client.post('/generate_er_diagram', json={{'connection_id': connected['connection_id'],
+                                           'database': {schema_path!r}, 'db_type': 'sqlite',
+                                           'tables': ['users'], 'format': 'svg'}})
+print(sorted(m for m in heavy if m in sys.modules), app.connection_manager._reaper.is_alive())
+"""
+    env = dict(os.environ, ERGENIX_ARTIFACT_DIR=str(tmp_path / 'artifacts'),
+               ERGENIX_RENDER_CACHE_DIR=str(tmp_path / 'cache'),
+               ERGENIX_SNAPSHOT_DIR=str(tmp_path / 'snapshots'))
+    env.pop('ERGENIX_STATS_DB', None)
+    result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(__file__), env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    at_import, after_use = result.stdout.splitlines()[-2:]
+    assert at_import == '[] 1'
+    # An SQLite SVG needs neither another driver nor matplotlib; threads start on first request
+    assert after_use == '[] True'
+
+
+def test_requests_report_server_timing_and_metrics(app_module, client, session):
+    response = client.post('/generate_er_diagram', json=dict(session, tables=TABLES,
+                                                              format='svg', layout='grid'))
+    header = response.headers['Server-Timing']
+    stages = [part.split(';')[0] for part in header.split(', ')]
+    assert {'db.get_schema_fingerprint', 'catalog', 'layout', 'routing', 'total'} <= set(stages)
+    assert 'queries' in header
+
+    scraped = client.get('/metrics')
+    assert scraped.status_code == 200 and scraped.mimetype == 'text/plain'
+    text = scraped.get_data(as_text=True)
+    for line in ('ergenix_stage_seconds_count{stage="layout"}',
+                 'ergenix_request_seconds_count{endpoint="generate_er_diagram",status="200"}',
+                 'ergenix_db_connections{db_type="sqlite",state="idle"}',
+                 'ergenix_render_workers 1', 'ergenix_jobs'):
+        assert line in text, line
+
+
+def test_statistics_charts_share_the_render_budget(app_module, client, session, monkeypatch):
+    request = dict(session, tables=TABLES)
+    dpi = app_module.chart_dpi(client.post('/get_statistics', json=request).json['statistics'])
+    assert dpi == app_module.MAX_RENDER_DPI
+    # Not even MIN_RENDER_DPI fits: refused like a PNG diagram with no fallback
+    monkeypatch.setattr(app_module, 'RENDER_BUDGET', 1024 * 1024)
+    response = client.post('/get_statistics', json=request)
+    assert response.status_code == 413 and 'select fewer tables' in response.json['error']
@@ -0,0 +1,116 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+import batch
+
+
+def manifest(tmp_path, targets, defaults=None):
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps({'defaults': defaults or {}, 'targets': targets}))
+    return str(path)
+
+
+@pytest.fixture
+def shop(tmp_path, schema_path):
+    [target] = batch.load_manifest(manifest(tmp_path, [
+        {'name': 'shop', 'db_type': 'sqlite', 'host': schema_path,
+         'formats': ['png', 'svg', 'json', 'snapshot']}
+    ]))
+    return target
+
+
+@pytest.mark.parametrize('entry, problem', [
+    ({'db_type': 'sqlite', 'host': 'x'}, "missing 'name'"),
+    ({'name': 'a', 'host': 'x'}, "missing 'db_type'"),
+    ({'name': '../a', 'db_type': 'sqlite', 'host': 'x'}, 'plain directory name'),
+    ({'name': 'a', 'db_type': 'sqlite', 'host': 'x', 'formats': ['gif']}, 'Unsupported formats'),
+    ({'name': 'a', 'db_type': 'sqlite', 'host': 'x', 'layout': 'spiral'}, 'Unsupported layout'),
+    ({'name': 'a', 'db_type': 'sqlite', 'host': 'x', 'render_budget_mb': 0}, 'render_budget_mb'),
+    ({'name': 'a', 'db_type': 'sqlite', 'host': 'x', 'neighborhood': {'tables': []}},
+     'Invalid neighborhood'),
+])
+def test_manifest_mistakes_are_refused(tmp_path, entry, problem):
+    with pytest.raises(ValueError, match=problem):
+        batch.load_manifest(manifest(tmp_path, [entry]))
+
+
+def test_manifest_defaults_apply_and_targets_override_them(tmp_path):
+    targets = batch.load_manifest(manifest(tmp_path, [
+        {'name': 'a', 'db_type': 'sqlite', 'host': 'a.db'},
+        {'name': 'b', 'db_type': 'sqlite', 'host': 'b.db', 'dpi': 72},
+        {'name': 'c', 'snapshot': 'c.json.gz'},
+    ], defaults={'dpi': 150}))
+    assert [target['dpi'] for target in targets] == [150, 72, 150]
+    assert targets[0]['formats'] == ['png', 'svg', 'json']
+    with pytest.raises(ValueError, match='Duplicate'):
+        batch.load_manifest(manifest(tmp_path, [{'name': 'a', 'snapshot': 'x'}] * 2))
+
+
+def test_targets_render_then_skip_until_the_schema_changes(tmp_path, shop, schema_path):
+    out = str(tmp_path / 'erd')
+    first = batch.process_target(shop, None, out)
+    assert first['status'] == 'rendered' and first['tables'] == 4
+    files = sorted(os.listdir(os.path.join(out, 'shop')))
+    assert files == ['diagram.png', 'diagram.svg', 'schema.json', 'schema.snapshot.json.gz']
+    with open(os.path.join(out, 'shop', 'schema.json')) as f:
+        schema = json.load(f)
+    assert set(schema['layout']) == set(schema['tables']) == {'users', 'orders', 'items',
+                                                              'products'}
+
+    assert batch.process_target(shop, first, out)['status'] == 'skipped'
+    assert batch.process_target(shop, first, out, force=True)['status'] == 'rendered'
+    # Other options, a missing output or a new table all render again
+    assert batch.process_target(dict(shop, dpi=72), first, out)['status'] == 'rendered'
+    os.remove(os.path.join(out, 'shop', 'diagram.svg'))
+    assert batch.process_target(shop, first, out)['status'] == 'rendered'
+    conn = sqlite3.connect(schema_path)
+    conn.execute('CREATE TABLE reviews (id INTEGER PRIMARY KEY)')
+    conn.close()
+    again = batch.process_target(shop, first, out)
+    assert again['status'] == 'rendered' and again['tables'] == 5
+
+
+def test_snapshot_targets_render_without_a_database(tmp_path, shop):
+    out = str(tmp_path / 'erd')
+    batch.process_target(shop, None, out)
+    snapshot = {'name': 'offline', 'snapshot': os.path.join(out, 'shop', 'schema.snapshot.json.gz'),
+                **{key: shop[key] for key in batch.DEFAULTS}, 'formats': ['json']}
+    result = batch.process_target(snapshot, None, out)
+    assert result['status'] == 'rendered' and result['tables'] == 4
+    assert batch.process_target(snapshot, result, out)['status'] == 'skipped'
+
+
+def test_tables_and_neighborhood_narrow_the_diagram(tmp_path, shop):
+    out = str(tmp_path / 'erd')
+    target = dict(shop, formats=['json'], tables=['o*', 'i*', 'u*'],
+                  neighborhood={'tables': ['orders'], 'depth': 1, 'direction': 'referenced'})
+    batch.process_target(target, None, out)
+    with open(os.path.join(out, 'shop', 'schema.json')) as f:
+        schema = json.load(f)
+    assert set(schema['tables']) == {'orders', 'users'}
+    assert [(rel['from_table'], rel['to_table']) for rel in schema['relationships']] == [
+        ('orders', 'users')]
+
+
+def test_pngs_over_the_render_budget_are_left_out(tmp_path, shop):
+    out = str(tmp_path / 'erd')
+    batch.process_target(shop, None, out)
+    result = batch.process_target(dict(shop, render_budget_mb=0.001), None, out)
+    assert result['oversize'] == ['png']
+    assert not os.path.exists(os.path.join(out, 'shop', 'diagram.png'))
+    assert os.path.exists(os.path.join(out, 'shop', 'diagram.svg'))
+
+
+def test_run_records_state_and_counts_failures(tmp_path, shop, capsys):
+    out = str(tmp_path / 'erd')
+    broken = dict(shop, name='broken', host=str(tmp_path / 'missing' / 'x.db'))
+    assert batch.run([shop, broken], out, workers=2) == 1
+    with open(os.path.join(out, batch.STATE_FILE)) as f:
+        state = json.load(f)
+    assert list(state) == ['shop'] and 'status' not in state['shop']
+    assert 'broken: failed' in capsys.readouterr().err
+    assert batch.run([shop], out, workers=1) == 0
+    assert 'shop: skipped' in capsys.readouterr().out